@@ -0,0 +1,130 @@
+"""Cold-start report: how long importing the API takes, and which modules cost the most.
+
+Runs `python -X importtime -c "import <module>"` in fresh interpreters and
+reports the median import time of the module, the median wall time of the
+whole process (interpreter start included) and the slowest imports by
+cumulative and by self time.
+
+Examples (from the server directory):
+
+    python -m bench.importtime
+    python -m bench.importtime --runs 10 --top 30 --output bench/importtime.json
+    python -m bench.importtime --save-baseline bench/importtime_baseline.json
+    python -m bench.importtime --baseline bench/importtime_baseline.json --tolerance 0.25
+
+With --baseline the run exits non-zero when the median import time grew by
+more than the tolerance.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+SERVER_DIR = Path(__file__).resolve().parent.parent
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int]]:
+    """(module, self us, cumulative us) for every line -X importtime wrote."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def measure(module: str) -> Tuple[float, Dict[str, Tuple[int, int]]]:
+    # No .env values or real keys are needed: importing must not build any client.
+    env = {**os.environ, "PYTHONDONTWRITEBYTECODE": "1"}
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=SERVER_DIR, env=env, capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(f"importing {module} failed:\n{result.stderr[-2000:]}")
+    # A module imported twice in one process only appears once; keep the first.
+    modules: Dict[str, Tuple[int, int]] = {}
+    for name, self_us, cumulative_us in parse_importtime(result.stderr):
+        modules.setdefault(name, (self_us, cumulative_us))
+    return wall, modules
+
+
+def report(module: str, runs: int, top: int) -> Dict[str, Any]:
+    measure(module)  # warm the bytecode and OS file caches, like a restarted worker
+    walls, samples = [], []
+    for _ in range(runs):
+        wall, modules = measure(module)
+        walls.append(wall)
+        samples.append(modules)
+    names = set().union(*samples)
+    median = {
+        name: (
+            statistics.median(s[name][0] for s in samples if name in s),
+            statistics.median(s[name][1] for s in samples if name in s),
+        )
+        for name in names
+    }
+
+    def slowest(index: int) -> List[Dict[str, Any]]:
+        ranked = sorted(median.items(), key=lambda item: item[1][index], reverse=True)[:top]
+        return [{"module": name, "self_ms": s / 1000, "cumulative_ms": c / 1000} for name, (s, c) in ranked]
+
+    return {
+        "module": module,
+        "runs": runs,
+        "import_ms": median[module][1] / 1000,
+        "wall_ms": statistics.median(walls) * 1000,
+        "modules_imported": len(names),
+        "slowest_cumulative": slowest(1),
+        "slowest_self": slowest(0),
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    regressions = []
+    for key in ("import_ms", "wall_ms"):
+        old, new = baseline.get(key, 0), current[key]
+        if old and new > old * (1 + tolerance):
+            regressions.append(f"{key} {old:.0f}ms -> {new:.0f}ms")
+    return regressions
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="src.api.main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--output", help="write the report as JSON")
+    parser.add_argument("--save-baseline", help="write the report as the new baseline")
+    parser.add_argument("--baseline", help="compare against this baseline and fail on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    result = report(args.module, args.runs, args.top)
+    print(f"{result['module']}: import {result['import_ms']:.0f}ms, process {result['wall_ms']:.0f}ms "
+          f"({result['modules_imported']} modules, median of {result['runs']} runs)")
+    print(f"\n{'cumulative ms':>14} {'self ms':>9}  module")
+    for row in result["slowest_cumulative"]:
+        print(f"{row['cumulative_ms']:14.1f} {row['self_ms']:9.1f}  {row['module']}")
+    for path in (args.output, args.save_baseline):
+        if path:
+            Path(path).write_text(json.dumps(result, indent=2))
+    if args.baseline:
+        regressions = compare(result, json.loads(Path(args.baseline).read_text()), args.tolerance)
+        for line in regressions:
+            print("REGRESSION", line, file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,368 @@
+"""Offline load test for the post generation API.
+
+Starts the upstream stubs (bench/stubs.py) and the API with its upstreams
+pointed at them, then runs full sessions at a target concurrency:
+
+    create-post -> stream (until post feedback) -> N x human-feedback "feedback"
+    -> human-feedback "satisfied" [-> "satisfied" on the image step]
+
+and reports p50/p95/p99 per endpoint and per graph node (from the SSE
+node_started/node_finished events), time to first byte of the stream,
+events per second and the API process RSS over time.
+
+Examples (from the server directory):
+
+    python -m bench.run --sessions 50 --concurrency 10 --output bench/last.json
+    python -m bench.run --save-baseline bench/baseline.json
+    python -m bench.run --baseline bench/baseline.json --tolerance 0.25
+
+With --baseline the run exits non-zero when any p95 or the peak RSS grew by
+more than the tolerance. --target URL benchmarks an already running API
+(its upstreams must already point at stubs and, for --users to mean anything,
+ADMISSION_USER_HEADER=X-User-Id must be set; RSS needs --pid). Requests shed
+by admission control (429) are counted as "<endpoint>:shed" errors.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+SERVER_DIR = Path(__file__).resolve().parent.parent
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def _summary(values: List[float]) -> Dict[str, float]:
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values) if values else 0.0,
+        "p50": _percentile(values, 50),
+        "p95": _percentile(values, 95),
+        "p99": _percentile(values, 99),
+        "max": max(values) if values else 0.0,
+    }
+
+
+def _rss_bytes(pid: int) -> Optional[int]:
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+class Recorder:
+    def __init__(self):
+        self.endpoints: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.nodes: Dict[str, List[float]] = {}
+        self.events = 0
+        self.sessions_ok = 0
+        self.sessions_failed = 0
+
+    def endpoint(self, name: str, seconds: float) -> None:
+        self.endpoints.setdefault(name, []).append(seconds)
+
+    def error(self, name: str) -> None:
+        self.errors[name] = self.errors.get(name, 0) + 1
+
+
+async def _read_sse(client: httpx.AsyncClient, method: str, url: str, recorder: Recorder, name: str,
+                    **kwargs: Any) -> Optional[Dict[str, Any]]:
+    """Consume one SSE run; returns the final interrupt/completion event."""
+    started = time.perf_counter()
+    first_byte = None
+    node_started: Dict[str, float] = {}
+    final = None
+    async with client.stream(method, url, **kwargs) as response:
+        if response.status_code != 200:
+            recorder.error(f"{name}:shed" if response.status_code == 429 else name)
+            return None
+        async for line in response.aiter_lines():
+            now = time.perf_counter()
+            if first_byte is None:
+                first_byte = now - started
+            if not line.startswith("data: "):
+                continue
+            event = json.loads(line[len("data: "):])
+            recorder.events += 1
+            kind = event.get("type")
+            if kind == "node_started":
+                node_started[event["task_id"]] = now
+            elif kind == "node_finished":
+                began = node_started.pop(event["task_id"], None)
+                if began is not None:
+                    recorder.nodes.setdefault(event["node"], []).append(now - began)
+            elif kind in ("interrupt", "completion", "error"):
+                final = event
+    recorder.endpoint(name, time.perf_counter() - started)
+    if first_byte is not None:
+        recorder.endpoint(f"{name}:ttfb", first_byte)
+    if final is None or final.get("type") == "error":
+        recorder.error(name)
+    return final
+
+
+async def _timed_post(client: httpx.AsyncClient, url: str, body: Dict[str, Any], recorder: Recorder,
+                      name: str, headers: Optional[Dict[str, str]] = None) -> Optional[Dict[str, Any]]:
+    started = time.perf_counter()
+    response = await client.post(url, json=body, headers=headers)
+    recorder.endpoint(name, time.perf_counter() - started)
+    if response.status_code != 200:
+        recorder.error(f"{name}:shed" if response.status_code == 429 else name)
+        return None
+    return response.json()
+
+
+async def _session(client: httpx.AsyncClient, base: str, index: int, args: argparse.Namespace,
+                   recorder: Recorder) -> None:
+    topic = f"benchmark topic {index % args.distinct_inputs}"
+    # Admission control budgets per user; without this every session would share one address's budget.
+    # The API only honours the header when ADMISSION_USER_HEADER names it (api_env does).
+    headers = {"X-User-Id": f"bench-user-{index % args.users}"}
+    request: Dict[str, Any] = {
+        "platform": args.platform,
+        "image_wanted": args.image,
+        f"{args.platform}_access_token": f"bench-token-{index % args.distinct_inputs}",
+    }
+    if args.urls:
+        request["url"] = f"https://example.com/articles/{index % args.distinct_inputs}"
+    else:
+        request["topic"] = topic
+    created = await _timed_post(client, f"{base}/api/create-post", request, recorder, "create-post", headers)
+    if not created:
+        recorder.sessions_failed += 1
+        return
+    session_id = created["session_id"]
+    event = await _read_sse(client, "GET", f"{base}/api/stream/{session_id}", recorder, "stream", headers=headers)
+    responses = [("feedback", "Make it a little shorter")] * args.feedback_rounds + [("satisfied", True)]
+    if args.image:
+        responses.append(("satisfied", True))
+    for response_type, data in responses:
+        if not event or event.get("type") != "interrupt":
+            break
+        body = {"session_id": session_id, "response_type": response_type, "response_data": data}
+        name = f"human-feedback:{response_type}"
+        if args.stream_feedback:
+            event = await _read_sse(client, "POST", f"{base}/api/human-feedback", recorder, name,
+                                    json={**body, "stream": True}, headers=headers)
+        else:
+            event = await _timed_post(client, f"{base}/api/human-feedback", body, recorder, name, headers)
+    ok = bool(event and event.get("type") == "completion" and event["data"].get("upload_success"))
+    if ok:
+        recorder.sessions_ok += 1
+    else:
+        recorder.sessions_failed += 1
+
+
+async def _sample_rss(pid: Optional[int], started: float, samples: List[List[float]], interval: float) -> None:
+    while pid is not None:
+        rss = _rss_bytes(pid)
+        if rss is not None:
+            samples.append([round(time.perf_counter() - started, 3), rss])
+        await asyncio.sleep(interval)
+
+
+async def run_load(base: str, args: argparse.Namespace, pid: Optional[int]) -> Dict[str, Any]:
+    recorder = Recorder()
+    semaphore = asyncio.Semaphore(args.concurrency)
+    limits = httpx.Limits(max_connections=args.concurrency * 2, max_keepalive_connections=args.concurrency * 2)
+    rss_samples: List[List[float]] = []
+    started = time.perf_counter()
+    sampler = asyncio.create_task(_sample_rss(pid, started, rss_samples, args.rss_interval))
+
+    async def one(index: int) -> None:
+        async with semaphore:
+            try:
+                await _session(client, base, index, args, recorder)
+            except httpx.HTTPError:
+                recorder.sessions_failed += 1
+                recorder.error("transport")
+
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+        await asyncio.gather(*(one(i) for i in range(args.sessions)))
+    elapsed = time.perf_counter() - started
+    sampler.cancel()
+    return {
+        "config": {k: v for k, v in vars(args).items() if k not in ("baseline", "save_baseline", "output", "tolerance", "min_delta")},
+        "elapsed_seconds": elapsed,
+        "sessions": {"ok": recorder.sessions_ok, "failed": recorder.sessions_failed,
+                     "per_second": recorder.sessions_ok / elapsed if elapsed else 0.0},
+        "events_per_second": recorder.events / elapsed if elapsed else 0.0,
+        "endpoints": {name: _summary(values) for name, values in sorted(recorder.endpoints.items())},
+        "errors": recorder.errors,
+        "nodes": {name: _summary(values) for name, values in sorted(recorder.nodes.items())},
+        "rss": {"peak_bytes": max((s[1] for s in rss_samples), default=0), "samples": rss_samples},
+    }
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float, min_delta: float = 0.05) -> List[str]:
+    """Regressions of `report` against `baseline`, as readable lines.
+
+    Latencies must grow by more than `tolerance` and by at least `min_delta`
+    seconds, so jitter on millisecond-scale steps is not reported.
+    """
+    regressions = []
+    for section in ("endpoints", "nodes"):
+        for name, stats in baseline.get(section, {}).items():
+            current = report.get(section, {}).get(name)
+            if (
+                current
+                and current["p95"] > stats["p95"] * (1 + tolerance)
+                and current["p95"] - stats["p95"] >= min_delta
+            ):
+                regressions.append(f"{section}.{name}.p95 {stats['p95']:.3f}s -> {current['p95']:.3f}s")
+    old_rss, new_rss = baseline.get("rss", {}).get("peak_bytes", 0), report["rss"]["peak_bytes"]
+    if old_rss and new_rss > old_rss * (1 + tolerance):
+        regressions.append(f"rss.peak_bytes {old_rss} -> {new_rss}")
+    old_rate, new_rate = baseline["sessions"]["per_second"], report["sessions"]["per_second"]
+    if old_rate and new_rate < old_rate * (1 - tolerance):
+        regressions.append(f"sessions.per_second {old_rate:.2f} -> {new_rate:.2f}")
+    return regressions
+
+
+def _wait_ready(url: str, process: subprocess.Popen, timeout: float = 60) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"process exited with {process.returncode} before {url} was ready")
+        try:
+            if httpx.get(url, timeout=1).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} not ready after {timeout}s")
+
+
+def _start(module: str, port: int, env: Dict[str, str], ready_path: str) -> subprocess.Popen:
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", module, "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=SERVER_DIR,
+        env=env,
+    )
+    _wait_ready(f"http://127.0.0.1:{port}{ready_path}", process)
+    return process
+
+
+def stub_env(args: argparse.Namespace) -> Dict[str, str]:
+    return {
+        "STUB_LLM_LATENCY_MS": str(args.llm_latency_ms),
+        "STUB_LLM_TOKEN_MS": str(args.llm_token_ms),
+        "STUB_TAVILY_LATENCY_MS": str(args.tavily_latency_ms),
+        "STUB_LINKEDIN_LATENCY_MS": str(args.linkedin_latency_ms),
+        "STUB_TWITTER_LATENCY_MS": str(args.linkedin_latency_ms),
+        "STUB_ERROR_RATE": str(args.error_rate),
+        "STUB_RATE_LIMIT_RATE": str(args.rate_limit_rate),
+    }
+
+
+def api_env(stub_base: str, workdir: str) -> Dict[str, str]:
+    """Point every upstream of the API at the stubs and keep its state in `workdir`."""
+    return {
+        "OPENAI_API_KEY": "bench",
+        "OPENAI_API_BASE": f"{stub_base}/openai/v1",
+        "OPENAI_BASE_URL": f"{stub_base}/openai/v1",
+        "TAVILY_API_KEY": "bench",
+        "TAVILY_API_BASE_URL": f"{stub_base}/tavily",
+        "LINKEDIN_API_BASE": f"{stub_base}/linkedin",
+        "LINKEDIN_OAUTH_BASE": f"{stub_base}/linkedin",
+        "TWITTER_API_BASE": f"{stub_base}/twitter",
+        "CHECKPOINT_DB_PATH": os.path.join(workdir, "agent_state.sqlite3"),
+        "RESULT_CACHE_PATH": os.path.join(workdir, "result_cache.sqlite3"),
+        "ADMISSION_USER_HEADER": "X-User-Id",
+    }
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--users", type=int, default=1000, help="distinct X-User-Id values the sessions spread over")
+    parser.add_argument("--distinct-inputs", type=int, default=10, help="distinct topics/urls (controls cache hit rate)")
+    parser.add_argument("--urls", action="store_true", help="use URL inputs instead of topics")
+    parser.add_argument("--platform", choices=["linkedin", "twitter"], default="linkedin")
+    parser.add_argument("--image", action="store_true", help="request an image with every post")
+    parser.add_argument("--feedback-rounds", type=int, default=1)
+    parser.add_argument("--stream-feedback", action="store_true", help="resume with stream=true and read SSE")
+    parser.add_argument("--llm-latency-ms", type=float, default=400)
+    parser.add_argument("--llm-token-ms", type=float, default=10)
+    parser.add_argument("--tavily-latency-ms", type=float, default=300)
+    parser.add_argument("--linkedin-latency-ms", type=float, default=150, help="also used for the Twitter stub")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--rss-interval", type=float, default=0.5)
+    parser.add_argument("--target", help="benchmark an already running API instead of starting one")
+    parser.add_argument("--pid", type=int, help="PID of the --target API process for RSS sampling")
+    parser.add_argument("--output", help="write the full report as JSON")
+    parser.add_argument("--save-baseline", help="write the report as the new baseline")
+    parser.add_argument("--baseline", help="compare against this baseline and fail on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--min-delta", type=float, default=0.05, help="ignore p95 changes smaller than this (seconds)")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    processes: List[subprocess.Popen] = []
+    try:
+        if args.target:
+            base, pid = args.target.rstrip("/"), args.pid
+        else:
+            workdir = tempfile.mkdtemp(prefix="bench-")
+            stub_port, api_port = _free_port(), _free_port()
+            stub_base = f"http://127.0.0.1:{stub_port}"
+            processes.append(_start("bench.stubs:app", stub_port, {**os.environ, **stub_env(args)}, "/stats"))
+            api = _start("src.api.main:app", api_port, {**os.environ, **api_env(stub_base, workdir)}, "/api/cache/stats")
+            processes.append(api)
+            base, pid = f"http://127.0.0.1:{api_port}", api.pid
+        report = asyncio.run(run_load(base, args, pid))
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=10)
+
+    printable = {k: v for k, v in report.items() if k != "rss"}
+    printable["rss_peak_mb"] = round(report["rss"]["peak_bytes"] / 2**20, 1)
+    print(json.dumps(printable, indent=2))
+    for path in (args.output, args.save_baseline):
+        if path:
+            Path(path).write_text(json.dumps(report, indent=2))
+    if args.baseline:
+        regressions = compare(report, json.loads(Path(args.baseline).read_text()), args.tolerance, args.min_delta)
+        for line in regressions:
+            print("REGRESSION", line, file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,371 @@
+"""Local stand-ins for OpenAI, Tavily, LinkedIn and image hosts.
+
+One FastAPI app serves every upstream under its own prefix:
+
+    /openai/v1/chat/completions   OpenAI chat completions (plain and streamed)
+    /openai/v1/embeddings         OpenAI embeddings (hashed bag of words)
+    /tavily/search, /tavily/extract
+    /linkedin/v2/..., /linkedin/oauth/v2/accessToken, /linkedin/upload/{id}
+    /twitter/2/media/upload (INIT/APPEND/FINALIZE/STATUS), /twitter/2/tweets
+    /images/{name}.png            1200x627 PNG; names starting with dead-, page-, huge-,
+                                  square- or tiny- get a 404, an HTML page, a 50 MB size,
+                                  600x600 or 100x50 (search results mix them in)
+
+Latency and failures are configured through environment variables read at
+startup (milliseconds; rates are 0..1):
+
+    STUB_LLM_LATENCY_MS, STUB_LLM_TOKEN_MS, STUB_TAVILY_LATENCY_MS,
+    STUB_LINKEDIN_LATENCY_MS, STUB_TWITTER_LATENCY_MS, STUB_IMAGE_LATENCY_MS, STUB_IMAGE_BYTES,
+    STUB_ERROR_RATE, STUB_RATE_LIMIT_RATE
+
+Run with: uvicorn bench.stubs:app --port 8900
+"""
+import asyncio
+import functools
+import json
+import os
+import random
+import struct
+import time
+import uuid
+import zlib
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+
+def _env_ms(name: str, default: float) -> float:
+    return float(os.getenv(name, str(default))) / 1000.0
+
+
+LLM_LATENCY = _env_ms("STUB_LLM_LATENCY_MS", 400)
+LLM_TOKEN_DELAY = _env_ms("STUB_LLM_TOKEN_MS", 10)
+TAVILY_LATENCY = _env_ms("STUB_TAVILY_LATENCY_MS", 300)
+LINKEDIN_LATENCY = _env_ms("STUB_LINKEDIN_LATENCY_MS", 150)
+TWITTER_LATENCY = _env_ms("STUB_TWITTER_LATENCY_MS", 150)
+IMAGE_LATENCY = _env_ms("STUB_IMAGE_LATENCY_MS", 50)
+IMAGE_BYTES = int(os.getenv("STUB_IMAGE_BYTES", str(512 * 1024)))
+ERROR_RATE = float(os.getenv("STUB_ERROR_RATE", "0"))
+RATE_LIMIT_RATE = float(os.getenv("STUB_RATE_LIMIT_RATE", "0"))
+
+DRAFT = (
+    "Excited to share a few thoughts on this topic. The landscape is shifting quickly, and teams that "
+    "invest early in automation see compounding returns. Three takeaways: start small, measure everything, "
+    "and keep humans in the loop for the final call. What are you seeing in your organization? "
+    "#innovation #productivity #ai"
+)
+ARTICLE = "\n\n".join(
+    f"Section {i}. This paragraph of the benchmark article discusses trend number {i} in some depth, "
+    f"covering background, current adoption, open questions and the outlook for the next year."
+    for i in range(120)
+)
+
+app = FastAPI(title="Upstream stubs")
+counters: Dict[str, int] = {}
+
+
+async def _upstream(name: str, latency: float) -> Optional[Response]:
+    """Count the call, sleep for the configured latency and maybe inject a failure."""
+    counters[name] = counters.get(name, 0) + 1
+    await asyncio.sleep(latency * random.uniform(0.8, 1.2))
+    roll = random.random()
+    if roll < RATE_LIMIT_RATE:
+        return JSONResponse({"error": "rate limited"}, status_code=429, headers={"Retry-After": "1"})
+    if roll < RATE_LIMIT_RATE + ERROR_RATE:
+        return JSONResponse({"error": "injected failure"}, status_code=500)
+    return None
+
+
+@app.get("/stats")
+async def stats():
+    return counters
+
+
+# --- OpenAI ------------------------------------------------------------
+
+
+def _last_user_text(messages: List[Dict[str, Any]]) -> str:
+    for message in reversed(messages):
+        if message.get("role") == "user":
+            content = message.get("content")
+            return content if isinstance(content, str) else json.dumps(content)
+    return ""
+
+
+def _completion_plan(body: Dict[str, Any]) -> Dict[str, Any]:
+    """Decide whether the fake model answers with text or a tavily_search call."""
+    tools = body.get("tools") or []
+    text = _last_user_text(body.get("messages", []))
+    if tools and text.startswith("Input: "):
+        query = text[len("Input: "):]
+        return {"tool_call": {"id": f"call_{uuid.uuid4().hex[:24]}", "name": tools[0]["function"]["name"],
+                              "arguments": json.dumps({"query": query})}}
+    return {"content": DRAFT}
+
+
+def _usage(body: Dict[str, Any], completion: str) -> Dict[str, int]:
+    prompt_tokens = sum(len(json.dumps(m)) for m in body.get("messages", [])) // 4
+    completion_tokens = max(1, len(completion) // 4)
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens}
+
+
+async def _stream_completion(body: Dict[str, Any], plan: Dict[str, Any]) -> AsyncIterator[str]:
+    base = {"id": f"chatcmpl-{uuid.uuid4().hex}", "object": "chat.completion.chunk",
+            "created": int(time.time()), "model": body.get("model", "stub")}
+
+    def chunk(delta: Dict[str, Any], finish: Optional[str] = None) -> str:
+        return "data: " + json.dumps({**base, "choices": [{"index": 0, "delta": delta, "finish_reason": finish}]}) + "\n\n"
+
+    if "tool_call" in plan:
+        call = plan["tool_call"]
+        yield chunk({"role": "assistant", "content": None, "tool_calls": [
+            {"index": 0, "id": call["id"], "type": "function",
+             "function": {"name": call["name"], "arguments": call["arguments"]}}]})
+        yield chunk({}, "tool_calls")
+        completion = call["arguments"]
+    else:
+        yield chunk({"role": "assistant", "content": ""})
+        words = plan["content"].split(" ")
+        for i, word in enumerate(words):
+            await asyncio.sleep(LLM_TOKEN_DELAY)
+            yield chunk({"content": word if i == 0 else " " + word})
+        yield chunk({}, "stop")
+        completion = plan["content"]
+    if (body.get("stream_options") or {}).get("include_usage"):
+        yield "data: " + json.dumps({**base, "choices": [], "usage": _usage(body, completion)}) + "\n\n"
+    yield "data: [DONE]\n\n"
+
+
+@app.post("/openai/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    failure = await _upstream("openai", LLM_LATENCY)
+    if failure:
+        return failure
+    plan = _completion_plan(body)
+    if body.get("stream"):
+        return StreamingResponse(_stream_completion(body, plan), media_type="text/event-stream")
+    if "tool_call" in plan:
+        call = plan["tool_call"]
+        message = {"role": "assistant", "content": None, "tool_calls": [
+            {"id": call["id"], "type": "function", "function": {"name": call["name"], "arguments": call["arguments"]}}]}
+        finish, completion = "tool_calls", call["arguments"]
+    else:
+        message = {"role": "assistant", "content": plan["content"]}
+        finish, completion = "stop", plan["content"]
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "stub"),
+        "choices": [{"index": i, "message": message, "finish_reason": finish} for i in range(body.get("n") or 1)],
+        "usage": _usage(body, completion),
+    }
+
+
+def _embedding(text: str, dimensions: int) -> List[float]:
+    # Texts sharing most words get similar vectors, which is all the cache needs.
+    vector = [0.0] * dimensions
+    for word in text.lower().split():
+        vector[zlib.crc32(word.encode()) % dimensions] += 1.0
+    return vector
+
+
+@app.post("/openai/v1/embeddings")
+async def embeddings(request: Request):
+    body = await request.json()
+    failure = await _upstream("openai_embeddings", LLM_LATENCY / 4)
+    if failure:
+        return failure
+    inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+    dimensions = body.get("dimensions") or 256
+    return {
+        "object": "list",
+        "data": [{"object": "embedding", "index": i, "embedding": _embedding(str(text), dimensions)}
+                 for i, text in enumerate(inputs)],
+        "model": body.get("model", "stub"),
+        "usage": {"prompt_tokens": 0, "total_tokens": 0},
+    }
+
+
+# --- Tavily --------------------------------------------------------------
+
+
+@app.post("/tavily/search")
+async def tavily_search(request: Request):
+    body = await request.json()
+    failure = await _upstream("tavily_search", TAVILY_LATENCY)
+    if failure:
+        return failure
+    base = str(request.base_url).rstrip("/")
+    query = body.get("query", "")
+    return {
+        "query": query,
+        "answer": f"Summary for {query}. " + ARTICLE[:1500],
+        "results": [
+            {"title": f"Result {i} for {query}", "url": f"https://example.com/{i}", "content": ARTICLE[:800], "score": 0.9}
+            for i in range(body.get("max_results", 5))
+        ],
+        "images": [f"{base}/images/{name}.png" for name in _SEARCH_IMAGES] if body.get("include_images") else [],
+        "response_time": TAVILY_LATENCY,
+    }
+
+
+@app.post("/tavily/extract")
+async def tavily_extract(request: Request):
+    body = await request.json()
+    failure = await _upstream("tavily_extract", TAVILY_LATENCY)
+    if failure:
+        return failure
+    urls = body.get("urls") or []
+    urls = urls if isinstance(urls, list) else [urls]
+    return {"results": [{"url": url, "raw_content": ARTICLE} for url in urls], "failed_results": [],
+            "response_time": TAVILY_LATENCY}
+
+
+# --- LinkedIn ------------------------------------------------------------
+
+
+@app.post("/linkedin/oauth/v2/accessToken")
+async def linkedin_token():
+    failure = await _upstream("linkedin_oauth", LINKEDIN_LATENCY)
+    return failure or {"access_token": f"stub-{uuid.uuid4().hex}", "expires_in": 5184000}
+
+
+@app.get("/linkedin/v2/userinfo")
+async def linkedin_userinfo():
+    failure = await _upstream("linkedin_userinfo", LINKEDIN_LATENCY)
+    return failure or {"sub": "bench-user"}
+
+
+@app.get("/linkedin/v2/me")
+async def linkedin_me():
+    failure = await _upstream("linkedin_me", LINKEDIN_LATENCY)
+    return failure or {"id": "bench-user"}
+
+
+@app.post("/linkedin/v2/assets")
+async def linkedin_register(request: Request):
+    failure = await _upstream("linkedin_register", LINKEDIN_LATENCY)
+    if failure:
+        return failure
+    asset_id = uuid.uuid4().hex
+    base = str(request.base_url).rstrip("/")
+    return {"value": {
+        "uploadMechanism": {"com.linkedin.digitalmedia.uploading.MediaUploadHttpRequest": {
+            "uploadUrl": f"{base}/linkedin/upload/{asset_id}"}},
+        "asset": f"urn:li:digitalmediaAsset:{asset_id}",
+    }}
+
+
+@app.put("/linkedin/upload/{asset_id}")
+async def linkedin_upload(asset_id: str, request: Request):
+    size = 0
+    async for chunk in request.stream():
+        size += len(chunk)
+    failure = await _upstream("linkedin_upload", LINKEDIN_LATENCY)
+    return failure or Response(status_code=201)
+
+
+@app.post("/linkedin/v2/ugcPosts")
+async def linkedin_post():
+    failure = await _upstream("linkedin_post", LINKEDIN_LATENCY)
+    if failure:
+        return failure
+    return JSONResponse({"id": f"urn:li:share:{random.randint(10**15, 10**16)}"}, status_code=201)
+
+
+# --- Twitter -------------------------------------------------------------
+
+# media_id -> {"total": announced bytes, "received": bytes so far, "segments": count}
+_media: Dict[str, Dict[str, int]] = {}
+
+
+def _rate_limit_headers() -> Dict[str, str]:
+    return {"x-rate-limit-limit": "100", "x-rate-limit-remaining": "99", "x-rate-limit-reset": str(int(time.time()) + 900)}
+
+
+@app.api_route("/twitter/2/media/upload", methods=["GET", "POST"])
+async def twitter_media(request: Request):
+    form = await request.form() if request.method == "POST" else request.query_params
+    command = form.get("command")
+    failure = await _upstream(f"twitter_media_{str(command).lower()}", TWITTER_LATENCY / 3)
+    if failure:
+        return failure
+    if command == "INIT":
+        media_id = str(random.randint(10**17, 10**18))
+        _media[media_id] = {"total": int(form["total_bytes"]), "received": 0, "segments": 0}
+        return JSONResponse({"data": {"id": media_id, "expires_after_secs": 86400}}, status_code=202)
+    upload = _media.get(str(form.get("media_id")))
+    if upload is None:
+        return JSONResponse({"errors": [{"message": "unknown media_id"}]}, status_code=400)
+    if command == "APPEND":
+        if int(form["segment_index"]) != upload["segments"]:
+            return JSONResponse({"errors": [{"message": "segment out of order"}]}, status_code=400)
+        upload["received"] += len(await form["media"].read())
+        upload["segments"] += 1
+        return Response(status_code=204)
+    if command in ("FINALIZE", "STATUS"):
+        if upload["received"] != upload["total"]:
+            return JSONResponse({"errors": [{"message": "size mismatch"}]}, status_code=400)
+        return {"data": {"id": form["media_id"], "size": upload["total"], "processing_info": {"state": "succeeded"}}}
+    return JSONResponse({"errors": [{"message": f"bad command {command}"}]}, status_code=400)
+
+
+@app.post("/twitter/2/tweets")
+async def twitter_tweet(request: Request):
+    body = await request.json()
+    failure = await _upstream("twitter_tweet", TWITTER_LATENCY)
+    if failure:
+        return failure
+    if len(body.get("text", "")) > 280:
+        return JSONResponse({"errors": [{"message": "text too long"}]}, status_code=400)
+    return JSONResponse({"data": {"id": str(random.randint(10**17, 10**18)), "text": body["text"]}},
+                        status_code=201, headers=_rate_limit_headers())
+
+
+# --- Images --------------------------------------------------------------
+
+
+@functools.lru_cache(maxsize=None)
+def _png(width: int, height: int, size: int) -> bytes:
+    def block(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+    header = b"\x89PNG\r\n\x1a\n" + block(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+    raw = zlib.compress(b"".join(b"\x00" + b"\x80" * (width * 3) for _ in range(height)))
+    body = block(b"IDAT", raw) + block(b"IEND", b"")
+    # Pad with an ancillary chunk so the payload has the configured size.
+    padding = max(0, size - len(header) - len(body) - 12)
+    return header + block(b"tEXt", b"p\x00" + b"x" * max(0, padding - 2)) + body
+
+
+# Search results put unusable and poorer images ahead of the good ones, as real searches do.
+_SEARCH_IMAGES = ["dead-0", "tiny-1", "huge-2", "page-3", "square-4", "5", "6"]
+_HUGE_BYTES = 50 * 1024 * 1024
+
+
+@app.api_route("/images/{name}", methods=["GET", "HEAD"])
+async def image(name: str, request: Request):
+    failure = await _upstream("image", IMAGE_LATENCY)
+    if failure:
+        return failure
+    if name.startswith("dead-"):
+        return Response(status_code=404)
+    if name.startswith("page-"):
+        return Response("<html><body>Not an image</body></html>", media_type="text/html")
+    data = _png(*{"square-": (600, 600), "tiny-": (100, 50)}.get(name[:name.find("-") + 1], (1200, 627)), IMAGE_BYTES)
+    total = _HUGE_BYTES if name.startswith("huge-") else len(data)
+    headers = {"Accept-Ranges": "bytes"}
+    byte_range = request.headers.get("range")
+    if byte_range and byte_range.startswith("bytes="):
+        start, _, end = byte_range[len("bytes="):].partition("-")
+        first, last = int(start or 0), min(int(end) if end else len(data) - 1, len(data) - 1)
+        headers["Content-Range"] = f"bytes {first}-{last}/{total}"
+        return Response(data[first:last + 1], status_code=206, media_type="image/png", headers=headers)
+    if request.method == "HEAD":
+        headers["Content-Length"] = str(total)
+        return Response(status_code=200, media_type="image/png", headers=headers)
+    return Response(data, media_type="image/png", headers=headers)
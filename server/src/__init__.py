@@ -1 +1,4 @@
- 
\ No newline at end of file
+from dotenv import load_dotenv
+
+# Loaded once, before any module reads its settings from the environment.
+load_dotenv()
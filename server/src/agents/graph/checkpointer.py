@@ -0,0 +1,407 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import zlib
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+)
+from langgraph.checkpoint.memory import MemorySaver
+
+CHECKPOINT_BACKEND = os.getenv("CHECKPOINT_BACKEND", "sqlite")
+CHECKPOINT_DB_PATH = os.getenv("CHECKPOINT_DB_PATH", "agent_state.sqlite3")
+CHECKPOINT_KEEP_PER_THREAD = int(os.getenv("CHECKPOINT_KEEP_PER_THREAD", "5"))
+CHECKPOINT_FLUSH_BATCH = int(os.getenv("CHECKPOINT_FLUSH_BATCH", "64"))
+CHECKPOINT_COMPRESS_MIN_BYTES = int(os.getenv("CHECKPOINT_COMPRESS_MIN_BYTES", "512"))
+
+_COMPRESSED_SUFFIX = "+zlib"
+
+
+class SqliteCheckpointer(BaseCheckpointSaver):
+    """Durable checkpointer shared by every worker that points at the same file.
+
+    Checkpoints and pending writes are buffered and written in one
+    transaction per flush. Reads flush first, and the API flushes at the end
+    of every graph run, so a resume on another worker always sees the latest
+    step. Only the newest CHECKPOINT_KEEP_PER_THREAD checkpoints per thread
+    are kept, and large blobs are zlib-compressed.
+
+    Channel values are stored once per channel version, not inside every
+    checkpoint, so a step only writes the channels it changed.
+    """
+
+    def __init__(self, path: str = CHECKPOINT_DB_PATH, keep_per_thread: int = CHECKPOINT_KEEP_PER_THREAD,
+                 flush_batch: int = CHECKPOINT_FLUSH_BATCH, serde: Any = None):
+        super().__init__(serde=serde)
+        self.keep_per_thread = keep_per_thread
+        self.flush_batch = flush_batch
+        self._lock = threading.RLock()
+        self._pending_checkpoints: List[tuple] = []
+        self._pending_writes: List[Tuple[bool, tuple]] = []
+        self._pending_blobs: List[tuple] = []
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS checkpoints (
+                thread_id TEXT NOT NULL,
+                checkpoint_ns TEXT NOT NULL DEFAULT '',
+                checkpoint_id TEXT NOT NULL,
+                parent_checkpoint_id TEXT,
+                type TEXT,
+                checkpoint BLOB,
+                metadata_type TEXT,
+                metadata BLOB,
+                PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+            );
+            CREATE TABLE IF NOT EXISTS writes (
+                thread_id TEXT NOT NULL,
+                checkpoint_ns TEXT NOT NULL DEFAULT '',
+                checkpoint_id TEXT NOT NULL,
+                task_id TEXT NOT NULL,
+                idx INTEGER NOT NULL,
+                channel TEXT NOT NULL,
+                type TEXT,
+                value BLOB,
+                PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+            );
+            CREATE TABLE IF NOT EXISTS channel_blobs (
+                thread_id TEXT NOT NULL,
+                checkpoint_ns TEXT NOT NULL DEFAULT '',
+                channel TEXT NOT NULL,
+                version TEXT NOT NULL,
+                checkpoint_id TEXT NOT NULL,
+                type TEXT,
+                value BLOB,
+                PRIMARY KEY (thread_id, checkpoint_ns, channel, version)
+            );
+            """
+        )
+
+    # --- serialization -------------------------------------------------
+
+    def _dump(self, obj: Any) -> Tuple[str, bytes]:
+        type_, data = self.serde.dumps_typed(obj)
+        if len(data) >= CHECKPOINT_COMPRESS_MIN_BYTES:
+            return type_ + _COMPRESSED_SUFFIX, zlib.compress(data, 6)
+        return type_, data
+
+    def _load(self, type_: str, data: bytes) -> Any:
+        if type_.endswith(_COMPRESSED_SUFFIX):
+            type_, data = type_[: -len(_COMPRESSED_SUFFIX)], zlib.decompress(data)
+        return self.serde.loads_typed((type_, data))
+
+    # --- buffering -----------------------------------------------------
+
+    def _pending_count(self) -> int:
+        return len(self._pending_checkpoints) + len(self._pending_writes) + len(self._pending_blobs)
+
+    def flush(self) -> None:
+        with self._lock:
+            if not self._pending_count():
+                return
+            checkpoints, self._pending_checkpoints = self._pending_checkpoints, []
+            writes, self._pending_writes = self._pending_writes, []
+            blobs, self._pending_blobs = self._pending_blobs, []
+            threads: Set[Tuple[str, str]] = {(row[0], row[1]) for row in checkpoints}
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)", checkpoints
+                )
+                self._conn.executemany("INSERT OR REPLACE INTO channel_blobs VALUES (?, ?, ?, ?, ?, ?, ?)", blobs)
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    [row for replace, row in writes if replace],
+                )
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    [row for replace, row in writes if not replace],
+                )
+                for thread_id, checkpoint_ns in threads:
+                    self._prune(thread_id, checkpoint_ns)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    async def aflush(self) -> None:
+        if self._pending_count():
+            await asyncio.to_thread(self.flush)
+
+    def _prune(self, thread_id: str, checkpoint_ns: str) -> None:
+        self._conn.execute(
+            "DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id NOT IN ("
+            " SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?"
+            " ORDER BY checkpoint_id DESC LIMIT ?)",
+            (thread_id, checkpoint_ns, thread_id, checkpoint_ns, self.keep_per_thread),
+        )
+        self._conn.execute(
+            "DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id NOT IN ("
+            " SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?)",
+            (thread_id, checkpoint_ns, thread_id, checkpoint_ns),
+        )
+        # A channel value is still needed while any kept checkpoint predates its replacement.
+        self._conn.execute(
+            "DELETE FROM channel_blobs WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id < ("
+            " SELECT MIN(checkpoint_id) FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?)"
+            " AND EXISTS (SELECT 1 FROM channel_blobs AS newer WHERE newer.thread_id = channel_blobs.thread_id"
+            " AND newer.checkpoint_ns = channel_blobs.checkpoint_ns AND newer.channel = channel_blobs.channel"
+            " AND newer.checkpoint_id > channel_blobs.checkpoint_id AND newer.checkpoint_id <= ("
+            " SELECT MIN(checkpoint_id) FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?))",
+            (thread_id, checkpoint_ns, thread_id, checkpoint_ns, thread_id, checkpoint_ns),
+        )
+
+    # --- BaseCheckpointSaver -------------------------------------------
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        self.flush()
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = get_checkpoint_id(config)
+        with self._lock:
+            if checkpoint_id:
+                row = self._conn.execute(
+                    "SELECT checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata"
+                    " FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    (str(thread_id), checkpoint_ns, checkpoint_id),
+                ).fetchone()
+            else:
+                row = self._conn.execute(
+                    "SELECT checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata"
+                    " FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?"
+                    " ORDER BY checkpoint_id DESC LIMIT 1",
+                    (str(thread_id), checkpoint_ns),
+                ).fetchone()
+            if row is None:
+                return None
+            writes = self._conn.execute(
+                "SELECT task_id, channel, type, value FROM writes"
+                " WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx",
+                (str(thread_id), checkpoint_ns, row[0]),
+            ).fetchall()
+            return self._to_tuple(str(thread_id), checkpoint_ns, row, writes)
+
+    def _channel_values(self, thread_id: str, checkpoint_ns: str, versions: ChannelVersions) -> Dict[str, Any]:
+        wanted = {(channel, str(version)) for channel, version in versions.items()}
+        rows = self._conn.execute(
+            "SELECT channel, version, type, value FROM channel_blobs WHERE thread_id = ? AND checkpoint_ns = ?",
+            (thread_id, checkpoint_ns),
+        ).fetchall()
+        return {
+            channel: self._load(type_, value)
+            for channel, version, type_, value in rows
+            if (channel, version) in wanted and type_ != "empty"
+        }
+
+    def _to_tuple(self, thread_id: str, checkpoint_ns: str, row: tuple, writes: list) -> CheckpointTuple:
+        # Called with the lock held.
+        checkpoint_id, parent_checkpoint_id, type_, data, metadata_type, metadata = row
+        checkpoint = self._load(type_, data)
+        if "channel_values" not in checkpoint:
+            checkpoint["channel_values"] = self._channel_values(thread_id, checkpoint_ns, checkpoint["channel_versions"])
+        return CheckpointTuple(
+            {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id}},
+            checkpoint,
+            self._load(metadata_type, metadata),
+            (
+                {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": parent_checkpoint_id}}
+                if parent_checkpoint_id
+                else None
+            ),
+            [(task_id, channel, self._load(w_type, value)) for task_id, channel, w_type, value in writes],
+        )
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        self.flush()
+        query = (
+            "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint,"
+            " metadata_type, metadata FROM checkpoints"
+        )
+        clauses, params = [], []
+        if config is not None:
+            clauses.append("thread_id = ?")
+            params.append(str(config["configurable"]["thread_id"]))
+            if config["configurable"].get("checkpoint_ns") is not None:
+                clauses.append("checkpoint_ns = ?")
+                params.append(config["configurable"]["checkpoint_ns"])
+        if before is not None and get_checkpoint_id(before):
+            clauses.append("checkpoint_id < ?")
+            params.append(get_checkpoint_id(before))
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY checkpoint_id DESC"
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        yielded = 0
+        for thread_id, checkpoint_ns, *row in rows:
+            if limit is not None and yielded >= limit:
+                return
+            if filter:
+                metadata = self._load(row[4], row[5])
+                if not all(metadata.get(k) == v for k, v in filter.items()):
+                    continue
+            with self._lock:
+                writes = self._conn.execute(
+                    "SELECT task_id, channel, type, value FROM writes"
+                    " WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx",
+                    (thread_id, checkpoint_ns, row[0]),
+                ).fetchall()
+                item = self._to_tuple(thread_id, checkpoint_ns, tuple(row), writes)
+            yielded += 1
+            yield item
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = str(config["configurable"]["thread_id"])
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        skeleton = checkpoint.copy()
+        values: Dict[str, Any] = skeleton.pop("channel_values")  # type: ignore[misc]
+        blobs = []
+        for channel, version in new_versions.items():
+            blob_type, blob = self._dump(values[channel]) if channel in values else ("empty", b"")
+            blobs.append((thread_id, checkpoint_ns, channel, str(version), checkpoint["id"], blob_type, blob))
+        type_, data = self._dump(skeleton)
+        metadata_type, metadata_data = self._dump(dict(metadata))
+        with self._lock:
+            self._pending_blobs.extend(blobs)
+            self._pending_checkpoints.append((
+                thread_id, checkpoint_ns, checkpoint["id"], config["configurable"].get("checkpoint_id"),
+                type_, data, metadata_type, metadata_data,
+            ))
+            if self._pending_count() >= self.flush_batch:
+                self.flush()
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint["id"]}}
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        thread_id = str(config["configurable"]["thread_id"])
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        # Special channels (errors, interrupts, resumes) overwrite; regular writes are first-wins.
+        replace = all(channel in WRITES_IDX_MAP for channel, _ in writes)
+        rows = []
+        for idx, (channel, value) in enumerate(writes):
+            type_, data = self._dump(value)
+            rows.append((replace, (
+                thread_id, checkpoint_ns, checkpoint_id, task_id,
+                WRITES_IDX_MAP.get(channel, idx), channel, type_, data,
+            )))
+        with self._lock:
+            self._pending_writes.extend(rows)
+            if self._pending_count() >= self.flush_batch:
+                self.flush()
+
+    def thread_sizes(self) -> Dict[str, int]:
+        """Stored bytes per thread, checkpoints plus pending writes."""
+        self.flush()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT thread_id, SUM(size) FROM ("
+                " SELECT thread_id, LENGTH(checkpoint) + LENGTH(metadata) AS size FROM checkpoints"
+                " UNION ALL SELECT thread_id, LENGTH(value) AS size FROM writes"
+                " UNION ALL SELECT thread_id, LENGTH(value) AS size FROM channel_blobs"
+                ") GROUP BY thread_id"
+            ).fetchall()
+        return {thread_id: int(size or 0) for thread_id, size in rows}
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            self._pending_checkpoints = [r for r in self._pending_checkpoints if r[0] != str(thread_id)]
+            self._pending_writes = [(rep, r) for rep, r in self._pending_writes if r[0] != str(thread_id)]
+            self._pending_blobs = [r for r in self._pending_blobs if r[0] != str(thread_id)]
+            self._conn.execute("DELETE FROM checkpoints WHERE thread_id = ?", (str(thread_id),))
+            self._conn.execute("DELETE FROM writes WHERE thread_id = ?", (str(thread_id),))
+            self._conn.execute("DELETE FROM channel_blobs WHERE thread_id = ?", (str(thread_id),))
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        items = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for item in items:
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+
+def make_checkpointer() -> BaseCheckpointSaver:
+    if CHECKPOINT_BACKEND == "memory":
+        return MemorySaver()
+    return SqliteCheckpointer()
+
+
+async def flush_checkpointer(saver: BaseCheckpointSaver) -> None:
+    """Persist any buffered steps; no-op for backends that write through."""
+    if isinstance(saver, SqliteCheckpointer):
+        await saver.aflush()
+
+
+def checkpoint_sizes(saver: BaseCheckpointSaver) -> Dict[str, int]:
+    """Best-effort serialized size of each thread held by `saver`."""
+    if isinstance(saver, SqliteCheckpointer):
+        return saver.thread_sizes()
+    sizes: Dict[str, int] = {}
+    if isinstance(saver, MemorySaver):
+        for thread_id, namespaces in list(saver.storage.items()):
+            for checkpoints in list(namespaces.values()):
+                for checkpoint, metadata, _ in list(checkpoints.values()):
+                    sizes[thread_id] = sizes.get(thread_id, 0) + len(checkpoint[1]) + len(metadata[1])
+        for key, (_, data) in list(saver.blobs.items()):
+            sizes[key[0]] = sizes.get(key[0], 0) + len(data)
+    return sizes
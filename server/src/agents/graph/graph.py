@@ -5,36 +5,51 @@ from src.config.schema import AgentState
 from src.agents.nodes.EntryNode import llm_entry_node
 from src.agents.nodes.GeneratePost import generate_post_node
 from src.services.content.TaviliTool import tavily_search
-from src.agents.nodes.SearchImage import search_image_node
+from src.agents.nodes.SearchImage import image_research_node, search_image_node
 from src.agents.nodes.FeedbackPost import feedback_post_node
 from src.agents.nodes.FeedbackImage import image_feedback_node
 from src.agents.nodes.UploadNode import upload_node
-from langgraph.checkpoint.memory import MemorySaver
-from langgraph.graph import START
+from src.agents.graph.checkpointer import make_checkpointer
+from src.services.telemetry import traced_node
+from langgraph.graph import START, END
+from typing import List, Union
 
-import asyncio
+import functools
 
-def route_from_llm(State:AgentState) -> str:
+def route_from_llm(State:AgentState) -> Union[str, List[str]]:
     last_message=State.messages[-1]
     if len(getattr(last_message, "tool_calls", [])) > 0:
-        return "tools_node"
+        target = "tools_node"
     else:
-        return "generate_post_node"         
+        target = "generate_post_node"
+    # Image posts look for candidate images in parallel with the text research.
+    if State.image_wanted and not State.image_candidates:
+        return [target, "image_research_node"]
+    return target
 
 
-graph = StateGraph(AgentState)
+def build_graph():
+    graph = StateGraph(AgentState)
 
+    graph.add_node("entry_node",traced_node("entry_node",llm_entry_node))
+    graph.add_node("tools_node",traced_node("tools_node",ToolNode(tools=[tavily_search])))
+    graph.add_node("generate_post_node",traced_node("generate_post_node",generate_post_node))
+    graph.add_node("image_research_node",traced_node("image_research_node",image_research_node))
+    graph.add_node("search_image_node",traced_node("search_image_node",search_image_node))
+    graph.add_node("feedback_post_node",traced_node("feedback_post_node",feedback_post_node))
+    graph.add_node("image_feedback_node",traced_node("image_feedback_node",image_feedback_node))
+    graph.add_node("upload_node",traced_node("upload_node",upload_node))
+    graph.add_edge(START, "entry_node")
+    graph.add_conditional_edges("entry_node",route_from_llm,["tools_node","generate_post_node","image_research_node"])
+    graph.add_edge("image_research_node", END)
+    graph.add_edge("tools_node", "generate_post_node")
+    return graph.compile(checkpointer=checkpointer)
 
-graph.add_node("entry_node",llm_entry_node)
-graph.add_node("tools_node",ToolNode(tools=[tavily_search]))
-graph.add_node("generate_post_node",generate_post_node)
-graph.add_node("search_image_node",search_image_node)
-graph.add_node("feedback_post_node",feedback_post_node)
-graph.add_node("image_feedback_node",image_feedback_node)
-graph.add_node("upload_node",upload_node)
-graph.add_edge(START, "entry_node")
-graph.add_conditional_edges("entry_node",route_from_llm)
-graph.add_edge("tools_node", "generate_post_node")
 
-memory=MemorySaver()
-graph=graph.compile(checkpointer=memory)
+checkpointer=make_checkpointer()
+
+
+@functools.lru_cache(maxsize=None)
+def get_graph():
+    """The compiled graph, built on first use; the app lifespan builds it at startup."""
+    return build_graph()
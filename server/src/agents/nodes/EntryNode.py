@@ -1,22 +1,42 @@
+import functools
+import uuid
 from src.config.schema import AgentState
-from langchain_core.messages import SystemMessage, HumanMessage
-from src.config.llmconfig import llm
+from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
+from src.config.llmconfig import call_llm, get_hedge_llm, get_llm
 from src.services.content.TaviliTool import tavily_search
 
+SYSTEM_MSG = (
+    "You're a smart social content agent.\n"
+    "- If the user input is a URL, use the `tavily_search` tool with the URL to extract article content.\n"
+    "- If the input is a topic, decide if web search would help before generating a post.\n"
+    "- If confident, you may generate a post without tool use."
+)
 
-async def llm_entry_node(state: AgentState) -> AgentState:
-    user_input = state.url or state.topic
-    state.messages.append(HumanMessage(content=f"Input: {user_input}"))
-    system_msg = (
-        "You're a smart social content agent.\n"
-        "- If the user input is a URL, use the `tavily_search` tool with the URL to extract article content.\n"
-        "- If the input is a topic, decide if web search would help before generating a post.\n"
-        "- If confident, you may generate a post without tool use."
+@functools.lru_cache(maxsize=None)
+def tool_models():
+    """Chat model and hedge with the research tool bound; built once, since bind_tools
+    creates a new runnable and tool schema on every call."""
+    hedge = get_hedge_llm()
+    return get_llm().bind_tools([tavily_search]), hedge.bind_tools([tavily_search]) if hedge else None
+
+
+def url_extraction_call(url: str) -> AIMessage:
+    """The tool call the model is instructed to make for URL inputs, built without asking it."""
+    return AIMessage(
+        content="",
+        tool_calls=[{"name": tavily_search.name, "args": {"query": url}, "id": f"call_{uuid.uuid4().hex[:24]}"}],
     )
-    llm_with_tools=llm.bind_tools([tavily_search])
-    response = llm_with_tools.invoke([
-        SystemMessage(content=system_msg),
-        HumanMessage(content=f"Input: {user_input}")
-    ])
-    state.messages.append(response)
-    return state
\ No newline at end of file
+
+
+async def llm_entry_node(state: AgentState) -> dict:
+    user_input = state.url or state.topic
+    request = HumanMessage(content=f"Input: {user_input}")
+    if state.url:
+        # URLs always go to extraction, so skip the LLM round trip that would only decide that.
+        return {"messages": [request, url_extraction_call(str(state.url))]}
+    model, hedge = tool_models()
+    response = await call_llm([
+        SystemMessage(content=SYSTEM_MSG),
+        request
+    ], model=model, hedge=hedge)
+    return {"messages": [request, response]}
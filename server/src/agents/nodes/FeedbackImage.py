@@ -4,11 +4,11 @@ from langgraph.types import interrupt, Command
 def image_feedback_node(state:AgentState):
     value = interrupt({
         "content": state.image_url,
+        "candidates": state.image_candidates,
         "type": "image feedback"
     })
 
     if "image_url" in value:
-        state.image_url = value["image_url"]
-        return Command(update=state, goto="upload_node")
+        return Command(update={"image_url": value["image_url"]}, goto="upload_node")
     elif "satisfied" in value:
-        return Command(goto="upload_node")
\ No newline at end of file
+        return Command(goto="upload_node")
@@ -1,25 +1,40 @@
-from turtle import st
 from src.config.schema import AgentState
 from langgraph.types import interrupt, Command
 
 def feedback_post_node(state: AgentState):
     value = interrupt({
         "content": state.post_draft,
+        "variants": state.post_variants,
+        "drafts": state.post_drafts,
         "type": "post feedback"
     })
 
+    # Only the fields changed here are sent back, so the checkpoint does not re-store the rest.
+    after_approval = "search_image_node" if state.image_wanted else "upload_node"
     if "user_edit" in value:
-        state.post_draft = value["user_edit"]
-        if state.image_wanted:
-            return Command(update=state, goto="search_image_node")
-        else:
-            return Command(update=state, goto="upload_node")
+        edit = value["user_edit"]
+        # A plain string edits the primary draft; a {platform: text} mapping edits several.
+        edits = edit if isinstance(edit, dict) else {state.platform: edit}
+        drafts = {**state.post_drafts, **{p: str(t) for p, t in edits.items() if p in state.platforms}}
+        return Command(update={
+            "post_drafts": drafts,
+            "post_draft": drafts.get(state.platform, state.post_draft),
+        }, goto=after_approval)
     elif "feedback" in value:
-        state.feedback_text = value["feedback"]
-        return Command(update=state, goto="generate_post_node") 
+        return Command(update={"feedback_text": value["feedback"]}, goto="generate_post_node")
+    elif "select_variant" in value:
+        try:
+            index = int(value["select_variant"])
+        except (TypeError, ValueError):
+            index = -1
+        if not 0 <= index < len(state.post_variants):
+            # Ask again rather than publishing something the user did not pick.
+            return Command(goto="feedback_post_node")
+        draft = state.post_variants[index]
+        return Command(update={
+            "post_draft": draft,
+            "post_drafts": {**state.post_drafts, state.platform: draft},
+            "post_variants": [],
+        }, goto=after_approval)
     elif "satisfied" in value:
-        if state.image_wanted:
-            return Command(goto="search_image_node")
-        else:
-            return Command(goto="upload_node")
-    
\ No newline at end of file
+        return Command(goto=after_approval)
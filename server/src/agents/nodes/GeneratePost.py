@@ -1,43 +1,148 @@
-from turtle import st
+import asyncio
+import logging
+import os
+from typing import Any, Dict, List, Optional, Tuple
 from src.config.schema import AgentState
-from langchain_core.messages import ToolMessage, AIMessage, HumanMessage
-from src.config.llmconfig import llm
+from langchain_core.messages import ToolMessage, AIMessage, HumanMessage, BaseMessage
+from src.config.llmconfig import LLM_MODEL, call_llm, get_llm, openai_upstream
 from langgraph.types import Command
+from src.services.content.context_builder import build_research_context, build_revision_messages, count_tokens
+from src.services.content.generation_cache import find_drafts, store_drafts
+from src.services.blob_store import BlobNotFound, offload, resolve
+from src.services.content.TaviliTool import tavily_search
 
-async def generate_post_node(state: AgentState):
-    # If feedback_text is present, add it as HumanMessage and get LLM response
-    if getattr(state, 'feedback_text', None):
-        feedback_msg = HumanMessage(content=state.feedback_text or "")
-        state.messages.append(feedback_msg)
-        ai_response = await llm.ainvoke(state.messages)
-        state.messages.append(ai_response)
-        state.feedback_text = None
-        state.post_draft=str(ai_response.content)
-        return Command(update=state, goto="feedback_post_node")
+logger = logging.getLogger(__name__)
+
+# "styles": one concurrent call per style hint below; "sample": a single call with n
+# completions of the same prompt (prompt tokens billed once, less varied output).
+POST_VARIANT_STRATEGY = os.getenv("POST_VARIANT_STRATEGY", "styles")
+# The first variant follows the prompt as written. Hints go last so every call
+# shares the research context as a common prompt prefix.
+VARIANT_STYLES = [
+    "",
+    "Variant: open with a bold, surprising hook and keep the rest punchy.",
+    "Variant: keep it short, at most three sentences.",
+    "Variant: use a warm, conversational first-person tone.",
+    "Variant: lead with a concrete example or number and end with a question to the reader.",
+]
+POST_VARIANTS_MAX = int(os.getenv("POST_VARIANTS_MAX", "4"))
+if POST_VARIANT_STRATEGY == "styles":
+    POST_VARIANTS_MAX = min(POST_VARIANTS_MAX, len(VARIANT_STYLES))
+
+
+def research_sources(state: AgentState) -> List[str]:
+    """The text of every research result, fetched again when its blob has expired."""
+    queries = {call["id"]: call["args"].get("query")
+               for msg in state.messages if isinstance(msg, AIMessage) for call in msg.tool_calls}
+    sources = []
+    for msg in state.messages:
+        if not isinstance(msg, ToolMessage):
+            continue
+        try:
+            sources.append(resolve(str(msg.content)))
+        except BlobNotFound:
+            # Drafting from an empty context would produce a post about nothing.
+            query = queries.get(msg.tool_call_id)
+            if not query:
+                raise
+            logger.warning("research blob missing, researching again", extra={"query": query})
+            sources.append(resolve(tavily_search.invoke(query)))
+    return sources
 
-    content = "".join([str(msg.content) for msg in state.messages if isinstance(msg, ToolMessage)])
 
-    if not content:
+def research_context(state: AgentState) -> str:
+    """Token-bounded excerpt of everything the research step gathered.
+
+    Blocking (blob store reads, possibly a new search); call it off the event loop.
+    """
+    sources = research_sources(state)
+    if not sources:
         for msg in reversed(state.messages):
-            if isinstance(msg, AIMessage):
-                content = msg.content
+            if isinstance(msg, AIMessage) and msg.content:
+                sources = [str(msg.content)]
                 break
+    return build_research_context(sources, query=state.topic or str(state.url or ""))
+
 
-    platform = state.platform
+def post_prompt(state: AgentState, content: str, platform: str) -> str:
     prompt = (
         f"Use the following content to write a professional post for {platform}:"
         f"\n\n{content}"
     )
     if getattr(state, 'topic', None):
         prompt += f"\n\nWrite according to this query: {state.topic}"
-    print("THIS IS THE PROMPT____________________________________________________")
-    print(prompt)
-    print("THIS IS THE PROMPT____________________________________________________")
+    return prompt
+
+
+async def draft_variants(messages: List[BaseMessage], count: int, metadata: Optional[Dict[str, Any]] = None) -> List[AIMessage]:
+    """`count` drafts for the same prompt, generated concurrently.
 
-    state.messages.append(HumanMessage(content=prompt))
-    response = await llm.ainvoke([HumanMessage(content=prompt)])
-    state.post_draft = str(response.content)
-    state.messages.append(response)
-    return Command(update=state, goto="feedback_post_node")
+    `metadata` is attached to each call so streamed tokens can be told apart.
+    """
+    metadata = metadata or {}
+    if count <= 1:
+        return [await call_llm(messages, config={"metadata": metadata})]
+    if POST_VARIANT_STRATEGY == "sample":
+        result = await openai_upstream.call(lambda: get_llm().agenerate([messages], n=count, stream=False, metadata=metadata))
+        return [generation.message for generation in result.generations[0]]  # type: ignore[attr-defined]
+    calls = [
+        call_llm(messages + [HumanMessage(content=hint)] if hint else messages,
+                 config={"metadata": {**metadata, "variant": i}})
+        for i, hint in enumerate(VARIANT_STYLES[:count])
+    ]
+    return list(await asyncio.gather(*calls))
 
 
+async def first_drafts(state: AgentState, platform: str, context: str) -> Tuple[HumanMessage, AIMessage, List[str]]:
+    prompt = post_prompt(state, context, platform)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("post prompt", extra={"platform": platform, "prompt_tokens": count_tokens(prompt), "prompt": prompt})
+
+    # The prompt embeds the research context; the message log keeps a reference to it instead.
+    logged_prompt = HumanMessage(content=await asyncio.to_thread(offload, prompt))
+    # Revisions depend on the user's feedback and are never cached; first drafts are.
+    drafts, pending = None, None
+    if state.use_generation_cache:
+        drafts, pending = await find_drafts(platform, context, state.topic, state.variant_count, LLM_MODEL)
+    if drafts is not None:
+        return logged_prompt, AIMessage(content=drafts[0]), drafts
+    responses = await draft_variants([HumanMessage(content=prompt)], state.variant_count, {"platform": platform})
+    drafts = [str(r.content) for r in responses]
+    await store_drafts(pending, drafts)
+    return logged_prompt, responses[0], drafts
+
+
+async def revised_drafts(state: AgentState, platform: str, context: str, feedback: str) -> List[AIMessage]:
+    messages = build_revision_messages(post_prompt(state, context, platform), state.draft_for(platform),
+                                       state.feedback_history, feedback)
+    return await draft_variants(messages, state.variant_count, {"platform": platform})
+
+
+async def generate_post_node(state: AgentState):
+    # Only the fields written here are returned: image research may update the
+    # state in the same step, and full-state updates would collide with it.
+    # Every platform is drafted concurrently from the same research context.
+    context = await asyncio.to_thread(research_context, state)
+
+    # If feedback_text is present, revise the current drafts from a bounded prompt
+    if getattr(state, 'feedback_text', None):
+        feedback = state.feedback_text or ""
+        revisions = await asyncio.gather(*(revised_drafts(state, p, context, feedback) for p in state.platforms))
+        responses = revisions[0]
+        return Command(update={
+            "messages": [HumanMessage(content=feedback), responses[0]],
+            "feedback_history": state.feedback_history + [feedback],
+            "feedback_text": None,
+            "post_draft": str(responses[0].content),
+            "post_drafts": {p: str(r[0].content) for p, r in zip(state.platforms, revisions)},
+            "post_variants": [str(r.content) for r in responses] if len(responses) > 1 else [],
+        }, goto="feedback_post_node")
+
+    results = await asyncio.gather(*(first_drafts(state, p, context) for p in state.platforms))
+    logged_prompt, response, drafts = results[0]
+    return Command(update={
+        "messages": [logged_prompt, response],
+        "post_draft": drafts[0],
+        "post_drafts": {p: d[0] for p, (_, _, d) in zip(state.platforms, results)},
+        "post_variants": drafts if len(drafts) > 1 else [],
+    }, goto="feedback_post_node")
@@ -1,18 +1,111 @@
-from src.config.schema import AgentState
-from tavily import TavilyClient
-from dotenv import load_dotenv
+import asyncio
+import logging
 import os
+import re
+from typing import Any, List, Sequence
+from urllib.parse import urlsplit
+
+from src.config.schema import AgentState
+from src.services.content.TaviliTool import cached_search
+from src.services.social import linkedin, media, twitter
 from langgraph.types import Command
-load_dotenv()
 
+IMAGE_CANDIDATES_MAX = int(os.getenv("IMAGE_CANDIDATES_MAX", "5"))
+# Search results probed per session; dead links and oversized files are common, so take more than we keep.
+IMAGE_PROBE_CANDIDATES = int(os.getenv("IMAGE_PROBE_CANDIDATES", "8"))
+# Image search is optional, so it gets a shorter deadline than text research.
+IMAGE_SEARCH_TIMEOUT = float(os.getenv("IMAGE_SEARCH_TIMEOUT", "8"))
+# Site furniture that image search tends to return next to real pictures.
+_NON_PHOTO_HINTS = ("logo", "icon", "avatar", "sprite", "badge", "favicon", "placeholder")
+_NON_PHOTO_EXTENSIONS = (".svg", ".ico")
+_WORD = re.compile(r"[a-z0-9]+")
+
+logger = logging.getLogger(__name__)
+
+
+def image_query(state: AgentState) -> str:
+    """What to search images for before a draft exists: the topic, or words from the URL slug."""
+    if state.topic:
+        return state.topic
+    if state.url:
+        parts = urlsplit(state.url)
+        slug = next((p for p in reversed(parts.path.split("/")) if p), "")
+        words = _WORD.findall(os.path.splitext(slug)[0].lower())
+        # Bare ids and dates make poor queries; fall back to the site name.
+        words = [w for w in words if not w.isdigit()]
+        return " ".join(words) or parts.netloc
+    return ""
+
+
+def rank_image_candidates(images: Sequence[Any], query: str, limit: int = IMAGE_CANDIDATES_MAX) -> List[str]:
+    """Distinct image URLs from a search result, likely photos first, search order kept on ties.
+
+    Accepts both plain URLs and Tavily's {"url", "description"} image entries.
+    """
+    terms = set(_WORD.findall(query.lower()))
+    scored = []
+    seen = set()
+    for position, image in enumerate(images):
+        url = image.get("url") if isinstance(image, dict) else image
+        if not isinstance(url, str) or not url.startswith(("http://", "https://")) or url in seen:
+            continue
+        seen.add(url)
+        path = urlsplit(url).path.lower()
+        if path.endswith(_NON_PHOTO_EXTENSIONS) or any(hint in path for hint in _NON_PHOTO_HINTS):
+            continue
+        description = (image.get("description") or "") if isinstance(image, dict) else ""
+        text = path + " " + description.lower()
+        overlap = len(terms & set(_WORD.findall(text)))
+        scored.append((-overlap, position, url))
+    scored.sort()
+    return [url for _, _, url in scored[:limit]]
+
+
+def image_max_bytes(platforms: Sequence[str]) -> int:
+    """Largest image every target platform accepts."""
+    limits = {"linkedin": linkedin.IMAGE_MAX_BYTES, "twitter": twitter.TWITTER_IMAGE_MAX_BYTES}
+    return min(limits[p] for p in platforms)
+
+
+def find_image_candidates(query: str) -> List[str]:
+    search = cached_search(query[:400], timeout=IMAGE_SEARCH_TIMEOUT, search_depth="basic", include_images=True)
+    return rank_image_candidates((search or {}).get("images") or [], query, limit=IMAGE_PROBE_CANDIDATES)
+
+
+async def verified_image_candidates(query: str, state: AgentState) -> List[str]:
+    """Search results that are reachable images within the platforms' size limits, best first."""
+    urls = await asyncio.to_thread(find_image_candidates, query)
+    verified = await media.verify_image_candidates(urls, image_max_bytes(state.platforms))
+    logger.info("image candidates verified", extra={"found": len(urls), "usable": len(verified)})
+    return verified[:IMAGE_CANDIDATES_MAX]
+
+
+async def image_research_node(state: AgentState) -> dict:
+    """Image search run alongside text research so candidates are ready at image feedback."""
+    query = image_query(state)
+    try:
+        candidates = await verified_image_candidates(query, state) if query else []
+    except Exception as e:
+        # Candidates are an optimisation; search_image_node searches again if this fails.
+        logger.warning("image research failed", extra={"error": str(e)})
+        candidates = []
+    return {"image_candidates": candidates}
 
-def search_image_node(state:AgentState)-> Command:
-    client = TavilyClient(api_key=os.getenv("TAVILY_API_KEY"))
-    query = (state.post_draft or "")[:400]
-    search = client.search(query=query, search_depth="basic", include_images=True)
-    image_url = None
 
-    if search and search.get("images"):
-        image_url = search["images"][0]
+async def search_image_node(state:AgentState)-> Command:
+    candidates = state.image_candidates
+    if not candidates:
+        try:
+            candidates = await verified_image_candidates(state.post_draft or "", state)
+        except Exception as e:
+            # Skip the image rather than fail the post; the user can still supply one at image feedback.
+            logger.warning("image search skipped", extra={"error": str(e)})
+            candidates = []
+    # Download the pick before the user reviews it, so publishing uploads from the local cache;
+    # a candidate that fails the full download is dropped for the next one.
+    max_bytes = image_max_bytes(state.platforms)
+    while candidates and not await media.prefetch_image(candidates[0], max_bytes):
+        candidates = candidates[1:]
+    image_url = candidates[0] if candidates else None
 
-    return Command(update={"image_url": image_url},goto="image_feedback_node")
\ No newline at end of file
+    return Command(update={"image_url": image_url, "image_candidates": candidates},goto="image_feedback_node")
@@ -1,25 +1,68 @@
+import asyncio
+import logging
+import os
+from typing import Any, Dict, Optional
 from src.config.schema import AgentState
 from langgraph.types import Command
-from langgraph.graph import END 
-from src.services.social.twitter import upload_to_twitter
-from src.services.social.linkedin import post_to_linkedin
+from langgraph.graph import END
+from src.services.publish_queue import FAILED, FINAL_STATUSES, SUCCEEDED, publish_queue
 
-def upload_node(state: AgentState):
-    success = False
-    post_url = None
+# How long an immediate publish may hold the request before the session ends
+# with the job still queued (e.g. while it backs off from a rate limit).
+PUBLISH_WAIT_SECONDS = float(os.getenv("PUBLISH_WAIT_SECONDS", "10"))
 
-    if state.platform == "twitter":
-        success, post_url = upload_to_twitter(content=state.post_draft, image_url=state.image_url or "")
-    elif state.platform == "linkedin":
-        print("linkedin_access_token", state.linkedin_access_token)
-        if state.linkedin_access_token:
-            success, post_url = post_to_linkedin(
-                access_token=state.linkedin_access_token,
-                content=state.post_draft,
-                image_url=state.image_url
-            )
+logger = logging.getLogger(__name__)
 
-    state.upload_success = success
-    state.post_url = post_url
+async def previous_job(state: AgentState, platform: str) -> Optional[Dict[str, Any]]:
+    """The platform's job from an earlier attempt of this session, unless it is known to have failed.
 
-    return Command(update=state, goto=END if success else "feedback_post_node")
\ No newline at end of file
+    Posted, pending, scheduled and unknown-outcome jobs all count: after a
+    revision the draft differs, so enqueueing it would add a second post
+    rather than replace the first.
+    """
+    previous = state.publish_results.get(platform)
+    if not previous or previous["status"] == FAILED:
+        return None
+    job = await publish_queue.aget(previous["job_id"]) if previous["job_id"] else None
+    if job is None:
+        # The job row is gone, so it cannot run again; only a recorded success still counts.
+        if previous["status"] != SUCCEEDED:
+            return None
+        return {"job_id": previous["job_id"], "status": SUCCEEDED, "post_id": previous["post_url"], "last_error": None}
+    return job if job["status"] != FAILED else None
+
+async def publish_to(state: AgentState, platform: str) -> Dict[str, Any]:
+    """Queue the platform's draft and, for immediate posts, wait for the outcome."""
+    job = await previous_job(state, platform)
+    if job is None:
+        if platform == "linkedin" and not state.linkedin_access_token:
+            logger.warning("linkedin upload without access token")
+            return {"job_id": None, "status": FAILED, "post_url": None, "error": "missing linkedin access token"}
+        job = await publish_queue.aenqueue(
+            platform=platform,
+            content=state.draft_for(platform),
+            image_url=state.image_url,
+            access_token=state.access_token_for(platform),
+            publish_at=state.publish_at,
+        )
+    if state.publish_at is None and job["status"] not in FINAL_STATUSES:
+        job = await publish_queue.wait(job["job_id"], PUBLISH_WAIT_SECONDS) or job
+    return {"job_id": job["job_id"], "status": job["status"], "post_url": job["post_id"], "error": job["last_error"]}
+
+async def upload_node(state: AgentState):
+    # Platforms publish in parallel; each gets its own job, rate limits and retries.
+    outcomes = await asyncio.gather(*(publish_to(state, p) for p in state.platforms))
+    results = dict(zip(state.platforms, outcomes))
+    primary = results[state.platform]
+
+    update = {
+        "publish_results": results,
+        "publish_job_id": primary["job_id"],
+        "publish_status": primary["status"],
+        "upload_success": all(r["status"] == SUCCEEDED for r in outcomes),
+        "post_url": primary["post_url"],
+    }
+    # A rejected post goes back to the user; queued, scheduled or unknown-outcome ones finish the session,
+    # since approving an unknown outcome again could post it twice.
+    failed = any(r["status"] == FAILED for r in outcomes)
+    return Command(update=update, goto="feedback_post_node" if failed else END)
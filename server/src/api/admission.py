@@ -0,0 +1,253 @@
+import asyncio
+import logging
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from typing import AsyncIterator, Deque, Dict, Optional
+
+from fastapi import Request
+
+from src.services.telemetry import record_admission, record_admission_load, record_admission_wait
+
+# Limits are per worker process; divide the upstream budget by the number of workers.
+ADMISSION_MAX_RUNNING = int(os.getenv("ADMISSION_MAX_RUNNING", "16"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "64"))
+# Requests expected to wait longer than this are shed with 429 instead of queued.
+ADMISSION_MAX_WAIT = float(os.getenv("ADMISSION_MAX_WAIT", "30"))
+# Graph runs per second each user earns, and how many they may spend at once; 0 disables the limit.
+ADMISSION_USER_RATE = float(os.getenv("ADMISSION_USER_RATE", "0.5"))
+ADMISSION_USER_BURST = float(os.getenv("ADMISSION_USER_BURST", "10"))
+# Starting estimate of one graph run, refined from finished runs.
+ADMISSION_RUN_SECONDS = float(os.getenv("ADMISSION_RUN_SECONDS", "5"))
+ADMISSION_UPDATE_INTERVAL = float(os.getenv("ADMISSION_UPDATE_INTERVAL", "1"))
+# Unset, clients are told apart by address. Only name a header here (e.g. X-User-Id) when a trusted
+# proxy authenticates users and overwrites it: otherwise a client can send a new value on every
+# request and get a fresh budget and a fresh turn each time.
+ADMISSION_USER_HEADER = os.getenv("ADMISSION_USER_HEADER", "")
+ADMISSION_BUCKET_SWEEP_INTERVAL = 60.0
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self) -> float:
+        """Spend one token; returns 0, or the seconds until one is available."""
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def refund(self) -> None:
+        self.tokens = min(self.burst, self.tokens + 1)
+
+    def full(self) -> bool:
+        self._refill()
+        return self.tokens >= self.burst
+
+
+class Ticket:
+    """One graph run, from enqueue to release."""
+
+    __slots__ = ("user", "enqueued_at", "admitted_at", "released", "granted")
+
+    def __init__(self, user: str):
+        self.user = user
+        self.enqueued_at = time.monotonic()
+        self.admitted_at: Optional[float] = None
+        self.released = False
+        self.granted = asyncio.Event()
+
+
+class AdmissionController:
+    """Global cap on concurrent graph runs, with per-user token buckets and a fair queue.
+
+    Runs beyond `max_running` wait in per-user queues served round-robin, so
+    one user's burst cannot starve the others. `check` sheds a request before
+    any work starts when its user is out of tokens or its estimated wait
+    exceeds `max_wait`; the estimate is queue position times the average run
+    time over the number of slots.
+    """
+
+    def __init__(self, max_running: int = ADMISSION_MAX_RUNNING, max_queue: int = ADMISSION_MAX_QUEUE,
+                 max_wait: float = ADMISSION_MAX_WAIT, user_rate: float = ADMISSION_USER_RATE,
+                 user_burst: float = ADMISSION_USER_BURST, run_seconds: float = ADMISSION_RUN_SECONDS):
+        self.max_running = max_running
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.run_seconds = run_seconds
+        self.running = 0
+        self.queued = 0
+        # user -> waiting runs; the first user is served next, then moves to the back
+        self._queues: "OrderedDict[str, Deque[Ticket]]" = OrderedDict()
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._swept_at = time.monotonic()
+
+    def _bucket(self, user: str) -> TokenBucket:
+        now = time.monotonic()
+        if now - self._swept_at >= ADMISSION_BUCKET_SWEEP_INTERVAL:
+            # A full bucket is the same as no bucket.
+            self._swept_at = now
+            for key in [k for k, b in self._buckets.items() if b.full()]:
+                del self._buckets[key]
+        bucket = self._buckets.get(user)
+        if bucket is None:
+            bucket = self._buckets[user] = TokenBucket(self.user_rate, self.user_burst)
+        return bucket
+
+    def _position(self, user: str, index: int) -> int:
+        """1-based place in line of the run at `index` in `user`'s queue under round-robin service."""
+        position = index + 1
+        # Users served before `user` in the rotation get one more run in during round `index`.
+        ahead = True
+        for other, queue in self._queues.items():
+            if other == user:
+                ahead = False
+            else:
+                position += min(len(queue), index + 1 if ahead else index)
+        return position
+
+    def eta(self, position: int) -> float:
+        return position * self.run_seconds / self.max_running
+
+    def check(self, user: str) -> None:
+        """Charge `user` for one run, or raise AdmissionRejected when it should be shed."""
+        bucket = self._bucket(user) if self.user_rate > 0 else None
+        if bucket is not None:
+            wait = bucket.take()
+            if wait:
+                record_admission("rejected_rate")
+                raise AdmissionRejected("too many requests for this user", wait)
+        eta = self.overloaded(user)
+        if eta is not None:
+            if bucket is not None:
+                bucket.refund()  # not the user's fault
+            record_admission("rejected_overload")
+            logger.warning("graph run shed", extra={"user": user, "running": self.running,
+                                                    "queued": self.queued, "eta_seconds": round(eta, 1)})
+            raise AdmissionRejected("server is busy", eta)
+
+    def overloaded(self, user: str) -> Optional[float]:
+        """Estimated wait when one more run for `user` would exceed max_queue or max_wait, else None."""
+        if self.running < self.max_running and not self.queued:
+            return None
+        eta = self.eta(self._position(user, len(self._queues.get(user, ()))))
+        if self.queued >= self.max_queue or eta > self.max_wait:
+            return eta
+        return None
+
+    async def enqueue_when_room(self, user: str) -> Ticket:
+        """Enqueue once the queue has room for `user`, for work that should wait rather than be shed."""
+        if self.overloaded(user) is not None:
+            record_admission("deferred")
+            while True:
+                eta = self.overloaded(user)
+                if eta is None:
+                    break
+                await asyncio.sleep(min(eta, ADMISSION_UPDATE_INTERVAL))
+        return self.enqueue(user)
+
+    def enqueue(self, user: str) -> Ticket:
+        ticket = Ticket(user)
+        queue = self._queues.get(user)
+        if queue is None:
+            queue = self._queues[user] = deque()
+        queue.append(ticket)
+        self.queued += 1
+        self._grant()
+        record_admission("admitted" if ticket.granted.is_set() else "queued")
+        return ticket
+
+    def _grant(self) -> None:
+        while self.running < self.max_running and self._queues:
+            user, queue = next(iter(self._queues.items()))
+            ticket = queue.popleft()
+            if queue:
+                self._queues.move_to_end(user)
+            else:
+                del self._queues[user]
+            self.queued -= 1
+            self.running += 1
+            ticket.admitted_at = time.monotonic()
+            ticket.granted.set()
+            record_admission_wait(ticket.admitted_at - ticket.enqueued_at)
+        record_admission_load(self.running, self.queued)
+
+    def position(self, ticket: Ticket) -> int:
+        if ticket.granted.is_set():
+            return 0
+        return self._position(ticket.user, self._queues[ticket.user].index(ticket))
+
+    async def queue_updates(self, ticket: Ticket) -> AsyncIterator[Dict[str, float]]:
+        """Yield {"position", "eta_seconds"} whenever the ticket moves up, until it is admitted."""
+        last = None
+        while not ticket.granted.is_set():
+            position = self.position(ticket)
+            if position != last:
+                last = position
+                yield {"position": position, "eta_seconds": round(self.eta(position), 1)}
+            try:
+                await asyncio.wait_for(ticket.granted.wait(), ADMISSION_UPDATE_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    async def wait(self, ticket: Ticket) -> None:
+        await ticket.granted.wait()
+
+    def release(self, ticket: Ticket) -> None:
+        """Free the ticket's slot, or take it out of the queue if it never got one."""
+        if ticket.released:
+            return
+        ticket.released = True
+        if ticket.admitted_at is None:
+            queue = self._queues[ticket.user]
+            queue.remove(ticket)
+            if not queue:
+                del self._queues[ticket.user]
+            self.queued -= 1
+            record_admission("abandoned")
+        else:
+            self.running -= 1
+            # Moving average, so the estimate follows load without jumping on one slow run.
+            self.run_seconds += 0.2 * (time.monotonic() - ticket.admitted_at - self.run_seconds)
+        self._grant()
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "running": self.running,
+            "queued": self.queued,
+            "users_queued": len(self._queues),
+            "max_running": self.max_running,
+            "max_queue": self.max_queue,
+            "run_seconds_estimate": round(self.run_seconds, 2),
+        }
+
+
+def user_key(request: Request) -> str:
+    user = request.headers.get(ADMISSION_USER_HEADER) if ADMISSION_USER_HEADER else None
+    if user:
+        return f"user:{user}"
+    return f"addr:{request.client.host if request.client else 'unknown'}"
+
+
+admission = AdmissionController()
@@ -0,0 +1,146 @@
+import asyncio
+import json
+import os
+import uuid
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from pydantic import HttpUrl
+
+from src.agents.graph.checkpointer import flush_checkpointer
+from src.agents.graph.graph import checkpointer, get_graph
+from src.api.admission import admission
+from src.api.sessions import SessionRegistry, session_config
+from src.config.schema import AgentState
+from src.services.cache import cache_key
+from src.services.content.TaviliTool import tavily_search
+
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "100"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "16"))
+
+
+class BatchItem:
+    def __init__(self, item_id: str, text: str, is_url: bool, platform: str):
+        self.item_id = item_id
+        self.text = text
+        self.is_url = is_url
+        self.platform = platform
+
+    def event(self, status: str, **extra: Any) -> Dict[str, Any]:
+        return {
+            "type": "batch_item",
+            "item_id": self.item_id,
+            "input": self.text,
+            "platform": self.platform,
+            "status": status,
+            **extra,
+        }
+
+
+def expand_batch(topics: List[str], urls: List[str], platforms: List[str]) -> List[BatchItem]:
+    """One item per (input, platform) pair, inputs deduplicated in request order."""
+    inputs = [(t, False) for t in dict.fromkeys(t.strip() for t in topics if t.strip())]
+    inputs += [(u, True) for u in dict.fromkeys(u.strip() for u in urls if u.strip())]
+    return [
+        BatchItem(f"{i}:{platform}", text, is_url, platform)
+        for i, (text, is_url) in enumerate(inputs)
+        for platform in dict.fromkeys(platforms)
+    ]
+
+
+def _tool_content(result: Any) -> str:
+    # Same conversion ToolNode applies to non-string tool results.
+    if isinstance(result, str):
+        return result
+    try:
+        return json.dumps(result, ensure_ascii=False)
+    except TypeError:
+        return str(result)
+
+
+async def _run_item(item: BatchItem, research: "asyncio.Future[str]", registry: SessionRegistry,
+                    image_wanted: bool, linkedin_access_token: Optional[str]) -> Dict[str, Any]:
+    # Shielded: the research task is shared, one cancelled waiter must not cancel it for the rest.
+    content = await asyncio.shield(research)
+    session_id = str(uuid.uuid4())
+    call_id = f"batch_{uuid.uuid4().hex[:12]}"
+    state = AgentState(
+        topic="" if item.is_url else item.text,
+        url=HttpUrl(item.text) if item.is_url else None,
+        platform=item.platform,  # type: ignore[arg-type]
+        image_wanted=image_wanted,
+        linkedin_access_token=linkedin_access_token,
+    )
+    await registry.create(session_id, state)
+    config = session_config(session_id)
+    # Record the shared research as if this thread's own tools_node produced it,
+    # so the run continues straight into post generation.
+    state.messages = [
+        HumanMessage(content=f"Input: {item.text}"),
+        AIMessage(content="", tool_calls=[{"name": tavily_search.name, "args": {"query": item.text}, "id": call_id}]),
+        ToolMessage(content=content, tool_call_id=call_id, name=tavily_search.name),
+    ]
+    graph = get_graph()
+    await graph.aupdate_state(config, state, as_node="tools_node")
+    result = await graph.ainvoke(None, config=config)
+    await flush_checkpointer(checkpointer)
+    return {"session_id": session_id, "post_draft": result.get("post_draft", "")}
+
+
+async def run_batch(items: List[BatchItem], registry: SessionRegistry, concurrency: int,
+                    image_wanted: bool = False, linkedin_access_token: Optional[str] = None,
+                    user: str = "batch") -> AsyncIterator[Dict[str, Any]]:
+    """Generate a draft for every item, yielding per-item status events as they change.
+
+    At most `concurrency` items run at once, each holding an admission slot for
+    `user`; an item joins the admission queue only when it has room under
+    max_queue and max_wait, so a batch backs off instead of crowding out
+    interactive runs. Items with the same input share a single research call
+    regardless of platform. Each finished item leaves a session paused at post
+    feedback that /api/human-feedback can continue.
+    """
+    events: asyncio.Queue = asyncio.Queue()
+    research: Dict[str, "asyncio.Task[str]"] = {}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    def research_for(item: BatchItem) -> "asyncio.Task[str]":
+        key = cache_key("url" if item.is_url else "query", item.text)
+        if key not in research:
+            research[key] = asyncio.create_task(
+                asyncio.to_thread(lambda: _tool_content(tavily_search.invoke(item.text)))
+            )
+        return research[key]
+
+    async def worker(item: BatchItem) -> None:
+        async with semaphore:
+            ticket = await admission.enqueue_when_room(user)
+            try:
+                await admission.wait(ticket)
+                await events.put(item.event("running"))
+                outcome = await _run_item(item, research_for(item), registry, image_wanted, linkedin_access_token)
+            except Exception as e:
+                await events.put(item.event("error", error=str(e)))
+            else:
+                await events.put(item.event("done", **outcome))
+            finally:
+                admission.release(ticket)
+
+    for item in items:
+        yield item.event("queued")
+    tasks = [asyncio.create_task(worker(item)) for item in items]
+    remaining = len(items)
+    summary = {"done": 0, "error": 0}
+    try:
+        while remaining:
+            event = await events.get()
+            if event["status"] in summary:
+                summary[event["status"]] += 1
+                remaining -= 1
+            yield event
+    finally:
+        for task in tasks:
+            task.cancel()
+        for task in research.values():
+            task.cancel()
+    yield {"type": "batch_complete", "total": len(items), **summary}
@@ -1,18 +1,53 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import Response, StreamingResponse
 import json
 import asyncio
+import os
 import uuid
-from typing import Dict, Any, Optional, Literal
+from datetime import datetime
+from typing import AsyncIterator, Dict, Any, List, Optional, Literal
 from pydantic import BaseModel, HttpUrl
-from src.agents.graph.graph import graph
+from src.agents.graph.graph import checkpointer, get_graph
+from src.agents.graph.checkpointer import flush_checkpointer
+from src.agents.nodes.GeneratePost import POST_VARIANTS_MAX
+from src.config.llmconfig import warm_up
 from src.config.schema import AgentState
 from langgraph.types import Command
-from langgraph.checkpoint.memory import MemorySaver
+from langchain_core.messages import AIMessageChunk
 from src.api.routes import linkedin  # add this import
+from src.api.admission import AdmissionRejected, admission, user_key
+from src.api.sessions import SessionRegistry, make_session_store, session_config
+from src.api.batch import BATCH_CONCURRENCY, BATCH_MAX_CONCURRENCY, BATCH_MAX_ITEMS, expand_batch, run_batch
+from src.services.content.context_builder import load_tokenizer
+from src.services.http_client import close_http_client
+from src.services.cache import cache_stats
+from src.services.publish_queue import publish_queue
+from src.services.telemetry import render_metrics
+from src.config.logconfig import configure_logging
+from contextlib import asynccontextmanager
 
-app = FastAPI(title="Social Media Agent API", version="1.0.0")
+configure_logging()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    get_graph()
+    # Import the OpenAI client off the event loop while the worker already accepts requests.
+    warmup = asyncio.create_task(asyncio.to_thread(warm_up))
+    tokenizer = asyncio.create_task(asyncio.to_thread(load_tokenizer))
+    sweeper = asyncio.create_task(active_sessions.run_sweeper())
+    publisher = asyncio.create_task(publish_queue.run_workers())
+    yield
+    # Running publishes get a grace period; everything else stops now.
+    await publish_queue.stop()
+    tasks = (warmup, tokenizer, sweeper, publisher)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await flush_checkpointer(checkpointer)
+    await close_http_client()
+
+app = FastAPI(title="Social Media Agent API", version="1.0.0", lifespan=lifespan)
 app.include_router(linkedin.router, prefix="/api")  # add this after app = FastAPI(...)
 
 # Add CORS middleware
@@ -24,52 +59,169 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Store active sessions
-active_sessions: Dict[str, Dict[str, Any]] = {}
+# Store active sessions (shared across workers unless SESSION_BACKEND=memory)
+active_sessions = SessionRegistry(make_session_store(), checkpointer)
 
 class CreatePostRequest(BaseModel):
     topic: Optional[str] = None
     url: Optional[str] = None
-    platform: Literal["twitter", "linkedin"]
+    platform: Optional[Literal["twitter", "linkedin"]] = None
+    platforms: List[Literal["twitter", "linkedin"]] = []  # publish one session to several platforms
     image_wanted: bool = False
     linkedin_access_token: Optional[str] = None  # <-- add this
+    twitter_access_token: Optional[str] = None
+    variants: int = 1  # drafts per round to choose from (select_variant)
+    use_cache: bool = True  # set False to always generate a fresh draft
+    publish_at: Optional[datetime] = None  # schedule publishing instead of posting on approval
+
+class BatchPostRequest(BaseModel):
+    topics: List[str] = []
+    urls: List[str] = []
+    platforms: List[Literal["twitter", "linkedin"]]
+    image_wanted: bool = False
+    linkedin_access_token: Optional[str] = None
+    concurrency: Optional[int] = None
 
 class HumanResponseRequest(BaseModel):
     session_id: str
-    response_type: str  # "user_edit", "feedback", "satisfied", "image_url"
+    response_type: str  # "user_edit", "feedback", "satisfied", "select_variant", "image_url"
     response_data: Any
+    stream: bool = False  # stream the resumed run as SSE instead of one JSON response
+
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "Content-Type": "text/event-stream",
+    "X-Accel-Buffering": "no",
+}
+# Left out of GET /api/session: the message log holds research references and prompts.
+SESSION_STATE_EXCLUDE = {"messages", "linkedin_access_token", "twitter_access_token"}
+# Nodes whose LLM output is forwarded token by token
+TOKEN_STREAM_NODES = {"generate_post_node"}
+
+def error_text(error: Any) -> Optional[str]:
+    # Node errors arrive as exception objects; some (e.g. timeouts) have an empty message.
+    if error is None or isinstance(error, str):
+        return error
+    return str(error) or type(error).__name__
 
-async def stream_graph_execution(session_id: str, initial_state: AgentState):
-    """Stream the graph execution to the frontend"""
+def sse_event(payload: Dict[str, Any]) -> str:
+    return f"data: {json.dumps(payload)}\n\n"
+
+def result_payload(values: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "post_draft": values.get("post_draft", ""),
+        "post_variants": values.get("post_variants", []),
+        "post_drafts": values.get("post_drafts", {}),
+        "image_url": values.get("image_url"),
+        "image_candidates": values.get("image_candidates", []),
+        "upload_success": values.get("upload_success", False),
+        "post_url": values.get("post_url"),
+        "publish_job_id": values.get("publish_job_id"),
+        "publish_status": values.get("publish_status"),
+        "publish_results": values.get("publish_results", {}),
+    }
+
+def admit(http_request: Request) -> str:
+    """Charge the caller for one graph run, or answer 429 when it must wait or the server is saturated"""
+    user = user_key(http_request)
     try:
-        config = {
-            "configurable": {
-                "thread_id": session_id
-            }
-        }
-        
-        # Start the graph execution
-        result = await graph.ainvoke(initial_state, config=config)  # type: ignore
-        
+        admission.check(user)
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    return user
+
+async def stream_graph_execution(session_id: str, graph_input: Any, user: str):
+    """Stream node progress, draft tokens and the final interrupt/completion for one graph run"""
+    # Enqueued here rather than in the endpoint, so a client that never reads the stream holds no slot.
+    ticket = admission.enqueue(user)
+    try:
+        async for update in admission.queue_updates(ticket):
+            yield sse_event({"type": "queued", **update})
+        async for event in run_graph_events(session_id, graph_input):
+            yield event
+    finally:
+        admission.release(ticket)
+
+async def run_graph_events(session_id: str, graph_input: Any):
+    try:
+        config = session_config(session_id)
+        interrupt_data = None
+        # "tasks" rather than "debug": debug also serializes the full checkpoint on every step.
+        async for mode, chunk in get_graph().astream(graph_input, config=config, stream_mode=["tasks", "messages", "updates"]):  # type: ignore
+            if mode == "tasks":
+                # A task is streamed once with its input when it starts, and once with its writes when it ends.
+                if "result" not in chunk:
+                    yield sse_event({"type": "node_started", "node": chunk["name"], "task_id": chunk["id"]})
+                else:
+                    yield sse_event({
+                        "type": "node_finished",
+                        "node": chunk["name"],
+                        "task_id": chunk["id"],
+                        "error": error_text(chunk.get("error")),
+                    })
+            elif mode == "messages":
+                message, metadata = chunk
+                if (
+                    isinstance(message, AIMessageChunk)
+                    and message.content
+                    and metadata.get("langgraph_node") in TOKEN_STREAM_NODES
+                ):
+                    event = {"type": "token", "node": metadata["langgraph_node"], "content": message.content}
+                    for key in ("platform", "variant"):
+                        if key in metadata:
+                            event[key] = metadata[key]
+                    yield sse_event(event)
+            elif mode == "updates" and "__interrupt__" in chunk:
+                interrupt_data = chunk["__interrupt__"][0].value
+        await flush_checkpointer(checkpointer)
+
         # Check if there's an interrupt (human feedback needed)
-        if "__interrupt__" in result:
-            interrupt_data = result["__interrupt__"][0].value
-            yield f"data: {json.dumps({'type': 'interrupt', 'data': interrupt_data})}\n\n"
+        if interrupt_data is not None:
+            yield sse_event({"type": "interrupt", "data": interrupt_data})
         else:
             # No interrupt, execution completed
-            final_result = {
-                "type": "completion",
-                "data": {
-                    "post_draft": result.get("post_draft", ""),
-                    "image_url": result.get("image_url"),
-                    "upload_success": result.get("upload_success", False),
-                    "post_url": result.get("post_url")
-                }
-            }
-            yield f"data: {json.dumps(final_result)}\n\n"
+            snapshot = await get_graph().aget_state(config)
+            yield sse_event({"type": "completion", "data": result_payload(snapshot.values)})
             
     except Exception as e:
-        yield f"data: {json.dumps({'type': 'error', 'message': str(e)})}\n\n"
+        yield sse_event({"type": "error", "message": error_text(e)})
+
+async def with_heartbeats(events: AsyncIterator[str], interval: float = SSE_HEARTBEAT_SECONDS):
+    """Interleave SSE comment lines so idle proxies keep the connection open"""
+    queue: asyncio.Queue = asyncio.Queue()
+    done = object()
+
+    async def pump():
+        try:
+            async for event in events:
+                await queue.put(event)
+        finally:
+            await queue.put(done)
+
+    task = asyncio.create_task(pump())
+    try:
+        # Flush headers right away instead of waiting for the first node event
+        yield ": connected\n\n"
+        while True:
+            try:
+                item = await asyncio.wait_for(queue.get(), interval)
+            except asyncio.TimeoutError:
+                yield ": heartbeat\n\n"
+                continue
+            if item is done:
+                break
+            yield item
+    finally:
+        task.cancel()
+
+def sse_response(session_id: str, graph_input: Any, user: str) -> StreamingResponse:
+    return StreamingResponse(
+        with_heartbeats(stream_graph_execution(session_id, graph_input, user)),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+    )
 
 @app.post("/api/create-post")
 async def create_post(request: CreatePostRequest):
@@ -80,30 +232,34 @@ async def create_post(request: CreatePostRequest):
     if not request.topic and not request.url:
         raise HTTPException(status_code=400, detail="Either topic or url must be provided")
     
-    if request.platform not in ["twitter", "linkedin"]:
+    platforms = list(dict.fromkeys(([request.platform] if request.platform else []) + request.platforms))
+    if not platforms:
         raise HTTPException(status_code=400, detail="Platform must be 'twitter' or 'linkedin'")
+
+    if not 1 <= request.variants <= POST_VARIANTS_MAX:
+        raise HTTPException(status_code=400, detail=f"variants must be between 1 and {POST_VARIANTS_MAX}")
+    if request.variants > 1 and len(platforms) > 1:
+        raise HTTPException(status_code=400, detail="variants are only available when posting to one platform")
     
     # Create initial state
     try:
         initial_state = AgentState(
             topic=request.topic or "",
             url=HttpUrl(request.url) if request.url else None,
-            platform=request.platform,
+            platform=platforms[0],
+            platforms=platforms,
             image_wanted=request.image_wanted,
             linkedin_access_token=request.linkedin_access_token,  # <-- add this
+            twitter_access_token=request.twitter_access_token,
+            variant_count=request.variants,
+            use_generation_cache=request.use_cache,
+            publish_at=request.publish_at.timestamp() if request.publish_at else None,
         )
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Invalid URL format: {str(e)}")
     
     # Store session
-    active_sessions[session_id] = {
-        "state": initial_state,
-        "config": {
-            "configurable": {
-                "thread_id": session_id
-            }
-        }
-    }
+    await active_sessions.create(session_id, initial_state)
     
     return {
         "session_id": session_id,
@@ -111,52 +267,63 @@ async def create_post(request: CreatePostRequest):
     }
 
 @app.get("/api/stream/{session_id}")
-async def stream_execution(session_id: str):
+async def stream_execution(session_id: str, http_request: Request):
     """Stream the graph execution for a given session"""
-    if session_id not in active_sessions:
+    initial_state = await active_sessions.get(session_id)
+    if initial_state is None:
         raise HTTPException(status_code=404, detail="Session not found")
     
-    session = active_sessions[session_id]
-    initial_state = session["state"]
-    
-    async def generate():
-        async for chunk in stream_graph_execution(session_id, initial_state):
-            yield chunk
-    
-    return StreamingResponse(
-        generate(),
-        media_type="text/plain",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "Content-Type": "text/event-stream"
-        }
-    )
+    return sse_response(session_id, initial_state, admit(http_request))
+
+@app.post("/api/batch")
+async def create_batch(request: BatchPostRequest, http_request: Request):
+    """Generate drafts for every topic/url x platform pair, streaming per-item status as SSE"""
+    if not request.platforms:
+        raise HTTPException(status_code=400, detail="At least one platform must be provided")
+    items = expand_batch(request.topics, request.urls, request.platforms)
+    if not items:
+        raise HTTPException(status_code=400, detail="Either topics or urls must be provided")
+    if len(items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Batch is limited to {BATCH_MAX_ITEMS} items")
+    concurrency = max(1, min(request.concurrency or BATCH_CONCURRENCY, BATCH_MAX_CONCURRENCY))
+    # One charge for the batch; its items still queue for slots alongside everyone else's runs.
+    user = admit(http_request)
+
+    async def events():
+        try:
+            async for event in run_batch(items, active_sessions, concurrency, request.image_wanted,
+                                         request.linkedin_access_token, user=user):
+                yield sse_event(event)
+        except Exception as e:
+            yield sse_event({"type": "error", "message": str(e)})
+
+    return StreamingResponse(with_heartbeats(events()), media_type="text/event-stream", headers=SSE_HEADERS)
+
+def resume_command(request: HumanResponseRequest) -> Command:
+    """Build the resume command for an interrupted graph"""
+    if request.response_type not in ("user_edit", "feedback", "satisfied", "select_variant", "image_url"):
+        raise HTTPException(status_code=400, detail="Invalid response type")
+    return Command(resume={request.response_type: request.response_data})
 
 @app.post("/api/human-feedback")
-async def handle_human_feedback(request: HumanResponseRequest):
+async def handle_human_feedback(request: HumanResponseRequest, http_request: Request):
     """Handle human feedback and resume graph execution"""
-    if request.session_id not in active_sessions:
+    if not await active_sessions.touch(request.session_id):
         raise HTTPException(status_code=404, detail="Session not found")
     
-    session = active_sessions[request.session_id]
-    config = session["config"]
+    config = session_config(request.session_id)
+    command = resume_command(request)
+    user = admit(http_request)
+
+    if request.stream:
+        return sse_response(request.session_id, command, user)
     
+    ticket = admission.enqueue(user)
     try:
-        # Create command based on response type
-        if request.response_type == "user_edit":
-            command = Command(resume={"user_edit": request.response_data})
-        elif request.response_type == "feedback":
-            command = Command(resume={"feedback": request.response_data})
-        elif request.response_type == "satisfied":
-            command = Command(resume={"satisfied": request.response_data})
-        elif request.response_type == "image_url":
-            command = Command(resume={"image_url": request.response_data})
-        else:
-            raise HTTPException(status_code=400, detail="Invalid response type")
-        
+        await admission.wait(ticket)
         # Resume graph execution with Command
-        result = await graph.ainvoke(command, config=config)
+        result = await get_graph().ainvoke(command, config=config)
+        await flush_checkpointer(checkpointer)
         
         # Check for next interrupt or completion
         if "__interrupt__" in result:
@@ -169,38 +336,67 @@ async def handle_human_feedback(request: HumanResponseRequest):
             # Execution completed
             return {
                 "type": "completion",
-                "data": {
-                    "post_draft": result.get("post_draft", ""),
-                    "image_url": result.get("image_url"),
-                    "upload_success": result.get("upload_success", False),
-                    "post_url": result.get("post_url")
-                }
+                "data": result_payload(result)
             }
             
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        admission.release(ticket)
 
 @app.get("/api/session/{session_id}")
 async def get_session_status(session_id: str):
     """Get the current status of a session"""
-    if session_id not in active_sessions:
+    state = await active_sessions.get(session_id)
+    if state is None:
         raise HTTPException(status_code=404, detail="Session not found")
     
-    session = active_sessions[session_id]
+    # Latest checkpointed values over the initial input, without the message log or credentials.
+    snapshot = await get_graph().aget_state(session_config(session_id))
+    values = {**state.model_dump(), **(snapshot.values or {})}
     return {
         "session_id": session_id,
-        "state": session["state"].dict()
+        "state": {k: v for k, v in values.items() if k not in SESSION_STATE_EXCLUDE},
+        "message_count": len(values.get("messages", [])),
     }
 
 @app.delete("/api/session/{session_id}")
 async def delete_session(session_id: str):
     """Delete a session"""
-    if session_id not in active_sessions:
+    if not await active_sessions.delete(session_id):
         raise HTTPException(status_code=404, detail="Session not found")
     
-    del active_sessions[session_id]
     return {"message": "Session deleted successfully"}
 
+@app.get("/api/publish/{job_id}")
+async def get_publish_job(job_id: str):
+    """Status of a queued, scheduled or finished publish job"""
+    job = await publish_queue.aget(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Publish job not found")
+    return job
+
+@app.get("/api/sessions/metrics")
+async def get_session_metrics():
+    """Session count, eviction counters and estimated memory per session"""
+    return await active_sessions.metrics()
+
+@app.get("/api/cache/stats")
+async def get_cache_stats():
+    """Hit/miss counters for the upstream result caches"""
+    return cache_stats()
+
+@app.get("/api/admission/stats")
+async def get_admission_stats():
+    """Graph runs in progress and waiting, with the current run time estimate"""
+    return admission.stats()
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics for graph nodes, LLM calls, upstreams and caches"""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
@@ -1,21 +1,22 @@
 from fastapi import APIRouter, Request
+import logging
 import os
-import requests
-from dotenv import load_dotenv
-
-load_dotenv()
+from src.services import http_client
+from src.services.social.linkedin import remember_token_expiry
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 LINKEDIN_CLIENT_ID = os.getenv("LINKEDIN_CLIENT_ID")
 LINKEDIN_CLIENT_SECRET = os.getenv("LINKEDIN_CLIENT_SECRET")
 LINKEDIN_REDIRECT_URI = os.getenv("LINKEDIN_REDIRECT_URI", "http://localhost:3000/linkedin-callback")
+LINKEDIN_OAUTH_BASE = os.getenv("LINKEDIN_OAUTH_BASE", "https://www.linkedin.com").rstrip("/")
 
 @router.post("/linkedin/exchange")
 async def linkedin_exchange(request: Request):
     data = await request.json()
     code = data["code"]
-    token_url = "https://www.linkedin.com/oauth/v2/accessToken"
+    token_url = f"{LINKEDIN_OAUTH_BASE}/oauth/v2/accessToken"
     params = {
         "grant_type": "authorization_code",
         "code": code,
@@ -23,7 +24,10 @@ async def linkedin_exchange(request: Request):
         "client_id": LINKEDIN_CLIENT_ID,
         "client_secret": LINKEDIN_CLIENT_SECRET,
     }
-    resp = requests.post(token_url, data=params, headers={"Content-Type": "application/x-www-form-urlencoded"})
+    resp = await http_client.request("POST", token_url, data=params, headers={"Content-Type": "application/x-www-form-urlencoded"},
+                                     upstream="linkedin", operation="oauth_token")
     token_data = resp.json()
-    print("token_data", token_data)
+    if token_data.get("access_token") and token_data.get("expires_in"):
+        remember_token_expiry(token_data["access_token"], float(token_data["expires_in"]))
+    logger.info("linkedin token exchange", extra={"status": resp.status_code, "expires_in": token_data.get("expires_in")})
     return token_data  # contains access_token and expires_in 
\ No newline at end of file
@@ -0,0 +1,234 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.config.schema import AgentState
+from src.agents.graph.checkpointer import SqliteCheckpointer, checkpoint_sizes
+
+logger = logging.getLogger(__name__)
+
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "sqlite")
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", os.getenv("CHECKPOINT_DB_PATH", "agent_state.sqlite3"))
+SESSION_IDLE_TTL = float(os.getenv("SESSION_IDLE_TTL", "3600"))
+SESSION_MAX = int(os.getenv("SESSION_MAX", "1000"))
+SESSION_SWEEP_INTERVAL = float(os.getenv("SESSION_SWEEP_INTERVAL", "60"))
+
+
+def session_config(session_id: str) -> dict:
+    return {"configurable": {"thread_id": session_id}}
+
+
+class MemorySessionStore:
+    """Process-local sessions; only valid with a single worker."""
+
+    def __init__(self):
+        # session_id -> (state, serialized size, last seen), least recently used first
+        self._sessions: "OrderedDict[str, Tuple[AgentState, int, float]]" = OrderedDict()
+
+    def create(self, session_id: str, state: AgentState) -> None:
+        self._sessions[session_id] = (state, len(state.model_dump_json()), time.time())
+
+    def get(self, session_id: str) -> Optional[AgentState]:
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            return None
+        self.touch(session_id)
+        return entry[0]
+
+    def touch(self, session_id: str) -> bool:
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            return False
+        self._sessions[session_id] = (entry[0], entry[1], time.time())
+        self._sessions.move_to_end(session_id)
+        return True
+
+    def delete(self, session_id: str) -> bool:
+        return self._sessions.pop(session_id, None) is not None
+
+    def idle_since(self, cutoff: float) -> List[str]:
+        return [sid for sid, (_, _, seen) in self._sessions.items() if seen < cutoff]
+
+    def least_recent(self, keep: int) -> List[str]:
+        overflow = len(self._sessions) - keep
+        return list(self._sessions)[:overflow] if overflow > 0 else []
+
+    def sizes(self) -> Dict[str, int]:
+        return {sid: size for sid, (_, size, _) in self._sessions.items()}
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._sessions
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+class SqliteSessionStore:
+    """Sessions stored in SQLite so any worker can serve any session."""
+
+    def __init__(self, path: str = SESSION_DB_PATH):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " session_id TEXT PRIMARY KEY, state TEXT NOT NULL, created_at REAL NOT NULL,"
+            " last_seen REAL NOT NULL DEFAULT 0)"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(sessions)")}
+        if "last_seen" not in columns:
+            self._conn.execute("ALTER TABLE sessions ADD COLUMN last_seen REAL NOT NULL DEFAULT 0")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_last_seen ON sessions (last_seen)")
+
+    def create(self, session_id: str, state: AgentState) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?)",
+                (session_id, state.model_dump_json(), now, now),
+            )
+
+    def get(self, session_id: str) -> Optional[AgentState]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT state FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        self.touch(session_id)
+        return AgentState.model_validate_json(row[0])
+
+    def touch(self, session_id: str) -> bool:
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE sessions SET last_seen = ? WHERE session_id = ?", (time.time(), session_id)
+            )
+        return cur.rowcount > 0
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            cur = self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+        return cur.rowcount > 0
+
+    def idle_since(self, cutoff: float) -> List[str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT session_id FROM sessions WHERE last_seen < ?", (cutoff,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def least_recent(self, keep: int) -> List[str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT session_id FROM sessions ORDER BY last_seen DESC LIMIT -1 OFFSET ?", (keep,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def sizes(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT session_id, LENGTH(state) FROM sessions").fetchall()
+        return dict(rows)
+
+    def __contains__(self, session_id: str) -> bool:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone() is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+
+def make_session_store():
+    if SESSION_BACKEND == "memory":
+        return MemorySessionStore()
+    return SqliteSessionStore()
+
+
+class SessionRegistry:
+    """Bounded view over a session store.
+
+    Sessions idle for longer than `idle_ttl` are swept, and creating a
+    session beyond `max_sessions` evicts the least recently used ones.
+    Evicting a session also deletes its checkpointer thread.
+    """
+
+    def __init__(self, store: Any, checkpointer: Any, idle_ttl: float = SESSION_IDLE_TTL,
+                 max_sessions: int = SESSION_MAX):
+        self.store = store
+        self.checkpointer = checkpointer
+        self.idle_ttl = idle_ttl
+        self.max_sessions = max_sessions
+        self.evicted_idle = 0
+        self.evicted_lru = 0
+
+    async def _run(self, method: Any, *args: Any) -> Any:
+        # SQLite calls block on disk and on the store lock; the in-memory store is cheap and not thread-safe.
+        if isinstance(self.store, MemorySessionStore):
+            return method(*args)
+        return await asyncio.to_thread(method, *args)
+
+    async def create(self, session_id: str, state: AgentState) -> None:
+        await self._run(self.store.create, session_id, state)
+        overflow = await self._run(self.store.least_recent, self.max_sessions)
+        self.evicted_lru += await self.evict(overflow)
+
+    async def get(self, session_id: str) -> Optional[AgentState]:
+        return await self._run(self.store.get, session_id)
+
+    async def touch(self, session_id: str) -> bool:
+        return await self._run(self.store.touch, session_id)
+
+    async def delete(self, session_id: str) -> bool:
+        return await self.evict([session_id]) > 0
+
+    async def evict(self, session_ids: List[str]) -> int:
+        evicted = 0
+        for session_id in session_ids:
+            if await self._run(self.store.delete, session_id):
+                evicted += 1
+            await self.checkpointer.adelete_thread(session_id)
+        return evicted
+
+    async def sweep(self) -> int:
+        idle = await self._run(self.store.idle_since, time.time() - self.idle_ttl)
+        evicted = await self.evict(idle)
+        self.evicted_idle += evicted
+        return evicted
+
+    async def run_sweeper(self, interval: float = SESSION_SWEEP_INTERVAL) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.sweep()
+            except Exception:
+                logger.exception("session sweep failed")
+
+    async def metrics(self, top: int = 10) -> Dict[str, Any]:
+        state_sizes = await self._run(self.store.sizes)
+        # Same rule as _run: the SQLite checkpointer reads from disk, MemorySaver is summed in place.
+        if isinstance(self.checkpointer, SqliteCheckpointer):
+            thread_sizes = await asyncio.to_thread(checkpoint_sizes, self.checkpointer)
+        else:
+            thread_sizes = checkpoint_sizes(self.checkpointer)
+        per_session = {
+            sid: size + thread_sizes.get(sid, 0) for sid, size in state_sizes.items()
+        }
+        largest = sorted(per_session.items(), key=lambda item: item[1], reverse=True)[:top]
+        return {
+            "sessions": len(state_sizes),
+            "max_sessions": self.max_sessions,
+            "idle_ttl_seconds": self.idle_ttl,
+            "evicted_idle_total": self.evicted_idle,
+            "evicted_lru_total": self.evicted_lru,
+            "state_bytes": sum(state_sizes.values()),
+            "checkpoint_bytes": sum(thread_sizes.values()),
+            "estimated_bytes": sum(per_session.values()),
+            "largest_sessions": [{"session_id": sid, "estimated_bytes": size} for sid, size in largest],
+        }
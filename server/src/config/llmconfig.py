@@ -1,8 +1,90 @@
-from langchain_openai import ChatOpenAI
-from dotenv import load_dotenv
+import functools
+import logging
+import os
+from typing import Any, List, Optional
 
-load_dotenv()
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.runnables import Runnable, RunnableConfig
+from src.services.resilience import Upstream, hedged
+from src.services.telemetry import LLMUsageHandler
 
-llm = ChatOpenAI(
-    model="gpt-3.5-turbo",
-)
\ No newline at end of file
+LLM_MODEL = "gpt-3.5-turbo"
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "30"))  # per HTTP attempt
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "1"))
+# Whole call: waiting for a slot, every attempt and a hedged backup.
+LLM_DEADLINE = float(os.getenv("LLM_DEADLINE", "60"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+# Start a backup request when the first has not finished after this many seconds; 0 disables it.
+LLM_HEDGE_AFTER = float(os.getenv("LLM_HEDGE_AFTER", "0"))
+LLM_HEDGE_MODEL = os.getenv("LLM_HEDGE_MODEL", LLM_MODEL)
+LLM_HEDGE_BASE_URL = os.getenv("LLM_HEDGE_BASE_URL")
+
+logger = logging.getLogger(__name__)
+
+
+def _openai_trips(error: BaseException) -> bool:
+    import openai  # already loaded by the client that raised
+
+    # Rejected requests (bad input, auth) say nothing about the health of the API.
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return True
+
+
+# The OpenAI SDK and langchain_openai take about a second to import; clients
+# are built on first use so workers start (and tests import) without them.
+@functools.lru_cache(maxsize=None)
+def get_llm() -> BaseChatModel:
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(
+        model=LLM_MODEL,
+        stream_usage=True,  # report token usage on streamed responses too
+        callbacks=[LLMUsageHandler()],
+        timeout=LLM_TIMEOUT,
+        max_retries=LLM_MAX_RETRIES,
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def get_hedge_llm() -> Optional[BaseChatModel]:
+    if LLM_HEDGE_AFTER <= 0:
+        return None
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(
+        model=LLM_HEDGE_MODEL,
+        stream_usage=True,
+        callbacks=[LLMUsageHandler()],
+        timeout=LLM_TIMEOUT,
+        max_retries=0,
+        **({"base_url": LLM_HEDGE_BASE_URL} if LLM_HEDGE_BASE_URL else {}),
+    )
+
+
+def warm_up() -> None:
+    """Build the chat clients ahead of the first request; a failure here resurfaces on first use."""
+    try:
+        get_llm()
+        get_hedge_llm()
+    except Exception as e:
+        logger.warning("llm client warm-up failed", extra={"error": str(e)})
+
+
+openai_upstream = Upstream("openai", timeout=LLM_DEADLINE, max_concurrency=LLM_MAX_CONCURRENCY, trips=_openai_trips)
+
+
+async def call_llm(messages: List[BaseMessage], config: Optional[RunnableConfig] = None,
+                   model: Optional[Runnable] = None, hedge: Optional[Runnable] = None) -> Any:
+    """`model.ainvoke(messages)` under the OpenAI deadline, bulkhead and circuit breaker,
+    hedged when LLM_HEDGE_AFTER is set. Defaults to the shared chat model and its hedge."""
+    if model is None:
+        model, hedge = get_llm(), get_hedge_llm()
+    if hedge is None:
+        return await openai_upstream.call(lambda: model.ainvoke(messages, config=config))
+    # The backup runs without the caller's callbacks so its tokens are not streamed alongside the first.
+    backup_config: RunnableConfig = {**(config or {}), "callbacks": []}
+    return await openai_upstream.call(lambda: hedged(
+        lambda: model.ainvoke(messages, config=config),
+        lambda: hedge.ainvoke(messages, config=backup_config),
+        LLM_HEDGE_AFTER, "openai",
+    ))
@@ -0,0 +1,84 @@
+import json
+import logging
+import os
+import re
+import time
+from typing import Any
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")  # "json" or "text"
+
+REDACTED = "[redacted]"
+_SECRET_KEYS = re.compile(r"(?:^|[_-])(?:token|secret|password|authorization|api_key|apikey|cookie)$", re.IGNORECASE)
+_SECRET_VALUES = [
+    (re.compile(r"(?i)\b(bearer)\s+[A-Za-z0-9._~+/=-]+"), r"\1 " + REDACTED),
+    (re.compile(r"(?i)\b(access_token|refresh_token|client_secret)=[^&\s]+"), r"\1=" + REDACTED),
+    (re.compile(r"\b(sk|tvly)-[A-Za-z0-9_-]{8,}"), r"\1-" + REDACTED),
+]
+# Attributes every LogRecord has; anything else came from `extra=`.
+_RECORD_FIELDS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+def redact(value: Any) -> Any:
+    """Mask credentials in strings and in dict/list values under secret-looking keys."""
+    if isinstance(value, str):
+        for pattern, replacement in _SECRET_VALUES:
+            value = pattern.sub(replacement, value)
+        return value
+    if isinstance(value, dict):
+        return {k: REDACTED if _SECRET_KEYS.search(str(k)) and v else redact(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(redact(v) for v in value)
+    return value
+
+
+class RedactingFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        if isinstance(record.msg, str):
+            record.msg = redact(record.msg)
+        if record.args:
+            record.args = redact(record.args)
+        for key in set(vars(record)) - _RECORD_FIELDS:
+            value = getattr(record, key)
+            setattr(record, key, REDACTED if _SECRET_KEYS.search(key) and value else redact(value))
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key in vars(record).keys() - _RECORD_FIELDS:
+            entry[key] = getattr(record, key)
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        fields = " ".join(f"{k}={getattr(record, k)}" for k in sorted(vars(record).keys() - _RECORD_FIELDS))
+        line = f"{time.strftime('%H:%M:%S', time.localtime(record.created))} {record.levelname:<7} {record.name}: {record.getMessage()}"
+        if fields:
+            line += f" [{fields}]"
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+def configure_logging() -> None:
+    """Attach one redacting handler to the `src` logger tree; safe to call more than once."""
+    logger = logging.getLogger("src")
+    if any(getattr(h, "_src_handler", False) for h in logger.handlers):
+        return
+    handler = logging.StreamHandler()
+    handler._src_handler = True  # type: ignore[attr-defined]
+    handler.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter())
+    handler.addFilter(RedactingFilter())
+    logger.addHandler(handler)
+    logger.setLevel(LOG_LEVEL)
+    logger.propagate = False
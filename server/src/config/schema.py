@@ -1,27 +1,58 @@
 from langgraph.graph import add_messages
-from pydantic import BaseModel, HttpUrl, model_validator, Field
-from typing import Optional, List, Literal, Annotated
+from pydantic import BaseModel, HttpUrl, model_validator, field_validator, Field
+from typing import Any, Dict, Optional, List, Literal, Annotated
 from langchain_core.messages import BaseMessage
 
 class AgentState(BaseModel):
     # === Input ===
     messages:Annotated[List[BaseMessage], add_messages] = []
     topic: str = Field(default="")
-    url: Optional[HttpUrl] = Field(default=None)
-    platform: Literal["twitter", "linkedin"]
+    # Validated as an HttpUrl but kept as a str: the checkpoint serializer cannot encode Url objects.
+    url: Optional[str] = Field(default=None)
+    platform: Literal["twitter", "linkedin"]  # primary platform: post_draft and post_url refer to it
+    platforms: List[Literal["twitter", "linkedin"]] = Field(default_factory=list)  # every target, platform first
     image_wanted: bool = Field(default=False)
     linkedin_access_token: Optional[str] = None
+    twitter_access_token: Optional[str] = None  # OAuth 2.0 user token; falls back to TWITTER_ACCESS_TOKEN
+    variant_count: int = Field(default=1, ge=1)  # drafts generated per round
+    use_generation_cache: bool = Field(default=True)  # False bypasses GENERATION_CACHE for this session
+    publish_at: Optional[float] = None  # unix time to publish at; None publishes on approval
 
     # === Generated Output ===
     post_draft:str=Field(default="")
+    post_variants: List[str] = Field(default_factory=list)  # alternatives to post_draft, post_draft first
+    post_drafts: Dict[str, str] = Field(default_factory=dict)  # platform -> draft; post_draft is the primary's
     image_url: Optional[str] = None
+    image_candidates: List[str] = Field(default_factory=list)  # ranked, best first
     
     feedback_text: Optional[str] = None
+    feedback_history: List[str] = Field(default_factory=list)
     upload_success: bool = False
     post_url: Optional[str] = None
+    publish_job_id: Optional[str] = None
+    publish_status: Optional[str] = None
+    publish_results: Dict[str, Dict[str, Any]] = Field(default_factory=dict)  # platform -> job_id/status/post_url
+
+    @field_validator("url", mode="before")
+    @classmethod
+    def validate_url(cls, value):
+        return str(HttpUrl(str(value))) if value else None
 
     @model_validator(mode="after")
     def validate_topic_or_url(self) -> "AgentState":
         if not self.topic and not self.url:
             raise ValueError("You must provide either a topic or a URL.")
         return self
+
+    @model_validator(mode="after")
+    def validate_platforms(self) -> "AgentState":
+        self.platforms = list(dict.fromkeys([self.platform, *self.platforms]))
+        if len(self.platforms) > 1 and self.variant_count > 1:
+            raise ValueError("Draft variants are only available for single-platform sessions.")
+        return self
+
+    def draft_for(self, platform: str) -> str:
+        return self.post_drafts.get(platform, self.post_draft)
+
+    def access_token_for(self, platform: str) -> Optional[str]:
+        return self.linkedin_access_token if platform == "linkedin" else self.twitter_access_token
@@ -0,0 +1,143 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Dict, Optional, Tuple
+
+from src.services.cache import TTLCache
+
+BLOB_STORE_BACKEND = os.getenv("BLOB_STORE_BACKEND", "sqlite")
+BLOB_STORE_PATH = os.getenv("BLOB_STORE_PATH", os.getenv("CHECKPOINT_DB_PATH", "agent_state.sqlite3"))
+# Blobs not read or written for this long are dropped; keep it above SESSION_IDLE_TTL.
+BLOB_TTL = float(os.getenv("BLOB_TTL", str(7 * 86400)))
+# Smaller values stay inline in the state; a reference would not be much shorter.
+BLOB_INLINE_MAX_BYTES = int(os.getenv("BLOB_INLINE_MAX_BYTES", "1024"))
+BLOB_PRUNE_INTERVAL = float(os.getenv("BLOB_PRUNE_INTERVAL", "600"))
+
+REF_PREFIX = "blob:sha256:"
+
+logger = logging.getLogger(__name__)
+
+
+class BlobNotFound(LookupError):
+    """A reference whose blob expired or was written to another store."""
+
+
+class MemoryBlobStore:
+    """Process-local blobs; only valid with a single worker."""
+
+    def __init__(self, ttl: float = BLOB_TTL):
+        self.ttl = ttl
+        # digest -> (data, last access)
+        self._blobs: Dict[str, Tuple[bytes, float]] = {}
+        self._lock = threading.Lock()
+        self._pruned_at = time.time()
+
+    def put(self, digest: str, data: bytes) -> None:
+        now = time.time()
+        with self._lock:
+            self._blobs[digest] = (data, now)
+            if now - self._pruned_at >= BLOB_PRUNE_INTERVAL:
+                self._pruned_at = now
+                for key in [k for k, (_, seen) in self._blobs.items() if seen < now - self.ttl]:
+                    del self._blobs[key]
+
+    def get(self, digest: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._blobs.get(digest)
+            if entry is None:
+                return None
+            self._blobs[digest] = (entry[0], time.time())
+            return entry[0]
+
+    def __len__(self) -> int:
+        return len(self._blobs)
+
+
+class SqliteBlobStore:
+    """Blobs stored zlib-compressed in SQLite so every worker can resolve every reference."""
+
+    def __init__(self, path: str = BLOB_STORE_PATH, ttl: float = BLOB_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._pruned_at = time.time()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS blobs ("
+            " digest TEXT PRIMARY KEY, data BLOB NOT NULL, size INTEGER NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS blobs_accessed_at ON blobs (accessed_at)")
+
+    def put(self, digest: str, data: bytes) -> None:
+        now = time.time()
+        with self._lock:
+            # Same content, same digest: a second writer only refreshes the access time.
+            self._conn.execute(
+                "INSERT INTO blobs VALUES (?, ?, ?, ?) ON CONFLICT (digest) DO UPDATE SET accessed_at = excluded.accessed_at",
+                (digest, zlib.compress(data, 6), len(data), now),
+            )
+            if now - self._pruned_at >= BLOB_PRUNE_INTERVAL:
+                self._pruned_at = now
+                self._conn.execute("DELETE FROM blobs WHERE accessed_at < ?", (now - self.ttl,))
+
+    def get(self, digest: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM blobs WHERE digest = ?", (digest,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE blobs SET accessed_at = ? WHERE digest = ?", (time.time(), digest))
+        return zlib.decompress(row[0])
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM blobs").fetchone()[0]
+
+
+def make_blob_store():
+    if BLOB_STORE_BACKEND == "memory":
+        return MemoryBlobStore()
+    return SqliteBlobStore()
+
+
+blob_store = make_blob_store()
+# Feedback rounds rebuild the research context from the same few blobs.
+_recent = TTLCache(max_entries=64, default_ttl=300.0)
+
+
+def is_ref(value: str) -> bool:
+    return isinstance(value, str) and value.startswith(REF_PREFIX)
+
+
+def offload(text: str) -> str:
+    """Store `text` by content and return its reference, or `text` itself when it is small."""
+    data = text.encode("utf-8")
+    if len(data) <= BLOB_INLINE_MAX_BYTES:
+        return text
+    digest = hashlib.sha256(data).hexdigest()
+    blob_store.put(digest, data)
+    _recent.set(digest, text)
+    return REF_PREFIX + digest
+
+
+def resolve(value: str) -> str:
+    """The text behind a reference made by `offload`; other values are returned unchanged.
+
+    Raises BlobNotFound when the blob is gone, so callers never mistake a lost blob for empty text.
+    """
+    if not is_ref(value):
+        return value
+    digest = value[len(REF_PREFIX):]
+    text = _recent.get(digest)
+    if text is None:
+        data = blob_store.get(digest)
+        if data is None:
+            logger.warning("blob not found", extra={"digest": digest})
+            raise BlobNotFound(digest)
+        text = data.decode("utf-8")
+        _recent.set(digest, text)
+    return text
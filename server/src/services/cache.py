@@ -0,0 +1,330 @@
+import hashlib
+import json
+import math
+import operator
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from src.services.telemetry import record_cache_lookup
+
+RESULT_CACHE_BACKEND = os.getenv("RESULT_CACHE_BACKEND", "memory")
+RESULT_CACHE_PATH = os.getenv("RESULT_CACHE_PATH", "result_cache.sqlite3")
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "2048"))
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "3600"))
+
+_MISSING = object()
+
+
+class TTLCache:
+    """In-process LRU cache whose entries expire after a per-entry TTL."""
+
+    def __init__(self, max_entries: int = 1024, default_ttl: float = 300.0):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.default_ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SimilarityIndex:
+    """Nearest-neighbour lookup by cosine similarity, bounded and expiring like TTLCache.
+
+    A linear scan over at most `max_entries` vectors; entries point at keys of
+    another cache and are only compared within the same partition.
+    """
+
+    def __init__(self, max_entries: int = 1000, default_ttl: float = 300.0):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._entries: "OrderedDict[str, Tuple[float, str, array]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _unit(vector: Sequence[float]) -> array:
+        norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+        return array("f", (x / norm for x in vector))
+
+    def add(self, key: str, vector: Sequence[float], partition: str = "", ttl: Optional[float] = None) -> None:
+        ttl = self.default_ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        unit = self._unit(vector)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, partition, unit)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def nearest(self, vector: Sequence[float], partition: str = "", threshold: float = 0.0) -> Optional[Tuple[str, float]]:
+        """Most similar live key in `partition` scoring at least `threshold`, with its score."""
+        query = self._unit(vector)
+        now = time.monotonic()
+        best: Optional[Tuple[str, float]] = None
+        with self._lock:
+            expired = []
+            for key, (expires_at, entry_partition, unit) in self._entries.items():
+                if expires_at <= now:
+                    expired.append(key)
+                    continue
+                if entry_partition != partition or len(unit) != len(query):
+                    continue
+                score = sum(map(operator.mul, unit, query))
+                if score >= threshold and (best is None or score > best[1]):
+                    best = (key, score)
+            for key in expired:
+                del self._entries[key]
+            if best is not None:
+                self._entries.move_to_end(best[0])
+        return best
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SqliteCache:
+    """TTL + LRU cache stored in SQLite so every worker on the host shares it.
+
+    Values must be JSON serializable. Several namespaces can share one file.
+    """
+
+    def __init__(self, path: str, namespace: str, max_entries: int = 1024, default_ttl: float = 300.0):
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache_entries ("
+            " namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,"
+            " expires_at REAL NOT NULL, accessed_at REAL NOT NULL,"
+            " PRIMARY KEY (namespace, key))"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS cache_entries_lru ON cache_entries (namespace, accessed_at)"
+        )
+
+    def get(self, key: str, default: Any = None) -> Any:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM cache_entries WHERE namespace = ? AND key = ?",
+                (self.namespace, key),
+            ).fetchone()
+            if row is None:
+                return default
+            if row[1] <= now:
+                self._conn.execute(
+                    "DELETE FROM cache_entries WHERE namespace = ? AND key = ?", (self.namespace, key)
+                )
+                return default
+            self._conn.execute(
+                "UPDATE cache_entries SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                (now, self.namespace, key),
+            )
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.default_ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        now = time.time()
+        payload = json.dumps(value)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO cache_entries VALUES (?, ?, ?, ?, ?)",
+                    (self.namespace, key, payload, now + ttl, now),
+                )
+                self._conn.execute(
+                    "DELETE FROM cache_entries WHERE namespace = ? AND expires_at <= ?", (self.namespace, now)
+                )
+                self._conn.execute(
+                    "DELETE FROM cache_entries WHERE namespace = ? AND key IN ("
+                    " SELECT key FROM cache_entries WHERE namespace = ?"
+                    " ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                    (self.namespace, self.namespace, self.max_entries),
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM cache_entries WHERE namespace = ? AND key = ?", (self.namespace, key)
+            )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM cache_entries WHERE namespace = ?", (self.namespace,))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM cache_entries WHERE namespace = ?", (self.namespace,)
+            ).fetchone()[0]
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class ResultCache:
+    """Cache front with hit/miss counters and single-flight computation.
+
+    Concurrent callers asking for the same missing key wait for the first
+    caller's upstream call instead of issuing their own.
+    """
+
+    def __init__(self, name: str, backend: Any):
+        self.name = name
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._flights: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+        _registry[name] = self
+
+    def lookup(self, key: str) -> Any:
+        """Counted get without single-flight, for callers that compute asynchronously."""
+        value = self.backend.get(key, _MISSING)
+        if value is _MISSING:
+            self.misses += 1
+            record_cache_lookup(self.name, "miss")
+            return None
+        self.hits += 1
+        record_cache_lookup(self.name, "hit")
+        return value
+
+    def store(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        self.backend.set(key, value, ttl=ttl)
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any], ttl: Optional[float] = None) -> Any:
+        value = self.backend.get(key, _MISSING)
+        if value is not _MISSING:
+            self.hits += 1
+            record_cache_lookup(self.name, "hit")
+            return value
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        if not leader:
+            self.coalesced += 1
+            record_cache_lookup(self.name, "coalesced")
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+        self.misses += 1
+        record_cache_lookup(self.name, "miss")
+        try:
+            flight.value = compute()
+            self.backend.set(key, flight.value, ttl=ttl)
+            return flight.value
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_ratio": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+            "entries": len(self.backend),
+        }
+
+
+_registry: Dict[str, ResultCache] = {}
+
+
+def make_result_cache(name: str, ttl: Optional[float] = None) -> ResultCache:
+    """Build a named cache on the backend selected by RESULT_CACHE_BACKEND."""
+    ttl = RESULT_CACHE_TTL if ttl is None else ttl
+    if RESULT_CACHE_BACKEND == "sqlite":
+        backend: Any = SqliteCache(RESULT_CACHE_PATH, name, max_entries=RESULT_CACHE_MAX_ENTRIES, default_ttl=ttl)
+    else:
+        backend = TTLCache(max_entries=RESULT_CACHE_MAX_ENTRIES, default_ttl=ttl)
+    return ResultCache(name, backend)
+
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: cache.stats() for name, cache in _registry.items()}
+
+
+def normalize_url(url: str) -> str:
+    """Canonical form of a URL: lowercase host, no fragment, no tracking params."""
+    parts = urlsplit(url.strip())
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith("utm_") and k.lower() not in ("fbclid", "gclid")
+    )
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, urlencode(query), ""))
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.casefold().split())
+
+
+def cache_key(kind: str, text: str, **params: Any) -> str:
+    normalized = normalize_url(text) if kind == "url" else normalize_query(text)
+    raw = json.dumps([kind, normalized, params], sort_keys=True)
+    return hashlib.sha256(raw.encode()).hexdigest()
@@ -1,25 +1,80 @@
-from langchain.tools import tool
-from tavily import TavilyClient
-from dotenv import load_dotenv
+import functools
+import json
+import logging
+from typing import Optional
+from langchain_core.tools import tool
 import os
-load_dotenv()   
+from src.services.cache import cache_key, make_result_cache
+from src.services.blob_store import offload
+from src.services.resilience import Upstream
+from src.services.telemetry import upstream_span
 
 TAVILY_API_KEY = os.getenv("TAVILY_API_KEY")
-tavily = TavilyClient(api_key= TAVILY_API_KEY)
+TAVILY_API_BASE_URL = os.getenv("TAVILY_API_BASE_URL")
+TAVILY_TIMEOUT = float(os.getenv("TAVILY_TIMEOUT", "20"))
+TAVILY_MAX_CONCURRENCY = int(os.getenv("TAVILY_MAX_CONCURRENCY", "16"))
+tavily_cache = make_result_cache("tavily", ttl=float(os.getenv("TAVILY_CACHE_TTL", "3600")))
+tavily_upstream = Upstream("tavily", timeout=TAVILY_TIMEOUT, max_concurrency=TAVILY_MAX_CONCURRENCY)
 
-@tool
-def tavily_search(query: str) -> str: 
-    """Search the web for a topic or extract article from a URL using Tavily."""
+logger = logging.getLogger(__name__)
+
+
+@functools.lru_cache(maxsize=None)
+def get_tavily():
+    from tavily import TavilyClient
+    return TavilyClient(api_key=TAVILY_API_KEY, **({"api_base_url": TAVILY_API_BASE_URL} if TAVILY_API_BASE_URL else {}))
+
+
+def _extract(url: str, timeout: Optional[float] = None, **params) -> dict:
+    with upstream_span("tavily", "extract"):
+        return tavily_upstream.call_sync(lambda left: get_tavily().extract(urls=[url], timeout=left, **params), timeout=timeout)
+
+
+def _search(query: str, timeout: Optional[float] = None, **params) -> dict:
+    with upstream_span("tavily", "search"):
+        return tavily_upstream.call_sync(lambda left: get_tavily().search(query=query, timeout=left, **params), timeout=timeout)
+
+
+# `timeout` only bounds this call; it is not part of the cache key.
+def cached_extract(url: str, timeout: Optional[float] = None, **params) -> dict:
+    return tavily_cache.get_or_compute(
+        cache_key("url", url, op="extract", **params),
+        lambda: _extract(url, timeout, **params),
+    )
+
+
+def cached_search(query: str, timeout: Optional[float] = None, **params) -> dict:
+    return tavily_cache.get_or_compute(
+        cache_key("query", query, op="search", **params),
+        lambda: _search(query, timeout, **params),
+    )
+
+
+def _research(query: str):
     if query.startswith("http://") or query.startswith("https://"):
-        urls = [query]
-        response = tavily.extract(urls=urls,include_raw_content=True)
+        response = cached_extract(query, include_raw_content=True)
         for result in response["results"]:
             return result.get("raw_content", "No content found from URL.")
     else:
-        result = tavily.search(query=query, search_depth="advanced", max_results=2)
+        try:
+            result = cached_search(query, search_depth="advanced", max_results=2)
+        except Exception as e:
+            # A topic post can still be drafted without research; a URL post cannot.
+            logger.warning("topic research unavailable", extra={"error": repr(e)})
+            return "No content found."
         if result.get("answer"):
             return result["answer"]
         elif result.get("results"):
             return result["results"]
         return "No content found."
     return "No content found."
+
+
+@tool
+def tavily_search(query: str) -> str: 
+    """Search the web for a topic or extract article from a URL using Tavily."""
+    content = _research(query)
+    if not isinstance(content, str):
+        content = json.dumps(content, ensure_ascii=False)
+    # Articles go to the blob store; the tool message (and every checkpoint) keeps only a reference.
+    return offload(content)
@@ -0,0 +1,209 @@
+import hashlib
+import logging
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter
+from functools import lru_cache
+from typing import List, Sequence, Tuple
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2500"))
+CONTEXT_CHUNK_TOKENS = int(os.getenv("CONTEXT_CHUNK_TOKENS", "200"))
+FEEDBACK_SUMMARY_TOKENS = int(os.getenv("FEEDBACK_SUMMARY_TOKENS", "300"))
+FEEDBACK_RECENT_TURNS = int(os.getenv("FEEDBACK_RECENT_TURNS", "2"))
+# Seconds before a failed tokenizer load (it may need to download its vocabulary) is retried.
+TOKENIZER_RETRY_SECONDS = float(os.getenv("TOKENIZER_RETRY_SECONDS", "60"))
+
+logger = logging.getLogger(__name__)
+
+_MD_IMAGE = re.compile(r"!\[[^\]]*\]\([^)]*\)")
+_MD_LINK = re.compile(r"\[([^\]]*)\]\([^)]*\)")
+_URL = re.compile(r"https?://\S+")
+_WORD = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have how in is it its of on or that the this to was were what "
+    "when which who why will with about into your you we our".split()
+)
+
+
+_tokenizer = None
+_tokenizer_retry_at = 0.0
+_tokenizer_lock = threading.Lock()
+
+
+def load_tokenizer() -> bool:
+    """Load the cl100k tokenizer. Blocking, so call it off the event loop; a failure is retried later."""
+    global _tokenizer, _tokenizer_retry_at
+    with _tokenizer_lock:
+        if _tokenizer is not None:
+            return True
+        if time.monotonic() < _tokenizer_retry_at:
+            return False
+        try:
+            import tiktoken
+            _tokenizer = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            _tokenizer_retry_at = time.monotonic() + TOKENIZER_RETRY_SECONDS
+            logger.warning("tokenizer load failed", extra={"error": str(e)})
+            return False
+        return True
+
+
+def _encoding():
+    """The tokenizer, or None (character estimate) until it has loaded; never blocks the caller."""
+    if _tokenizer is None and time.monotonic() >= _tokenizer_retry_at and not _tokenizer_lock.locked():
+        threading.Thread(target=load_tokenizer, name="tokenizer-load", daemon=True).start()
+    return _tokenizer
+
+
+def count_tokens(text: str) -> int:
+    encoding = _encoding()
+    if encoding is None:
+        return max(1, len(text) // 4) if text else 0
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, limit: int) -> str:
+    encoding = _encoding()
+    if encoding is None:
+        return text[: limit * 4]
+    tokens = encoding.encode(text, disallowed_special=())
+    return text if len(tokens) <= limit else encoding.decode(tokens[:limit])
+
+
+def clean_text(text: str) -> str:
+    """Strip markup, links and navigation debris from scraped page text."""
+    text = _MD_IMAGE.sub(" ", text)
+    text = _MD_LINK.sub(r"\1", text)
+    text = _URL.sub(" ", text)
+    lines = []
+    seen = set()
+    for line in text.splitlines():
+        line = " ".join(line.strip(" \t#*>|-_=").split())
+        # Menu entries, breadcrumbs and share buttons are short and unpunctuated.
+        if len(line.split()) < 4 and not line.endswith((".", "!", "?", ":")):
+            continue
+        key = line.casefold()
+        if key in seen:
+            continue
+        seen.add(key)
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def split_chunks(text: str, max_tokens: int = CONTEXT_CHUNK_TOKENS) -> List[str]:
+    chunks: List[str] = []
+    current: List[str] = []
+    size = 0
+    for line in text.splitlines():
+        line_tokens = count_tokens(line)
+        if line_tokens > max_tokens:
+            line = truncate_tokens(line, max_tokens)
+            line_tokens = max_tokens
+        if current and size + line_tokens > max_tokens:
+            chunks.append("\n".join(current))
+            current, size = [], 0
+        current.append(line)
+        size += line_tokens
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+def _terms(text: str) -> List[str]:
+    return [w for w in _WORD.findall(text.casefold()) if w not in _STOPWORDS]
+
+
+def rank_chunks(chunks: Sequence[str], query: str) -> List[Tuple[float, int]]:
+    """BM25 score of each chunk against `query`, best first, as (score, index)."""
+    docs = [_terms(chunk) for chunk in chunks]
+    query_terms = set(_terms(query))
+    avg_len = sum(len(d) for d in docs) / len(docs) if docs else 0.0
+    doc_freq = Counter(term for doc in docs for term in set(doc))
+    scored = []
+    for index, doc in enumerate(docs):
+        freqs = Counter(doc)
+        score = 0.0
+        for term in query_terms:
+            if term not in freqs:
+                continue
+            idf = math.log(1 + (len(docs) - doc_freq[term] + 0.5) / (doc_freq[term] + 0.5))
+            tf = freqs[term]
+            score += idf * tf * 2.2 / (tf + 1.2 * (0.25 + 0.75 * len(doc) / (avg_len or 1)))
+        # The lead of an article usually carries the gist even without keyword overlap.
+        score += 1.0 / (1 + index)
+        scored.append((score, index))
+    scored.sort(key=lambda item: (-item[0], item[1]))
+    return scored
+
+
+@lru_cache(maxsize=128)
+def _build_research_context(sources: Tuple[str, ...], query: str, budget: int) -> str:
+    chunks: List[str] = []
+    seen = set()
+    for source in sources:
+        cleaned = clean_text(source) or " ".join(source.split())
+        for chunk in split_chunks(cleaned):
+            digest = hashlib.sha1(" ".join(chunk.casefold().split()).encode()).digest()
+            if digest not in seen:
+                seen.add(digest)
+                chunks.append(chunk)
+    selected = []
+    used = 0
+    for _, index in rank_chunks(chunks, query):
+        tokens = count_tokens(chunks[index])
+        if used + tokens > budget:
+            continue
+        selected.append(index)
+        used += tokens
+    # Keep the article's own order so the excerpt still reads naturally.
+    return "\n\n".join(chunks[i] for i in sorted(selected))
+
+
+def build_research_context(sources: Sequence[str], query: str, budget: int = CONTEXT_TOKEN_BUDGET) -> str:
+    """Clean, deduplicate and rank scraped text, keeping the best chunks within `budget` tokens.
+
+    Results are memoized, so repeated calls for the same research are free.
+    """
+    return _build_research_context(tuple(s for s in sources if s), query or "", budget)
+
+
+def summarize_feedback(history: Sequence[str], limit: int = FEEDBACK_SUMMARY_TOKENS) -> str:
+    """Fold earlier feedback turns into a short bullet list, newest kept when trimming."""
+    lines: List[str] = []
+    used = 0
+    for feedback in reversed(history):
+        line = "- " + truncate_tokens(" ".join(feedback.split()), 60)
+        tokens = count_tokens(line)
+        if used + tokens > limit:
+            break
+        lines.append(line)
+        used += tokens
+    return "\n".join(reversed(lines))
+
+
+def build_revision_messages(
+    base_prompt: str,
+    draft: str,
+    feedback_history: Sequence[str],
+    feedback: str,
+    recent_turns: int = FEEDBACK_RECENT_TURNS,
+) -> List[BaseMessage]:
+    """Prompt for one revision round: bounded context, summarized old feedback, current draft."""
+    older = list(feedback_history[:-recent_turns] if recent_turns else feedback_history)
+    recent = list(feedback_history[-recent_turns:]) if recent_turns else []
+    messages: List[BaseMessage] = [HumanMessage(content=base_prompt)]
+    notes: List[str] = []
+    if older:
+        notes.append("Earlier feedback that still applies:\n" + summarize_feedback(older))
+    if recent:
+        notes.append("Recent feedback already applied:\n" + "\n".join("- " + truncate_tokens(f, 120) for f in recent))
+    if notes:
+        messages.append(HumanMessage(content="\n\n".join(notes)))
+    messages.append(AIMessage(content=draft))
+    messages.append(HumanMessage(content=feedback))
+    return messages
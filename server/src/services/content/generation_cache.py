@@ -0,0 +1,104 @@
+import asyncio
+import logging
+import os
+from typing import List, Optional, Sequence, Tuple
+
+from src.services.cache import SimilarityIndex, cache_key, make_result_cache, normalize_query
+from src.services.content.context_builder import truncate_tokens
+from src.services.resilience import Upstream
+from src.services.telemetry import record_cache_lookup, upstream_span
+
+# "off", "exact" (same platform, research and topic) or "semantic" (also near-duplicates by embedding)
+GENERATION_CACHE = os.getenv("GENERATION_CACHE", "off")
+GENERATION_CACHE_TTL = float(os.getenv("GENERATION_CACHE_TTL", "86400"))
+GENERATION_CACHE_SIMILARITY = float(os.getenv("GENERATION_CACHE_SIMILARITY", "0.95"))
+GENERATION_CACHE_INDEX_MAX = int(os.getenv("GENERATION_CACHE_INDEX_MAX", "1000"))
+GENERATION_CACHE_EMBEDDING_MODEL = os.getenv("GENERATION_CACHE_EMBEDDING_MODEL", "text-embedding-3-small")
+# Short vectors keep the pure-Python scan over the index cheap.
+GENERATION_CACHE_EMBEDDING_DIMENSIONS = int(os.getenv("GENERATION_CACHE_EMBEDDING_DIMENSIONS", "256"))
+GENERATION_CACHE_EMBED_TOKENS = int(os.getenv("GENERATION_CACHE_EMBED_TOKENS", "2000"))
+# A lookup that takes longer than this costs more than generating the drafts would save.
+GENERATION_CACHE_EMBED_TIMEOUT = float(os.getenv("GENERATION_CACHE_EMBED_TIMEOUT", "5"))
+
+logger = logging.getLogger(__name__)
+
+generation_cache = make_result_cache("generation", ttl=GENERATION_CACHE_TTL)
+_index = SimilarityIndex(max_entries=GENERATION_CACHE_INDEX_MAX, default_ttl=GENERATION_CACHE_TTL)
+_embeddings = None
+embeddings_upstream = Upstream("openai_embeddings", timeout=GENERATION_CACHE_EMBED_TIMEOUT, max_concurrency=16)
+
+
+def _embedder():
+    global _embeddings
+    if _embeddings is None:
+        from langchain_openai import OpenAIEmbeddings
+        _embeddings = OpenAIEmbeddings(
+            model=GENERATION_CACHE_EMBEDDING_MODEL,
+            dimensions=GENERATION_CACHE_EMBEDDING_DIMENSIONS,
+            # Input is already truncated below; skip the client-side tokenization pass.
+            check_embedding_ctx_length=False,
+        )
+    return _embeddings
+
+
+class PendingGeneration:
+    """What a cache miss needs to remember to store the drafts generated for it."""
+
+    def __init__(self, key: str, partition: str, text: str):
+        self.key = key
+        self.partition = partition
+        self.text = text
+        self.vector: Optional[List[float]] = None
+
+
+def _identity(platform: str, context: str, topic: str, variant_count: int, model: str) -> Tuple[str, str, str]:
+    key = cache_key("generation", context, platform=platform, topic=normalize_query(topic),
+                    variants=variant_count, model=model)
+    partition = f"{platform}:{variant_count}:{model}"
+    text = truncate_tokens(f"{normalize_query(topic)}\n\n{context}", GENERATION_CACHE_EMBED_TOKENS)
+    return key, partition, text
+
+
+async def _embed(text: str) -> Optional[List[float]]:
+    try:
+        with upstream_span("openai", "embeddings"):
+            return await embeddings_upstream.call(lambda: _embedder().aembed_query(text))
+    except Exception as e:
+        # Without a vector the lookup just falls back to exact matches.
+        logger.warning("generation cache embedding failed", extra={"error": str(e)})
+        return None
+
+
+async def find_drafts(platform: str, context: str, topic: str, variant_count: int,
+                      model: str) -> Tuple[Optional[List[str]], Optional[PendingGeneration]]:
+    """Cached drafts for this prompt, or None and a handle for `store_drafts`.
+
+    Returns (None, None) when the cache is off.
+    """
+    if GENERATION_CACHE not in ("exact", "semantic"):
+        return None, None
+    # Tokenizing the context, the SQLite backend and the index scan all block; keep them off the event loop.
+    pending = PendingGeneration(*await asyncio.to_thread(_identity, platform, context, topic, variant_count, model))
+    drafts = await asyncio.to_thread(generation_cache.lookup, pending.key)
+    if drafts is not None or GENERATION_CACHE != "semantic":
+        return drafts, pending
+    pending.vector = await _embed(pending.text)
+    if pending.vector is None:
+        return None, pending
+    match = await asyncio.to_thread(_index.nearest, pending.vector, pending.partition, GENERATION_CACHE_SIMILARITY)
+    if match is not None:
+        drafts = await asyncio.to_thread(generation_cache.lookup, match[0])
+        if drafts is not None:
+            record_cache_lookup("generation", "similar")
+            return drafts, pending
+        # The draft itself expired or was evicted; its vector is useless now.
+        _index.delete(match[0])
+    return None, pending
+
+
+async def store_drafts(pending: Optional[PendingGeneration], drafts: Sequence[str]) -> None:
+    if pending is None or not drafts:
+        return
+    await asyncio.to_thread(generation_cache.store, pending.key, list(drafts))
+    if pending.vector is not None:
+        _index.add(pending.key, pending.vector, pending.partition)
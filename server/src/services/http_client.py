@@ -0,0 +1,127 @@
+import asyncio
+import os
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from src.services.telemetry import upstream_span
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_PER_HOST_LIMIT = int(os.getenv("HTTP_PER_HOST_LIMIT", "20"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "30"))
+
+_client: Optional[httpx.AsyncClient] = None
+_host_limits: Dict[str, "HostLimit"] = {}
+_stream_limits: Dict[int, "HostLimit"] = {}
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Return the process-wide pooled client, creating it on first use."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+            follow_redirects=True,
+        )
+    return _client
+
+
+class HostLimit:
+    """Caps in-flight requests to one host; dropped once nobody holds or waits for it.
+
+    Image probes reach arbitrary hosts, so keeping one semaphore per host ever
+    seen would grow without bound.
+    """
+
+    __slots__ = ("host", "semaphore", "users")
+
+    def __init__(self, host: str):
+        self.host = host
+        self.semaphore = asyncio.Semaphore(HTTP_PER_HOST_LIMIT)
+        self.users = 0  # holders and waiters
+
+
+async def acquire_host(url: str) -> HostLimit:
+    """Take a slot for the host of `url`; give it back with `release_host`."""
+    host = urlsplit(str(url)).netloc.lower()
+    limit = _host_limits.get(host)
+    if limit is None:
+        limit = _host_limits[host] = HostLimit(host)
+    limit.users += 1
+    try:
+        await limit.semaphore.acquire()
+    except BaseException:
+        _forget_if_idle(limit)
+        raise
+    return limit
+
+
+def release_host(limit: HostLimit) -> None:
+    limit.semaphore.release()
+    _forget_if_idle(limit)
+
+
+def _forget_if_idle(limit: HostLimit) -> None:
+    limit.users -= 1
+    if limit.users == 0 and _host_limits.get(limit.host) is limit:
+        del _host_limits[limit.host]
+
+
+async def request(method: str, url: str, *, upstream: str = "http", operation: Optional[str] = None,
+                  **kwargs) -> httpx.Response:
+    """Send a request through the pool, recorded as an `upstream`/`operation` span."""
+    with upstream_span(upstream, operation or method.lower()) as span:
+        limit = await acquire_host(url)
+        try:
+            response = await get_http_client().request(method, url, **kwargs)
+        finally:
+            release_host(limit)
+        span.status = response.status_code
+        span.bytes_in = len(response.content)
+        span.bytes_out = int(response.request.headers.get("content-length", 0))
+        return response
+
+
+async def open_stream(method: str, url: str, *, upstream: str = "http", operation: Optional[str] = None,
+                      **kwargs) -> httpx.Response:
+    """Send a request and return the response with its body still unread.
+
+    The host slot is held until the response is passed to `close_stream`. The
+    span covers the time to response headers; body bytes are the reader's to count.
+    """
+    limit = await acquire_host(url)
+    try:
+        client = get_http_client()
+        with upstream_span(upstream, operation or method.lower()) as span:
+            response = await client.send(client.build_request(method, url, **kwargs), stream=True)
+            span.status = response.status_code
+    except BaseException:
+        release_host(limit)
+        raise
+    _stream_limits[id(response)] = limit
+    return response
+
+
+async def close_stream(response: httpx.Response) -> None:
+    try:
+        await response.aclose()
+    finally:
+        limit = _stream_limits.pop(id(response), None)
+        if limit is not None:
+            release_host(limit)
+
+
+async def close_http_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
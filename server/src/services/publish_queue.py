@@ -0,0 +1,394 @@
+"""Persistent publish jobs with scheduling, rate limits and retries.
+
+Jobs live in SQLite so they survive restarts and are shared by every worker
+process on the host. Each process runs a small pool of asyncio workers that
+claim due jobs, respect per-token and per-app rate limits, and retry
+transient failures with jittered exponential backoff.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from src.services.social.errors import PublishError
+from src.services.social.linkedin import post_to_linkedin
+from src.services.social.twitter import upload_to_twitter
+from src.services.telemetry import record_retry
+
+PUBLISH_QUEUE_DB_PATH = os.getenv("PUBLISH_QUEUE_DB_PATH", os.getenv("CHECKPOINT_DB_PATH", "agent_state.sqlite3"))
+PUBLISH_WORKERS = int(os.getenv("PUBLISH_WORKERS", "4"))
+PUBLISH_MAX_ATTEMPTS = int(os.getenv("PUBLISH_MAX_ATTEMPTS", "6"))
+PUBLISH_BACKOFF_BASE = float(os.getenv("PUBLISH_BACKOFF_BASE", "2"))
+PUBLISH_BACKOFF_MAX = float(os.getenv("PUBLISH_BACKOFF_MAX", "300"))
+PUBLISH_POLL_INTERVAL = float(os.getenv("PUBLISH_POLL_INTERVAL", "1"))
+# Running jobs renew their lease; one left to expire belonged to a worker that died mid-publish.
+PUBLISH_LEASE_SECONDS = float(os.getenv("PUBLISH_LEASE_SECONDS", "120"))
+# On shutdown, how long running jobs get to finish before they are interrupted and marked unknown.
+PUBLISH_SHUTDOWN_GRACE = float(os.getenv("PUBLISH_SHUTDOWN_GRACE", "10"))
+PUBLISH_TOKEN_RATE_PER_MINUTE = float(os.getenv("PUBLISH_TOKEN_RATE_PER_MINUTE", "10"))
+PUBLISH_APP_RATE_PER_MINUTE = float(os.getenv("PUBLISH_APP_RATE_PER_MINUTE", "100"))
+
+QUEUED, RUNNING, RETRYING, SUCCEEDED, FAILED = "queued", "running", "retrying", "succeeded", "failed"
+# The platform may have published the post despite the error; a person has to check before it is sent again.
+UNKNOWN = "unknown"
+FINAL_STATUSES = (SUCCEEDED, FAILED, UNKNOWN)
+
+# job_id, platform, content, image_url, access_token, attempts, lease_id
+Job = Tuple[str, str, str, Optional[str], Optional[str], int, str]
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """Token buckets keyed by string, plus cool-downs imposed by upstream 429s.
+
+    Limits are per process; with several workers each gets the full budget.
+    """
+
+    def __init__(self, per_minute: float, burst: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.burst = burst if burst is not None else max(1.0, per_minute / 10)
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._blocked_until: Dict[str, float] = {}
+
+    def wait_time(self, key: str, now: float) -> float:
+        tokens, updated = self._buckets.get(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        self._buckets[key] = (tokens, now)
+        wait = 0.0 if tokens >= 1 else (1 - tokens) / self.rate
+        return max(wait, self._blocked_until.get(key, 0.0) - now)
+
+    def take(self, key: str) -> None:
+        tokens, updated = self._buckets[key]
+        self._buckets[key] = (tokens - 1, updated)
+
+    def block(self, key: str, until: float) -> None:
+        self._blocked_until[key] = max(until, self._blocked_until.get(key, 0.0))
+
+
+def idempotency_key(platform: str, access_token: Optional[str], content: str, image_url: Optional[str],
+                    publish_at: Optional[float]) -> str:
+    """The same post for the same account maps to one job, however often it is submitted."""
+    raw = "\x00".join([platform, access_token or "", content, image_url or "", repr(publish_at)])
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class PublishQueue:
+    def __init__(self, path: str = PUBLISH_QUEUE_DB_PATH):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS publish_jobs ("
+            " job_id TEXT PRIMARY KEY, idempotency_key TEXT NOT NULL UNIQUE, platform TEXT NOT NULL,"
+            " content TEXT NOT NULL, image_url TEXT, access_token TEXT, status TEXT NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0, run_at REAL NOT NULL, leased_until REAL,"
+            " post_id TEXT, last_error TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL, lease_id TEXT)"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(publish_jobs)")}
+        if "lease_id" not in columns:
+            self._conn.execute("ALTER TABLE publish_jobs ADD COLUMN lease_id TEXT")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS publish_jobs_due ON publish_jobs (status, run_at)")
+        self.app_limits = RateLimiter(PUBLISH_APP_RATE_PER_MINUTE)
+        self.token_limits = RateLimiter(PUBLISH_TOKEN_RATE_PER_MINUTE)
+        self._wakeup: Optional[asyncio.Event] = None
+        self._workers: List[asyncio.Task] = []
+        self._stopping = False
+        self._finished: Dict[str, asyncio.Event] = {}
+
+    # --- jobs ----------------------------------------------------------
+
+    def enqueue(self, platform: str, content: str, image_url: Optional[str] = None,
+                access_token: Optional[str] = None, publish_at: Optional[float] = None) -> Dict[str, Any]:
+        job = self._insert(platform, content, image_url, access_token, publish_at)
+        self._wake()
+        return job
+
+    async def aenqueue(self, platform: str, content: str, image_url: Optional[str] = None,
+                       access_token: Optional[str] = None, publish_at: Optional[float] = None) -> Dict[str, Any]:
+        # BEGIN IMMEDIATE may wait out another writer's lock; keep that off the event loop.
+        job = await asyncio.to_thread(self._insert, platform, content, image_url, access_token, publish_at)
+        self._wake()
+        return job
+
+    def _wake(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _insert(self, platform: str, content: str, image_url: Optional[str], access_token: Optional[str],
+                publish_at: Optional[float]) -> Dict[str, Any]:
+        """Create a job, or return the existing one for the same post.
+
+        A failed job for the same post is reset and queued again: failed only
+        covers outcomes known not to have reached the platform, so running it
+        again cannot post twice. Jobs with an unknown outcome are never reset.
+        """
+        key = idempotency_key(platform, access_token, content, image_url, publish_at)
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT job_id, status FROM publish_jobs WHERE idempotency_key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    job_id = str(uuid.uuid4())
+                    self._conn.execute(
+                        "INSERT INTO publish_jobs (job_id, idempotency_key, platform, content, image_url,"
+                        " access_token, status, run_at, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (job_id, key, platform, content, image_url, access_token, QUEUED,
+                         publish_at or now, now, now),
+                    )
+                else:
+                    job_id = row[0]
+                    if row[1] == FAILED:
+                        self._conn.execute(
+                            "UPDATE publish_jobs SET status = ?, attempts = 0, run_at = ?, access_token = ?,"
+                            " last_error = NULL, updated_at = ? WHERE job_id = ?",
+                            (QUEUED, max(publish_at or now, now), access_token, now, job_id),
+                        )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return self.get(job_id)  # type: ignore[return-value]
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Job status as served by the API; the access token is never included."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT job_id, platform, status, attempts, run_at, post_id, last_error, created_at, updated_at"
+                " FROM publish_jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        keys = ("job_id", "platform", "status", "attempts", "run_at", "post_id", "last_error", "created_at", "updated_at")
+        return dict(zip(keys, row))
+
+    async def aget(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self.get, job_id)
+
+    def _claim(self) -> Optional[Job]:
+        """Lease the next due job to this worker under a fresh lease id."""
+        now = time.time()
+        lease_id = uuid.uuid4().hex
+        with self._lock:
+            # The worker stopped somewhere inside the publish, so the post may be live: never run it again.
+            self._conn.execute(
+                "UPDATE publish_jobs SET status = ?, leased_until = NULL, lease_id = NULL, access_token = NULL,"
+                " last_error = ?, updated_at = ? WHERE status = ? AND leased_until <= ?",
+                (UNKNOWN, "publish worker stopped before the outcome was recorded", now, RUNNING, now),
+            )
+            row = self._conn.execute(
+                "UPDATE publish_jobs SET status = ?, leased_until = ?, lease_id = ?, updated_at = ? WHERE job_id = ("
+                " SELECT job_id FROM publish_jobs WHERE status IN (?, ?) AND run_at <= ? ORDER BY run_at LIMIT 1)"
+                " RETURNING job_id, platform, content, image_url, access_token, attempts",
+                (RUNNING, now + PUBLISH_LEASE_SECONDS, lease_id, now, QUEUED, RETRYING, now),
+            ).fetchone()
+        return (*row, lease_id) if row is not None else None
+
+    def _update(self, job_id: str, lease: str, **fields: Any) -> bool:
+        """Write fields of a job held under `lease`; False when that lease was lost."""
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            cursor = self._conn.execute(f"UPDATE publish_jobs SET {assignments} WHERE job_id = ? AND lease_id = ?",
+                                        (*fields.values(), job_id, lease))
+        if cursor.rowcount == 0:
+            logger.warning("publish lease lost", extra={"job_id": job_id})
+            return False
+        return True
+
+    async def _aupdate(self, job_id: str, lease: str, **fields: Any) -> bool:
+        return await asyncio.to_thread(self._update, job_id, lease, **fields)
+
+    async def _renew_lease(self, job_id: str, lease_id: str) -> None:
+        while True:
+            await asyncio.sleep(PUBLISH_LEASE_SECONDS / 3)
+            if not await self._aupdate(job_id, lease_id, leased_until=time.time() + PUBLISH_LEASE_SECONDS):
+                return
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM publish_jobs GROUP BY status").fetchall()
+        return dict(rows)
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """Wait up to `timeout` seconds for a job to finish and return its latest status."""
+        deadline = time.monotonic() + timeout
+        finished = self._finished.setdefault(job_id, asyncio.Event())
+        try:
+            while True:
+                job = await self.aget(job_id)
+                remaining = deadline - time.monotonic()
+                if job is None or job["status"] in FINAL_STATUSES or remaining <= 0:
+                    return job
+                # Jobs run by another process only show up by polling.
+                try:
+                    await asyncio.wait_for(finished.wait(), min(remaining, PUBLISH_POLL_INTERVAL))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._finished.pop(job_id, None)
+
+    # --- workers -------------------------------------------------------
+
+    @staticmethod
+    def backoff(attempts: int) -> float:
+        """Full-jitter exponential backoff before retry number `attempts`."""
+        return random.uniform(0, min(PUBLISH_BACKOFF_MAX, PUBLISH_BACKOFF_BASE * 2 ** attempts))
+
+    async def _publish(self, platform: str, content: str, image_url: Optional[str],
+                       access_token: Optional[str]) -> Tuple[bool, Optional[str]]:
+        if platform == "linkedin":
+            if not access_token:
+                raise PublishError("no linkedin access token")
+            return await post_to_linkedin(access_token=access_token, content=content, image_url=image_url)
+        if platform == "twitter":
+            return await upload_to_twitter(content=content, image_url=image_url, access_token=access_token)
+        raise PublishError(f"unsupported platform {platform!r}")
+
+    async def run_job(self, job: Job) -> None:
+        job_id, platform, content, image_url, access_token, attempts, lease_id = job
+        now = time.time()
+        app_key = platform
+        token_key = f"{platform}:{hashlib.sha256((access_token or '').encode()).hexdigest()[:16]}"
+        wait = max(self.app_limits.wait_time(app_key, now), self.token_limits.wait_time(token_key, now))
+        if wait > 0:
+            # Not an attempt: the job just waits for its turn.
+            await self._aupdate(job_id, lease_id, status=QUEUED, run_at=now + wait, leased_until=None, lease_id=None)
+            return
+        self.app_limits.take(app_key)
+        self.token_limits.take(token_key)
+
+        # Uploads can outlast one lease (several upstream timeouts plus an image stream).
+        renewer = asyncio.create_task(self._renew_lease(job_id, lease_id))
+        try:
+            try:
+                success, post_id = await self._publish(platform, content, image_url, access_token)
+            finally:
+                renewer.cancel()
+        except asyncio.CancelledError:
+            # Shutdown outlasted its grace period mid-publish; record it now rather than leave a lease to expire.
+            logger.error("publish interrupted by shutdown", extra={"job_id": job_id, "platform": platform})
+            await self._finish(job_id, lease_id, status=UNKNOWN, attempts=attempts + 1,
+                               last_error="publish interrupted by shutdown")
+            raise
+        except (PublishError, httpx.TransportError) as e:
+            if getattr(e, "outcome_unknown", False):
+                logger.error("publish outcome unknown", extra={"job_id": job_id, "platform": platform,
+                                                               "error": str(e)})
+                await self._finish(job_id, lease_id, status=UNKNOWN, attempts=attempts + 1, last_error=str(e))
+            else:
+                await self._failed_attempt(job_id, lease_id, platform, token_key, attempts, e)
+            return
+        except Exception as e:
+            # Nothing says how far the publish got, so it must not run again on its own.
+            logger.exception("publish crashed", extra={"job_id": job_id, "platform": platform})
+            await self._finish(job_id, lease_id, status=UNKNOWN, attempts=attempts + 1, last_error=str(e))
+            return
+        if success:
+            await self._finish(job_id, lease_id, status=SUCCEEDED, attempts=attempts + 1, post_id=post_id,
+                               last_error=None)
+        else:
+            await self._finish(job_id, lease_id, status=FAILED, attempts=attempts + 1,
+                               last_error=f"{platform} rejected the post")
+
+    async def _failed_attempt(self, job_id: str, lease_id: str, platform: str, token_key: str, attempts: int,
+                              e: Exception) -> None:
+        """Schedule a retry for a failure that did not publish, or fail the job for good."""
+        retryable = isinstance(e, httpx.TransportError) or getattr(e, "retryable", False)
+        retry_after = getattr(e, "retry_after", None)
+        if retry_after:
+            self.token_limits.block(token_key, time.time() + retry_after)
+        attempts += 1
+        if retryable and attempts < PUBLISH_MAX_ATTEMPTS:
+            delay = max(retry_after or 0.0, self.backoff(attempts))
+            record_retry(platform, "publish")
+            logger.warning("publish attempt failed, retrying", extra={
+                "job_id": job_id, "platform": platform, "attempts": attempts,
+                "retry_in": round(delay, 2), "error": str(e),
+            })
+            await self._aupdate(job_id, lease_id, status=RETRYING, attempts=attempts, run_at=time.time() + delay,
+                         leased_until=None, lease_id=None, last_error=str(e))
+            return
+        logger.warning("publish failed", extra={"job_id": job_id, "platform": platform,
+                                                "attempts": attempts, "error": str(e)})
+        await self._finish(job_id, lease_id, status=FAILED, attempts=attempts, last_error=str(e))
+
+    async def _finish(self, job_id: str, lease: str, **fields: Any) -> None:
+        # The token is only kept while the job may still run.
+        if not await self._aupdate(job_id, lease, leased_until=None, lease_id=None, access_token=None, **fields):
+            return
+        finished = self._finished.get(job_id)
+        if finished is not None:
+            finished.set()
+
+    async def _claim_next(self) -> Optional[Job]:
+        # Shielded: the claim finishes in its thread even if we are cancelled, and its job must not stay leased.
+        claim = asyncio.ensure_future(asyncio.to_thread(self._claim))
+        try:
+            return await asyncio.shield(claim)
+        except asyncio.CancelledError:
+            job = await claim
+            if job is not None:
+                await self._aupdate(job[0], job[-1], status=QUEUED, leased_until=None, lease_id=None)
+            raise
+
+    async def _worker(self) -> None:
+        assert self._wakeup is not None
+        while not self._stopping:
+            job = await self._claim_next()
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), PUBLISH_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                await self.run_job(job)
+            except Exception:
+                logger.exception("publish worker error", extra={"job_id": job[0]})
+
+    async def run_workers(self, count: int = PUBLISH_WORKERS) -> None:
+        """Run `count` workers until `stop` lets them finish, or until cancelled."""
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(count)]
+        try:
+            # Workers log their own errors; one cancelled by `stop` must not read as run_workers cancelled.
+            await asyncio.gather(*self._workers, return_exceptions=True)
+        finally:
+            for worker in self._workers:
+                worker.cancel()
+            await asyncio.gather(*self._workers, return_exceptions=True)
+            self._workers = []
+            self._wakeup = None
+
+    async def stop(self, grace: float = PUBLISH_SHUTDOWN_GRACE) -> None:
+        """Stop claiming jobs and give running ones `grace` seconds to finish.
+
+        Jobs still publishing after that are cancelled and marked unknown, so
+        none is left leased to a worker that no longer exists.
+        """
+        self._stopping = True
+        self._wake()
+        workers = list(self._workers)
+        if not workers:
+            return
+        _, pending = await asyncio.wait(workers, timeout=grace)
+        for worker in pending:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+
+publish_queue = PublishQueue()
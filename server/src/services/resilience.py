@@ -0,0 +1,171 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from src.services.telemetry import record_circuit_state, record_resilience_event
+
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+
+class UpstreamUnavailable(Exception):
+    """Raised instead of calling an upstream whose circuit is open."""
+
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive failures, then lets one trial call
+    through every `reset_seconds` until a trial succeeds."""
+
+    def __init__(self, name: str, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+                 reset_seconds: float = CIRCUIT_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+        record_circuit_state(name, CLOSED)
+
+    def _set(self, state: str) -> None:
+        if state != self.state:
+            logger.warning("circuit state changed", extra={"upstream": self.name, "from": self.state, "to": state})
+            self.state = state
+            record_circuit_state(self.name, state)
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            now = time.monotonic()
+            # A trial that never reports back (e.g. cancelled) is replaced after another reset period.
+            if now - self._opened_at >= self.reset_seconds:
+                self._opened_at = now
+                self._set(HALF_OPEN)
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self._set(CLOSED)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                self._set(OPEN)
+
+
+class Upstream:
+    """Deadline, bulkhead and circuit breaker around one external dependency.
+
+    `timeout` bounds the whole call including the wait for a concurrency slot,
+    so a saturated upstream fails fast instead of queueing requests. Errors
+    for which `trips` returns False (e.g. a rejected request) pass through
+    without counting against the circuit.
+    """
+
+    def __init__(self, name: str, timeout: float, max_concurrency: int,
+                 trips: Callable[[BaseException], bool] = lambda e: True,
+                 breaker: Optional[CircuitBreaker] = None):
+        self.name = name
+        self.timeout = timeout
+        self.trips = trips
+        self.breaker = breaker or CircuitBreaker(name)
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._thread_slots = threading.BoundedSemaphore(max_concurrency)
+
+    def _rejected(self, fallback: Optional[Callable[[], T]]) -> T:
+        record_resilience_event(self.name, "circuit_open")
+        if fallback is None:
+            raise UpstreamUnavailable(f"{self.name} is unavailable (circuit open)")
+        record_resilience_event(self.name, "fallback")
+        return fallback()
+
+    def _failed(self, error: Exception, fallback: Optional[Callable[[], T]]) -> T:
+        if isinstance(error, (asyncio.TimeoutError, TimeoutError)):
+            record_resilience_event(self.name, "timeout")
+        if self.trips(error):
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()  # the upstream answered; the request itself was at fault
+        if fallback is None:
+            raise error
+        logger.warning("upstream call failed, using fallback", extra={"upstream": self.name, "error": repr(error)})
+        record_resilience_event(self.name, "fallback")
+        return fallback()
+
+    async def call(self, fn: Callable[[], Awaitable[T]], fallback: Optional[Callable[[], T]] = None,
+                   timeout: Optional[float] = None) -> T:
+        if not self.breaker.allow():
+            return self._rejected(fallback)
+
+        async def run() -> T:
+            async with self._slots:
+                return await fn()
+        try:
+            result = await asyncio.wait_for(run(), timeout or self.timeout)
+        except Exception as e:
+            return self._failed(e, fallback)
+        self.breaker.record_success()
+        return result
+
+    def call_sync(self, fn: Callable[[float], T], fallback: Optional[Callable[[], T]] = None,
+                  timeout: Optional[float] = None) -> T:
+        """Blocking variant; `fn` gets the seconds left and must pass them on as its own timeout,
+        since a call running in a thread cannot be cancelled."""
+        if not self.breaker.allow():
+            return self._rejected(fallback)
+        deadline = time.monotonic() + (timeout or self.timeout)
+        try:
+            if not self._thread_slots.acquire(timeout=deadline - time.monotonic()):
+                raise TimeoutError(f"{self.name} has no free slot")
+            try:
+                result = fn(max(0.1, deadline - time.monotonic()))
+            finally:
+                self._thread_slots.release()
+        except Exception as e:
+            return self._failed(e, fallback)
+        self.breaker.record_success()
+        return result
+
+
+async def hedged(primary: Callable[[], Awaitable[T]], backup: Callable[[], Awaitable[T]],
+                 delay: float, upstream: str) -> T:
+    """Run `primary`; if it has not finished after `delay` seconds, also start `backup`
+    and return whichever succeeds first. The slower call is cancelled."""
+    first = asyncio.ensure_future(primary())
+    pending = {first}
+    try:
+        done, _ = await asyncio.wait(pending, timeout=delay)
+        if done:
+            return first.result()
+        record_resilience_event(upstream, "hedged")
+        second = asyncio.ensure_future(backup())
+        pending.add(second)
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is second:
+                        record_resilience_event(upstream, "hedge_won")
+                    return task.result()
+                error = task.exception()
+        assert error is not None
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
@@ -0,0 +1,44 @@
+import email.utils
+import time
+from typing import Mapping, Optional
+
+
+class PublishError(Exception):
+    """A platform call failed. `retryable` is only set when retrying cannot post twice;
+    `outcome_unknown` when the post may be live despite the error."""
+
+    def __init__(self, message: str, retryable: bool = False, retry_after: Optional[float] = None,
+                 outcome_unknown: bool = False):
+        super().__init__(message)
+        self.retryable = retryable
+        self.retry_after = retry_after
+        self.outcome_unknown = outcome_unknown
+
+
+def retry_after_seconds(headers: Mapping[str, str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header, given either as seconds or an HTTP date."""
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def is_transient(status_code: int) -> bool:
+    """Rate limited or a server error: worth retrying for calls that are safe to repeat."""
+    return status_code == 429 or status_code >= 500
+
+
+def was_not_processed(status_code: int) -> bool:
+    """Rejected before the request was acted on, so even a non-idempotent call may be repeated.
+
+    Only a rate limit says that. 502/503/504 come from gateways that may have
+    forwarded the request, and the post may exist behind them.
+    """
+    return status_code == 429
@@ -1,38 +1,88 @@
-import requests
+import asyncio
+import hashlib
+import logging
+import os
+import time
 from typing import Optional, Tuple
+import httpx
+from src.services import http_client
+from src.services.cache import TTLCache
+from src.services.social.errors import PublishError, is_transient, retry_after_seconds, was_not_processed
+from src.services.social.media import ImageTransferError, relay_chunks, source_length
+from src.services.social import media
 
-def get_author_urn(access_token: str) -> Optional[str]:
-    print("here inside get_author_urn")
+logger = logging.getLogger(__name__)
+
+LINKEDIN_API_BASE = os.getenv("LINKEDIN_API_BASE", "https://api.linkedin.com").rstrip("/")
+IMAGE_MAX_BYTES = int(os.getenv("LINKEDIN_IMAGE_MAX_BYTES", str(10 * 1024 * 1024)))
+AUTHOR_URN_TTL = float(os.getenv("LINKEDIN_AUTHOR_URN_TTL", "3600"))
+
+# Both caches are keyed by a hash of the access token, never the token itself.
+_author_urns = TTLCache(max_entries=10_000, default_ttl=AUTHOR_URN_TTL)
+_token_expiry = TTLCache(max_entries=10_000)
+
+
+def _check_transient(resp: httpx.Response, operation: str) -> None:
+    """Raise a retryable error for 429/5xx so the publish queue backs off instead of giving up."""
+    if is_transient(resp.status_code):
+        raise PublishError(f"linkedin {operation} returned {resp.status_code}", retryable=True,
+                           retry_after=retry_after_seconds(resp.headers))
+
+
+def _token_key(access_token: str) -> str:
+    return hashlib.sha256(access_token.encode()).hexdigest()
+
+
+def remember_token_expiry(access_token: str, expires_in: float) -> None:
+    """Record when a token expires so cached lookups never outlive it."""
+    _token_expiry.set(_token_key(access_token), time.time() + expires_in, ttl=expires_in)
+
+
+async def get_author_urn(access_token: str) -> Optional[str]:
+    key = _token_key(access_token)
+    author_urn = _author_urns.get(key)
+    if author_urn:
+        return author_urn
+    author_urn = await _fetch_author_urn(access_token)
+    if author_urn:
+        ttl = AUTHOR_URN_TTL
+        expires_at = _token_expiry.get(key)
+        if expires_at is not None:
+            ttl = min(ttl, expires_at - time.time())
+        _author_urns.set(key, author_urn, ttl=ttl)
+    return author_urn
+
+
+async def _fetch_author_urn(access_token: str) -> Optional[str]:
     headers = {
         "Authorization": f"Bearer {access_token}",
         "X-Restli-Protocol-Version": "2.0.0",
     }
-    resp = requests.get("https://api.linkedin.com/v2/userinfo", headers=headers)
-    print("userinfo resp", resp)
-    print("userinfo status_code", resp.status_code)
+    resp = await http_client.request("GET", f"{LINKEDIN_API_BASE}/v2/userinfo", headers=headers,
+                                     upstream="linkedin", operation="userinfo")
+    _check_transient(resp, "userinfo")
     try:
         userinfo = resp.json()
     except Exception as e:
-        print("Failed to parse userinfo json", e)
+        logger.warning("unparseable userinfo response", extra={"status": resp.status_code, "error": str(e)})
         userinfo = None
     if resp.status_code == 200 and userinfo and userinfo.get("sub"):
         return f"urn:li:person:{userinfo['sub']}"
     # Fallback to classic /v2/me endpoint
-    resp = requests.get("https://api.linkedin.com/v2/me", headers=headers)
-    print("me resp", resp)
-    print("me status_code", resp.status_code)
+    resp = await http_client.request("GET", f"{LINKEDIN_API_BASE}/v2/me", headers=headers,
+                                     upstream="linkedin", operation="me")
+    _check_transient(resp, "me")
     try:
         meinfo = resp.json()
     except Exception as e:
-        print("Failed to parse me json", e)
+        logger.warning("unparseable me response", extra={"status": resp.status_code, "error": str(e)})
         meinfo = None
     if resp.status_code == 200 and meinfo and meinfo.get("id"):
         return f"urn:li:person:{meinfo['id']}"
     return None
 
-def register_image_upload(access_token: str, author_urn: str) -> Tuple[Optional[str], Optional[str]]:
-    print("here inside register_image_upload")
-    url = "https://api.linkedin.com/v2/assets?action=registerUpload"
+async def register_image_upload(access_token: str, author_urn: str) -> Tuple[Optional[str], Optional[str]]:
+    url = f"{LINKEDIN_API_BASE}/v2/assets?action=registerUpload"
     headers = {
         "Authorization": f"Bearer {access_token}",
         "X-Restli-Protocol-Version": "2.0.0",
@@ -50,8 +100,9 @@ def register_image_upload(access_token: str, author_urn: str) -> Tuple[Optional[
             ]
         }
     }
-    resp = requests.post(url, headers=headers, json=body)
-    print("resp", resp)
+    resp = await http_client.request("POST", url, headers=headers, json=body,
+                                     upstream="linkedin", operation="register_upload")
+    _check_transient(resp, "register_upload")
     if resp.status_code == 200:
         data = resp.json()["value"]
         upload_url = data["uploadMechanism"]["com.linkedin.digitalmedia.uploading.MediaUploadHttpRequest"]["uploadUrl"]
@@ -59,14 +110,38 @@ def register_image_upload(access_token: str, author_urn: str) -> Tuple[Optional[
         return upload_url, asset_urn
     return None, None
 
-def upload_image_to_linkedin(upload_url: str, image_url: str) -> bool:
-    img_data = requests.get(image_url).content
-    resp = requests.put(upload_url, data=img_data, headers={"Content-Type": "application/octet-stream"})
+async def open_image_source(image_url: str) -> httpx.Response:
+    return await media.open_image_source(image_url, IMAGE_MAX_BYTES)
+
+
+async def upload_image_to_linkedin(upload_url: str, image_url: str) -> bool:
+    try:
+        source = await open_image_source(image_url)
+    except (ImageTransferError, httpx.HTTPError, ValueError) as e:
+        logger.warning("image source rejected", extra={"error": str(e)})
+        return False
+    return await stream_image_upload(upload_url, source)
+
+
+async def stream_image_upload(upload_url: str, source: httpx.Response) -> bool:
+    """PUT an already opened image source to `upload_url`; always closes the source."""
+    try:
+        headers = {"Content-Type": "application/octet-stream"}
+        length = source_length(source)
+        if length >= 0:
+            headers["Content-Length"] = str(length)
+        resp = await http_client.request("PUT", upload_url, content=relay_chunks(source, IMAGE_MAX_BYTES), headers=headers,
+                                         upstream="linkedin", operation="upload_image")
+    except (ImageTransferError, httpx.HTTPError) as e:
+        logger.warning("image transfer failed", extra={"error": str(e)})
+        return False
+    finally:
+        await http_client.close_stream(source)
+    _check_transient(resp, "upload_image")
     return resp.status_code in (200, 201)
 
-def create_linkedin_post(access_token: str, author_urn: str, content: str, asset_urn: Optional[str] = None) -> Tuple[bool, Optional[str]]:
-    print("here inside create_linkedin_post")
-    url = "https://api.linkedin.com/v2/ugcPosts"
+async def create_linkedin_post(access_token: str, author_urn: str, content: str, asset_urn: Optional[str] = None) -> Tuple[bool, Optional[str]]:
+    url = f"{LINKEDIN_API_BASE}/v2/ugcPosts"
     headers = {
         "Authorization": f"Bearer {access_token}",
         "X-Restli-Protocol-Version": "2.0.0",
@@ -91,24 +166,69 @@ def create_linkedin_post(access_token: str, author_urn: str, content: str, asset
         },
         "visibility": {"com.linkedin.ugc.MemberNetworkVisibility": "PUBLIC"}
     }
-    resp = requests.post(url, headers=headers, json=post_data)
+    try:
+        resp = await http_client.request("POST", url, headers=headers, json=post_data,
+                                         upstream="linkedin", operation="create_post")
+    except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout):
+        raise  # never reached LinkedIn, safe to retry
+    except httpx.TransportError as e:
+        # The post may or may not exist now; retrying could publish it twice.
+        raise PublishError(f"linkedin post outcome unknown: {e}", outcome_unknown=True) from e
+    if was_not_processed(resp.status_code):
+        raise PublishError(f"linkedin create_post returned {resp.status_code}", retryable=True,
+                           retry_after=retry_after_seconds(resp.headers))
     if resp.status_code in (200, 201):
         return True, resp.json().get("id")
+    if resp.status_code >= 500:
+        # The server failed while handling the post, which may have been created first.
+        raise PublishError(f"linkedin post outcome unknown: create_post returned {resp.status_code}",
+                           outcome_unknown=True)
+    logger.warning("linkedin post rejected", extra={"status": resp.status_code})
     return False, None
 
-def post_to_linkedin(access_token: str, content: str, image_url: Optional[str] = None) -> Tuple[bool, Optional[str]]:
-    print("here inside post_to_linkedin")
-    author_urn = get_author_urn(access_token)
-    if not author_urn:
-        print("no author urn")
-        return False, None
-    asset_urn = None
-    if image_url:
-        upload_url, asset_urn = register_image_upload(access_token, author_urn)
-        if not upload_url or not asset_urn:
-            print("no upload url or asset urn")
-            return False, None
-        if not upload_image_to_linkedin(upload_url, image_url):
-            print("failed to upload image to linkedin")
+async def _discard_image_source(source_task: "asyncio.Task[httpx.Response]") -> None:
+    if not source_task.done():
+        source_task.cancel()
+    try:
+        source = await source_task
+    except BaseException:
+        return
+    await http_client.close_stream(source)
+
+
+async def post_to_linkedin(access_token: str, content: str, image_url: Optional[str] = None) -> Tuple[bool, Optional[str]]:
+    """Publish a post, returning (success, post id).
+
+    Rate limits and transient failures raise a retryable PublishError (or an
+    httpx transport error) instead of returning False, so callers can retry.
+    """
+    # The image download does not depend on the author, so start it first and let it
+    # overlap the URN lookup and asset registration.
+    source_task = asyncio.create_task(open_image_source(image_url)) if image_url else None
+    try:
+        author_urn = await get_author_urn(access_token)
+        if not author_urn:
+            logger.warning("no linkedin author urn for token")
             return False, None
-    return create_linkedin_post(access_token, author_urn, content, asset_urn)
+        asset_urn = None
+        if source_task is not None:
+            if source_task.done() and source_task.exception() is not None:
+                logger.warning("image source rejected", extra={"error": str(source_task.exception())})
+                return False, None
+            upload_url, asset_urn = await register_image_upload(access_token, author_urn)
+            if not upload_url or not asset_urn:
+                logger.warning("linkedin image registration failed")
+                return False, None
+            try:
+                source = await source_task
+            except (ImageTransferError, httpx.HTTPError, ValueError) as e:
+                logger.warning("image source rejected", extra={"error": str(e)})
+                return False, None
+            source_task = None
+            if not await stream_image_upload(upload_url, source):
+                logger.warning("linkedin image upload failed")
+                return False, None
+        return await create_linkedin_post(access_token, author_urn, content, asset_urn)
+    finally:
+        if source_task is not None:
+            await _discard_image_source(source_task)
@@ -0,0 +1,378 @@
+import asyncio
+import functools
+import hashlib
+import logging
+import math
+import os
+import struct
+import tempfile
+import threading
+import time
+from typing import AsyncIterator, BinaryIO, List, NamedTuple, Optional, Sequence, Tuple
+
+import httpx
+
+from src.services import http_client
+from src.services.telemetry import record_bytes, record_cache_lookup
+
+IMAGE_CHUNK_BYTES = int(os.getenv("IMAGE_CHUNK_BYTES", os.getenv("LINKEDIN_IMAGE_CHUNK_BYTES", str(64 * 1024))))
+IMAGE_CONTENT_TYPES = ("image/jpeg", "image/png", "image/gif", "image/webp")
+# Enough for the dimensions of nearly every image; JPEGs with larger metadata stay unmeasured.
+IMAGE_PROBE_BYTES = int(os.getenv("IMAGE_PROBE_BYTES", str(64 * 1024)))
+IMAGE_PROBE_TIMEOUT = float(os.getenv("IMAGE_PROBE_TIMEOUT", "5"))
+# Narrower images look blurry in the feed; they are kept, but ranked last.
+IMAGE_MIN_WIDTH = int(os.getenv("IMAGE_MIN_WIDTH", "600"))
+# Width / height of the preferred shape (LinkedIn and X large previews are 1.91:1).
+IMAGE_TARGET_ASPECT = float(os.getenv("IMAGE_TARGET_ASPECT", "1.91"))
+IMAGE_CACHE_DIR = os.getenv("IMAGE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "social-agent-images"))
+# Long enough for scheduled posts; an expired entry only means downloading again.
+IMAGE_CACHE_TTL = float(os.getenv("IMAGE_CACHE_TTL", "86400"))
+IMAGE_CACHE_MAX_BYTES = int(os.getenv("IMAGE_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+logger = logging.getLogger(__name__)
+
+
+class ImageTransferError(Exception):
+    pass
+
+
+class ImageInfo(NamedTuple):
+    url: str
+    content_type: str
+    size: Optional[int]  # bytes, when the host reported it
+    width: Optional[int]
+    height: Optional[int]
+
+
+def parse_image_header(data: bytes) -> Optional[Tuple[str, Optional[int], Optional[int]]]:
+    """(content type, width, height) from the first bytes of a PNG, JPEG, GIF or WebP.
+
+    Returns None when the bytes are not one of those formats. Width and height
+    are None when the format is recognised but its size lies beyond `data`.
+    """
+    if data.startswith(b"\x89PNG\r\n\x1a\n"):
+        if len(data) >= 24 and data[12:16] == b"IHDR":
+            width, height = struct.unpack(">II", data[16:24])
+            return "image/png", width, height
+        return "image/png", None, None
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        if len(data) >= 10:
+            width, height = struct.unpack("<HH", data[6:10])
+            return "image/gif", width, height
+        return "image/gif", None, None
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        chunk = data[12:16]
+        if chunk == b"VP8 " and len(data) >= 30:
+            width, height = struct.unpack("<HH", data[26:30])
+            return "image/webp", width & 0x3FFF, height & 0x3FFF
+        if chunk == b"VP8L" and len(data) >= 25:
+            b0, b1, b2, b3 = data[21:25]
+            return "image/webp", 1 + (b0 | (b1 & 0x3F) << 8), 1 + (b1 >> 6 | b2 << 2 | (b3 & 0x0F) << 10)
+        if chunk == b"VP8X" and len(data) >= 30:
+            return ("image/webp", 1 + int.from_bytes(data[24:27], "little"),
+                    1 + int.from_bytes(data[27:30], "little"))
+        return "image/webp", None, None
+    if data[:2] == b"\xff\xd8":
+        # Walk the marker segments up to the first start-of-frame.
+        pos = 2
+        while pos + 9 <= len(data):
+            if data[pos] != 0xFF:
+                return "image/jpeg", None, None
+            marker = data[pos + 1]
+            if marker == 0xFF:
+                pos += 1
+                continue
+            if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+                height, width = struct.unpack(">HH", data[pos + 5:pos + 9])
+                return "image/jpeg", width, height
+            pos += 2 + struct.unpack(">H", data[pos + 2:pos + 4])[0]
+        return "image/jpeg", None, None
+    return None
+
+
+class ImageCache:
+    """Verified image bytes on local disk, shared by the workers of one host.
+
+    Entries are keyed by URL and expire IMAGE_CACHE_TTL after they were
+    written; the oldest go first when the directory exceeds its byte budget.
+    """
+
+    def __init__(self, directory: str = IMAGE_CACHE_DIR, ttl: float = IMAGE_CACHE_TTL,
+                 max_bytes: int = IMAGE_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def _path(self, url: str) -> str:
+        return os.path.join(self.directory, hashlib.sha256(url.encode()).hexdigest())
+
+    def open(self, url: str) -> Optional[Tuple[str, int, BinaryIO]]:
+        """(content type, body size, file positioned at the body) of a fresh entry; the caller closes the file."""
+        try:
+            f = open(self._path(url), "rb")
+        except OSError:
+            return None
+        try:
+            stat = os.fstat(f.fileno())
+            header = f.readline()
+        except OSError:
+            f.close()
+            return None
+        if time.time() - stat.st_mtime > self.ttl or not header.endswith(b"\n"):
+            f.close()
+            return None
+        return header.decode().strip(), stat.st_size - len(header), f
+
+    def create(self, url: str, content_type: str) -> "PendingImage":
+        # Created on first write, so importing this module touches no disk.
+        os.makedirs(self.directory, exist_ok=True)
+        return PendingImage(self, url, content_type)
+
+    def put(self, url: str, content_type: str, data: bytes) -> None:
+        pending = self.create(url, content_type)
+        try:
+            pending.write(data)
+        except BaseException:
+            pending.discard()
+            raise
+        pending.commit()
+
+    def _prune(self) -> None:
+        with self._lock:
+            entries = []
+            for entry in os.scandir(self.directory):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+            entries.sort()
+            total = sum(size for _, size, _ in entries)
+            cutoff = time.time() - self.ttl
+            for mtime, size, path in entries:
+                if mtime >= cutoff and total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                total -= size
+
+
+class PendingImage:
+    """A cache entry being written chunk by chunk; readers see nothing until `commit`."""
+
+    def __init__(self, cache: ImageCache, url: str, content_type: str):
+        self._cache = cache
+        self._path = cache._path(url)
+        # Write then rename, so a reader in another worker never sees a partial file.
+        fd, self._tmp = tempfile.mkstemp(dir=cache.directory, suffix=".tmp")
+        self._file = os.fdopen(fd, "wb")
+        self._file.write(content_type.encode() + b"\n")
+
+    def write(self, chunk: bytes) -> None:
+        self._file.write(chunk)
+
+    def commit(self) -> None:
+        self._file.close()
+        os.replace(self._tmp, self._path)
+        self._cache._prune()
+
+    def discard(self) -> None:
+        self._file.close()
+        try:
+            os.remove(self._tmp)
+        except OSError:
+            pass
+
+
+class CachedImageStream(httpx.AsyncByteStream):
+    """Body of a cache hit, read from its file one chunk at a time."""
+
+    def __init__(self, file: BinaryIO):
+        self._file = file
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        while True:
+            chunk = await asyncio.to_thread(self._file.read, IMAGE_CHUNK_BYTES)
+            if not chunk:
+                break
+            yield chunk
+
+    async def aclose(self) -> None:
+        self._file.close()
+
+
+@functools.lru_cache(maxsize=None)
+def get_image_cache() -> ImageCache:
+    return ImageCache()
+
+
+async def open_image_source(image_url: str, max_bytes: int) -> httpx.Response:
+    """Start downloading `image_url` and validate its headers before any body is read.
+
+    Images verified by `prefetch_image` are served from the local cache instead.
+    The returned response must be released with `http_client.close_stream`.
+    """
+    cached = await asyncio.to_thread(get_image_cache().open, image_url)
+    if cached is not None:
+        content_type, size, f = cached
+        if size <= max_bytes:
+            record_cache_lookup("image", "hit")
+            return httpx.Response(200, headers={"content-type": content_type, "content-length": str(size)},
+                                  stream=CachedImageStream(f), request=httpx.Request("GET", image_url),
+                                  extensions={"cached": True})
+        f.close()
+    record_cache_lookup("image", "miss")
+    source = await http_client.open_stream("GET", image_url, upstream="image_source", operation="download")
+    try:
+        if source.status_code != 200:
+            raise ImageTransferError(f"image source returned {source.status_code}")
+        content_type = source.headers.get("content-type", "").split(";")[0].strip().lower()
+        if content_type not in IMAGE_CONTENT_TYPES:
+            raise ImageTransferError(f"unsupported image content type {content_type!r}")
+        length = source.headers.get("content-length")
+        if length is not None and int(length) > max_bytes:
+            raise ImageTransferError(f"image is {length} bytes, limit is {max_bytes}")
+    except BaseException:
+        await http_client.close_stream(source)
+        raise
+    return source
+
+
+def source_length(source: httpx.Response) -> int:
+    """Body size announced by the source, or -1 when unknown.
+
+    aiter_bytes decodes any content-encoding, so the header only holds for identity bodies.
+    """
+    if "content-length" in source.headers and "content-encoding" not in source.headers:
+        return int(source.headers["content-length"])
+    return -1
+
+
+async def relay_chunks(source: httpx.Response, max_bytes: int) -> AsyncIterator[bytes]:
+    # Only one chunk is held at a time; the consumer pulls the next one as it sends.
+    sent = 0
+    origin = "image_cache" if source.extensions.get("cached") else "image_source"
+    async for chunk in source.aiter_bytes(IMAGE_CHUNK_BYTES):
+        sent += len(chunk)
+        record_bytes(origin, "in", len(chunk))
+        if sent > max_bytes:
+            raise ImageTransferError(f"image exceeds {max_bytes} bytes")
+        yield chunk
+
+
+def _total_size(source: httpx.Response) -> Optional[int]:
+    if source.status_code == 206:
+        total = source.headers.get("content-range", "").rpartition("/")[2]
+        return int(total) if total.isdigit() else None
+    length = source_length(source)
+    return length if length >= 0 else None
+
+
+async def probe_image(url: str, max_bytes: int) -> Optional[ImageInfo]:
+    """Fetch the first IMAGE_PROBE_BYTES of `url` and check it is a usable image.
+
+    Returns None for dead links, non-images and images over `max_bytes`. A
+    body that fits in the probe is cached whole, so it is never fetched again.
+    """
+    try:
+        source = await http_client.open_stream(
+            "GET", url, upstream="image_source", operation="probe",
+            headers={"Range": f"bytes=0-{IMAGE_PROBE_BYTES - 1}"}, timeout=IMAGE_PROBE_TIMEOUT,
+        )
+    except (httpx.HTTPError, ValueError) as e:
+        logger.debug("image probe failed", extra={"url": url, "error": str(e)})
+        return None
+    try:
+        if source.status_code not in (200, 206):
+            logger.debug("image probe rejected", extra={"url": url, "status": source.status_code})
+            return None
+        content_type = source.headers.get("content-type", "").split(";")[0].strip().lower()
+        total = _total_size(source)
+        if content_type not in IMAGE_CONTENT_TYPES or (total is not None and total > max_bytes):
+            logger.debug("image probe rejected", extra={"url": url, "content_type": content_type, "size": total})
+            return None
+        head = bytearray()
+        complete = True
+        # Hosts that ignore Range send the whole image; stop reading once the probe has enough.
+        async for chunk in source.aiter_bytes(IMAGE_CHUNK_BYTES):
+            head += chunk
+            record_bytes("image_source", "in", len(chunk))
+            if len(head) >= IMAGE_PROBE_BYTES:
+                complete = total is not None and len(head) >= total
+                break
+    except httpx.HTTPError as e:
+        logger.debug("image probe failed", extra={"url": url, "error": str(e)})
+        return None
+    finally:
+        await http_client.close_stream(source)
+
+    header = parse_image_header(bytes(head))
+    if header is None or header[0] != content_type:
+        logger.debug("image probe rejected", extra={"url": url, "reason": "body is not the announced image type"})
+        return None
+    if complete and (total is None or len(head) == total):
+        await asyncio.to_thread(get_image_cache().put, url, content_type, bytes(head))
+        total = len(head)
+    return ImageInfo(url, content_type, total, header[1], header[2])
+
+
+def _rank_key(info: ImageInfo, position: int) -> tuple:
+    if not info.width or not info.height:
+        return (2, 0.0, 0, position)
+    # Distance from the preferred shape on a log scale, so 2:1 and 1:2 are not alike.
+    aspect_error = round(abs(math.log(info.width / info.height / IMAGE_TARGET_ASPECT)), 1)
+    return (int(info.width < IMAGE_MIN_WIDTH), aspect_error, -info.width * info.height, position)
+
+
+async def verify_image_candidates(urls: Sequence[str], max_bytes: int) -> List[str]:
+    """Probe `urls` concurrently and return the usable ones, best first.
+
+    Images of at least IMAGE_MIN_WIDTH rank above smaller ones, then by how
+    close they are to IMAGE_TARGET_ASPECT, then by resolution. Images whose
+    size could not be read come last; search order breaks ties.
+    """
+    probes = await asyncio.gather(*(probe_image(url, max_bytes) for url in urls))
+    usable = [(info, position) for position, info in enumerate(probes) if info is not None]
+    usable.sort(key=lambda item: _rank_key(*item))
+    return [info.url for info, _ in usable]
+
+
+async def prefetch_image(url: str, max_bytes: int) -> bool:
+    """Download and verify `url` into the local cache so publishing can upload it without a second download.
+
+    The body is written to the cache file as it arrives; only one chunk is held in memory.
+    """
+    try:
+        source = await open_image_source(url, max_bytes)
+    except (ImageTransferError, httpx.HTTPError, ValueError) as e:
+        logger.info("image prefetch rejected", extra={"url": url, "error": str(e)})
+        return False
+    if source.extensions.get("cached"):
+        await http_client.close_stream(source)
+        return True
+    content_type = source.headers.get("content-type", "").split(";")[0].strip().lower()
+    pending = None
+    committed = False
+    try:
+        pending = await asyncio.to_thread(get_image_cache().create, url, content_type)
+        head = b""
+        async for chunk in relay_chunks(source, max_bytes):
+            if not head:
+                head = chunk[:64]
+            await asyncio.to_thread(pending.write, chunk)
+        if parse_image_header(head) is None:
+            logger.info("image prefetch rejected", extra={"url": url, "error": "body is not an image"})
+            return False
+        await asyncio.to_thread(pending.commit)
+        committed = True
+    except (ImageTransferError, httpx.HTTPError, OSError) as e:
+        logger.info("image prefetch failed", extra={"url": url, "error": str(e)})
+        return False
+    finally:
+        await http_client.close_stream(source)
+        if pending is not None and not committed:
+            await asyncio.to_thread(pending.discard)
+    return True
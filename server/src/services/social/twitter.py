@@ -1,9 +1,251 @@
-def upload_to_twitter(content: str, image_url: str):
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import time
+from typing import AsyncIterator, List, Optional, Tuple
+
+import httpx
+
+from src.services import http_client
+from src.services.cache import TTLCache
+from src.services.social import media
+from src.services.social.errors import PublishError, is_transient, retry_after_seconds, was_not_processed
+from src.services.social.media import ImageTransferError, relay_chunks, source_length
+
+TWITTER_API_BASE = os.getenv("TWITTER_API_BASE", "https://api.x.com").rstrip("/")
+TWITTER_WEB_BASE = os.getenv("TWITTER_WEB_BASE", "https://x.com").rstrip("/")
+# Used when a session does not bring its own user token (single-account deployments).
+TWITTER_ACCESS_TOKEN = os.getenv("TWITTER_ACCESS_TOKEN")
+TWITTER_MAX_CHARS = int(os.getenv("TWITTER_MAX_CHARS", "280"))
+TWITTER_IMAGE_MAX_BYTES = int(os.getenv("TWITTER_IMAGE_MAX_BYTES", str(5 * 1024 * 1024)))
+TWITTER_MEDIA_SEGMENT_BYTES = int(os.getenv("TWITTER_MEDIA_SEGMENT_BYTES", str(1024 * 1024)))
+TWITTER_MEDIA_STATUS_POLLS = int(os.getenv("TWITTER_MEDIA_STATUS_POLLS", "10"))
+# Longest rate-limit wait taken in-process to finish a thread that is already partly posted.
+TWITTER_THREAD_MAX_WAIT = float(os.getenv("TWITTER_THREAD_MAX_WAIT", "60"))
+
+_SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+|\n+")
+
+logger = logging.getLogger(__name__)
+
+# (token hash, operation) -> unix time the exhausted rate-limit window resets
+_exhausted = TTLCache(max_entries=10_000)
+
+
+def split_thread(text: str, limit: int = TWITTER_MAX_CHARS) -> List[str]:
+    """Split a draft into tweets of at most `limit` characters, numbered "i/n" when more than one.
+
+    Breaks at sentence ends, then words. Length is counted in characters, so
+    links (weighted as 23 by X) and wide scripts are approximate.
     """
-    Uploads a post to Twitter with the given content and image URL.
-    Replace this template with actual Twitter API integration.
-    Returns (success: bool, post_url: str|None)
+    text = text.strip()
+    if len(text) <= limit:
+        return [text]
+    budget = limit - len(" 99/99")
+    parts: List[str] = []
+    current = ""
+    for sentence in filter(None, (s.strip() for s in _SENTENCE_BREAK.split(text))):
+        words = sentence.split() if len(sentence) > budget else [sentence]
+        for word in words:
+            while len(word) > budget:
+                if current:
+                    parts.append(current)
+                    current = ""
+                parts.append(word[:budget])
+                word = word[budget:]
+            candidate = f"{current} {word}" if current else word
+            if len(candidate) <= budget:
+                current = candidate
+            else:
+                parts.append(current)
+                current = word
+    if current:
+        parts.append(current)
+    return [f"{part} {i}/{len(parts)}" for i, part in enumerate(parts, 1)]
+
+
+def _auth(access_token: str) -> dict:
+    return {"Authorization": f"Bearer {access_token}"}
+
+
+def _limit_key(access_token: str, operation: str) -> str:
+    return f"{hashlib.sha256(access_token.encode()).hexdigest()}:{operation}"
+
+
+def _note_rate_limit(access_token: str, operation: str, resp: httpx.Response) -> None:
+    """Remember windows the x-rate-limit-* headers report as used up."""
+    remaining = resp.headers.get("x-rate-limit-remaining")
+    reset = resp.headers.get("x-rate-limit-reset")
+    if remaining == "0" and reset:
+        ttl = float(reset) - time.time()
+        if ttl > 0:
+            _exhausted.set(_limit_key(access_token, operation), float(reset), ttl=ttl)
+
+
+def rate_limit_wait(access_token: str, operation: str) -> float:
+    reset = _exhausted.get(_limit_key(access_token, operation))
+    return max(0.0, reset - time.time()) if reset else 0.0
+
+
+def _retry_after(resp: httpx.Response) -> Optional[float]:
+    after = retry_after_seconds(resp.headers)
+    reset = resp.headers.get("x-rate-limit-reset")
+    if after is None and reset:
+        after = max(0.0, float(reset) - time.time())
+    return after
+
+
+async def _media_request(access_token: str, operation: str, **kwargs) -> httpx.Response:
+    resp = await http_client.request(kwargs.pop("method", "POST"), f"{TWITTER_API_BASE}/2/media/upload",
+                                     headers=_auth(access_token), upstream="twitter", operation=operation, **kwargs)
+    _note_rate_limit(access_token, "media", resp)
+    # Nothing is visible until the tweet exists, so every media step is safe to repeat.
+    if is_transient(resp.status_code):
+        raise PublishError(f"twitter media {operation} returned {resp.status_code}", retryable=True,
+                           retry_after=_retry_after(resp))
+    if resp.status_code not in (200, 201, 202, 204):
+        raise PublishError(f"twitter media {operation} returned {resp.status_code}")
+    return resp
+
+
+def _media_data(resp: httpx.Response) -> dict:
+    body = resp.json()
+    return body.get("data", body)
+
+
+async def _segments(source: httpx.Response) -> AsyncIterator[bytes]:
+    """Re-chunk the image stream into APPEND segments; at most one segment is held."""
+    pending = bytearray()
+    async for chunk in relay_chunks(source, TWITTER_IMAGE_MAX_BYTES):
+        pending += chunk
+        while len(pending) >= TWITTER_MEDIA_SEGMENT_BYTES:
+            yield bytes(pending[:TWITTER_MEDIA_SEGMENT_BYTES])
+            del pending[:TWITTER_MEDIA_SEGMENT_BYTES]
+    if pending:
+        yield bytes(pending)
+
+
+async def upload_media(access_token: str, source: httpx.Response) -> str:
+    """Chunked INIT / APPEND / FINALIZE upload of an opened image source; always closes the source."""
+    try:
+        content_type = source.headers.get("content-type", "").split(";")[0].strip().lower()
+        total = source_length(source)
+        segments: AsyncIterator[bytes] = _segments(source)
+        if total < 0:
+            # INIT needs the size up front; without a usable length, read the (bounded) image first.
+            body = b"".join([segment async for segment in segments])
+            total = len(body)
+
+            async def buffered() -> AsyncIterator[bytes]:
+                for start in range(0, total, TWITTER_MEDIA_SEGMENT_BYTES):
+                    yield body[start:start + TWITTER_MEDIA_SEGMENT_BYTES]
+            segments = buffered()
+
+        init = await _media_request(access_token, "media_init", data={
+            "command": "INIT", "total_bytes": str(total), "media_type": content_type, "media_category": "tweet_image",
+        })
+        media_id = str(_media_data(init).get("id") or _media_data(init)["media_id_string"])
+        index = 0
+        async for segment in segments:
+            await _media_request(access_token, "media_append", data={
+                "command": "APPEND", "media_id": media_id, "segment_index": str(index),
+            }, files={"media": ("media", segment, "application/octet-stream")})
+            index += 1
+    finally:
+        await http_client.close_stream(source)
+
+    info = _media_data(await _media_request(access_token, "media_finalize", data={
+        "command": "FINALIZE", "media_id": media_id,
+    })).get("processing_info")
+    for _ in range(TWITTER_MEDIA_STATUS_POLLS):
+        if not info or info.get("state") == "succeeded":
+            return media_id
+        if info.get("state") == "failed":
+            raise PublishError(f"twitter media processing failed: {info.get('error')}")
+        await asyncio.sleep(info.get("check_after_secs", 1))
+        info = _media_data(await _media_request(access_token, "media_status", method="GET", params={
+            "command": "STATUS", "media_id": media_id,
+        })).get("processing_info")
+    if info and info.get("state") != "succeeded":
+        raise PublishError("twitter media still processing", retryable=True)
+    return media_id
+
+
+async def create_tweet(access_token: str, text: str, media_id: Optional[str] = None,
+                       reply_to: Optional[str] = None) -> str:
+    body: dict = {"text": text}
+    if media_id:
+        body["media"] = {"media_ids": [media_id]}
+    if reply_to:
+        body["reply"] = {"in_reply_to_tweet_id": reply_to}
+    try:
+        resp = await http_client.request("POST", f"{TWITTER_API_BASE}/2/tweets", headers=_auth(access_token),
+                                         json=body, upstream="twitter", operation="create_tweet")
+    except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout):
+        raise  # never reached X, safe to retry
+    except httpx.TransportError as e:
+        # The tweet may or may not exist now; retrying could post it twice.
+        raise PublishError(f"twitter create_tweet outcome unknown: {e}", outcome_unknown=True) from e
+    _note_rate_limit(access_token, "tweets", resp)
+    if was_not_processed(resp.status_code):
+        raise PublishError(f"twitter create_tweet returned {resp.status_code}", retryable=True,
+                           retry_after=_retry_after(resp))
+    if resp.status_code >= 500:
+        # The server failed while handling the tweet, which may have been created first.
+        raise PublishError(f"twitter create_tweet outcome unknown: returned {resp.status_code}",
+                           outcome_unknown=True)
+    if resp.status_code not in (200, 201):
+        raise PublishError(f"twitter create_tweet returned {resp.status_code}: {resp.text[:200]}")
+    return resp.json()["data"]["id"]
+
+
+async def _reply_in_thread(access_token: str, text: str, reply_to: str, first_url: str) -> str:
+    # Earlier tweets are already public, so a failure here cannot be retried from the start.
+    for _ in range(3):
+        try:
+            return await create_tweet(access_token, text, reply_to=reply_to)
+        except PublishError as e:
+            wait = e.retry_after if e.retry_after is not None else 1.0
+            if not e.retryable or wait > TWITTER_THREAD_MAX_WAIT:
+                raise PublishError(f"thread partially posted at {first_url}: {e}", outcome_unknown=True) from e
+            await asyncio.sleep(wait)
+    raise PublishError(f"thread partially posted at {first_url}: rate limited", outcome_unknown=True)
+
+
+async def upload_to_twitter(content: str, image_url: Optional[str] = None,
+                            access_token: Optional[str] = None) -> Tuple[bool, Optional[str]]:
+    """Publish `content` (as a thread when too long) with an optional image on the first tweet.
+
+    Returns (success, url of the first tweet). Rate limits and transient
+    failures before anything is public raise a retryable PublishError.
     """
-    # TODO: Implement Twitter API upload logic here
-    print(f"Uploading to Twitter: {content}, {image_url}")
-    return True, "https://twitter.com/your_post_url" 
\ No newline at end of file
+    access_token = access_token or TWITTER_ACCESS_TOKEN
+    if not access_token:
+        logger.warning("twitter upload without access token")
+        return False, None
+    wait = rate_limit_wait(access_token, "tweets")
+    if wait > 0:
+        raise PublishError("twitter tweet rate limit exhausted", retryable=True, retry_after=wait)
+
+    media_id = None
+    if image_url:
+        try:
+            source = await media.open_image_source(image_url, TWITTER_IMAGE_MAX_BYTES)
+        except (ImageTransferError, httpx.HTTPError, ValueError) as e:
+            logger.warning("image source rejected", extra={"error": str(e)})
+            return False, None
+        try:
+            media_id = await upload_media(access_token, source)
+        except ImageTransferError as e:
+            logger.warning("image transfer failed", extra={"error": str(e)})
+            return False, None
+
+    parts = split_thread(content)
+    first_id = await create_tweet(access_token, parts[0], media_id=media_id)
+    first_url = f"{TWITTER_WEB_BASE}/i/web/status/{first_id}"
+    previous = first_id
+    for part in parts[1:]:
+        previous = await _reply_in_thread(access_token, part, previous, first_url)
+    logger.info("posted to twitter", extra={"tweets": len(parts), "with_image": media_id is not None})
+    return True, first_url
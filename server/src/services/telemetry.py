@@ -0,0 +1,245 @@
+"""Prometheus metrics and lightweight spans for graph nodes, LLM calls and upstreams.
+
+Everything is recorded in-process; `/metrics` renders the default registry.
+"""
+import contextvars
+import functools
+import inspect
+import logging
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import ChatGeneration, LLMResult
+from langchain_core.runnables import RunnableConfig
+from langgraph.errors import GraphBubbleUp
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+NODE_DURATION = Histogram(
+    "graph_node_duration_seconds", "Wall time of one graph node run.", ["node", "outcome"], buckets=LATENCY_BUCKETS
+)
+LLM_DURATION = Histogram(
+    "llm_call_duration_seconds", "Wall time of one chat model call.", ["node", "model"], buckets=LATENCY_BUCKETS
+)
+LLM_TOKENS = Counter("llm_tokens_total", "Tokens consumed by chat model calls.", ["node", "model", "kind"])
+UPSTREAM_DURATION = Histogram(
+    "upstream_request_duration_seconds",
+    "Wall time of one call to an external service.",
+    ["upstream", "operation", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+UPSTREAM_BYTES = Counter(
+    "upstream_bytes_total", "Payload bytes exchanged with external services.", ["upstream", "direction"]
+)
+UPSTREAM_RETRIES = Counter("upstream_retries_total", "Retried calls to external services.", ["upstream", "operation"])
+CACHE_LOOKUPS = Counter("cache_lookups_total", "Result cache lookups by outcome.", ["cache", "result"])
+CIRCUIT_STATE = Gauge("upstream_circuit_state", "Circuit breaker state: 0 closed, 1 half open, 2 open.", ["upstream"])
+RESILIENCE_EVENTS = Counter(
+    "upstream_resilience_events_total", "Timeouts, rejections, fallbacks and hedged calls by upstream.",
+    ["upstream", "event"],
+)
+_CIRCUIT_STATE_VALUES = {"closed": 0, "half_open": 1, "open": 2}
+ADMISSION_DECISIONS = Counter(
+    "admission_decisions_total", "Graph runs admitted, queued, deferred by a batch, abandoned while queued or shed.", ["outcome"]
+)
+ADMISSION_RUNS = Gauge("admission_runs", "Graph runs holding or waiting for an admission slot.", ["state"])
+ADMISSION_WAIT = Histogram(
+    "admission_wait_seconds", "Time a graph run waited for an admission slot.", buckets=LATENCY_BUCKETS
+)
+
+# Name of the graph node whose code is currently running, for attributing LLM calls.
+current_node: contextvars.ContextVar[str] = contextvars.ContextVar("current_node", default="none")
+
+
+class Span:
+    """Attributes of one upstream call, filled in by the caller inside `upstream_span`."""
+
+    __slots__ = ("upstream", "operation", "status", "bytes_in", "bytes_out", "retries", "cache_hit", "error")
+
+    def __init__(self, upstream: str, operation: str):
+        self.upstream = upstream
+        self.operation = operation
+        self.status: Optional[int] = None
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.retries = 0
+        self.cache_hit: Optional[bool] = None
+        self.error: Optional[str] = None
+
+    def outcome(self) -> str:
+        if self.error is not None or (self.status is not None and self.status >= 400):
+            return "error"
+        return "ok"
+
+
+@contextmanager
+def upstream_span(upstream: str, operation: str) -> Iterator[Span]:
+    """Time an external call and record its bytes, retries and outcome."""
+    span = Span(upstream, operation)
+    start = time.perf_counter()
+    try:
+        yield span
+    except BaseException as e:
+        span.error = type(e).__name__
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        UPSTREAM_DURATION.labels(upstream, operation, span.outcome()).observe(elapsed)
+        if span.bytes_in:
+            UPSTREAM_BYTES.labels(upstream, "in").inc(span.bytes_in)
+        if span.bytes_out:
+            UPSTREAM_BYTES.labels(upstream, "out").inc(span.bytes_out)
+        if span.retries:
+            UPSTREAM_RETRIES.labels(upstream, operation).inc(span.retries)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("upstream call", extra={
+                "upstream": upstream, "operation": operation, "status": span.status, "outcome": span.outcome(),
+                "duration_ms": round(elapsed * 1000, 1), "bytes_in": span.bytes_in, "bytes_out": span.bytes_out,
+                "retries": span.retries, "cache_hit": span.cache_hit, "node": current_node.get(),
+            })
+
+
+def record_bytes(upstream: str, direction: str, size: int) -> None:
+    UPSTREAM_BYTES.labels(upstream, direction).inc(size)
+
+
+def record_retry(upstream: str, operation: str) -> None:
+    UPSTREAM_RETRIES.labels(upstream, operation).inc()
+
+
+def record_cache_lookup(cache: str, result: str) -> None:
+    CACHE_LOOKUPS.labels(cache, result).inc()
+
+
+def record_admission(outcome: str) -> None:
+    ADMISSION_DECISIONS.labels(outcome).inc()
+
+
+def record_admission_load(running: int, queued: int) -> None:
+    ADMISSION_RUNS.labels("running").set(running)
+    ADMISSION_RUNS.labels("queued").set(queued)
+
+
+def record_admission_wait(seconds: float) -> None:
+    ADMISSION_WAIT.observe(seconds)
+
+
+def record_circuit_state(upstream: str, state: str) -> None:
+    CIRCUIT_STATE.labels(upstream).set(_CIRCUIT_STATE_VALUES[state])
+
+
+def record_resilience_event(upstream: str, event: str) -> None:
+    RESILIENCE_EVENTS.labels(upstream, event).inc()
+
+
+def _finish_node(name: str, start: float, outcome: str) -> None:
+    elapsed = time.perf_counter() - start
+    NODE_DURATION.labels(name, outcome).observe(elapsed)
+    logger.info("node finished", extra={"node": name, "outcome": outcome, "duration_ms": round(elapsed * 1000, 1)})
+
+
+def traced_node(name: str, node: Any) -> Callable:
+    """Wrap a graph node (function or runnable) so every run is timed and attributed.
+
+    Interrupts are recorded with outcome "interrupted"; the resumed run is a new sample.
+    """
+    if hasattr(node, "ainvoke"):
+        async def run_runnable(state: Any, config: RunnableConfig) -> Any:
+            token = current_node.set(name)
+            start = time.perf_counter()
+            outcome = "error"
+            try:
+                result = await node.ainvoke(state, config)
+                outcome = "ok"
+                return result
+            except GraphBubbleUp:
+                outcome = "interrupted"
+                raise
+            finally:
+                _finish_node(name, start, outcome)
+                current_node.reset(token)
+        return run_runnable
+
+    if inspect.iscoroutinefunction(node):
+        @functools.wraps(node)
+        async def run_async(state: Any) -> Any:
+            token = current_node.set(name)
+            start = time.perf_counter()
+            outcome = "error"
+            try:
+                result = await node(state)
+                outcome = "ok"
+                return result
+            except GraphBubbleUp:
+                outcome = "interrupted"
+                raise
+            finally:
+                _finish_node(name, start, outcome)
+                current_node.reset(token)
+        return run_async
+
+    # Sync nodes stay sync so LangGraph keeps running them off the event loop.
+    @functools.wraps(node)
+    def run_sync(state: Any) -> Any:
+        token = current_node.set(name)
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            result = node(state)
+            outcome = "ok"
+            return result
+        except GraphBubbleUp:
+            outcome = "interrupted"
+            raise
+        finally:
+            _finish_node(name, start, outcome)
+            current_node.reset(token)
+    return run_sync
+
+
+class LLMUsageHandler(BaseCallbackHandler):
+    """Callback recording latency and token usage of every chat model call."""
+
+    # Cheap enough to run on the calling thread instead of an executor.
+    run_inline = True
+
+    def __init__(self) -> None:
+        self._started: Dict[UUID, tuple] = {}
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        params = kwargs.get("invocation_params") or {}
+        model = params.get("model_name") or params.get("model") or "unknown"
+        self._started[run_id] = (time.perf_counter(), current_node.get(), model)
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        started = self._started.pop(run_id, None)
+        if started is None:
+            return
+        start, node, model = started
+        LLM_DURATION.labels(node, model).observe(time.perf_counter() - start)
+        prompt_tokens = completion_tokens = 0
+        for generations in response.generations:
+            # With n > 1 every choice carries the usage of the whole request.
+            generation = generations[0] if generations else None
+            usage = getattr(generation.message, "usage_metadata", None) if isinstance(generation, ChatGeneration) else None
+            if usage:
+                prompt_tokens += usage.get("input_tokens", 0)
+                completion_tokens += usage.get("output_tokens", 0)
+        if prompt_tokens:
+            LLM_TOKENS.labels(node, model, "prompt").inc(prompt_tokens)
+        if completion_tokens:
+            LLM_TOKENS.labels(node, model, "completion").inc(completion_tokens)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._started.pop(run_id, None)
+
+
+def render_metrics() -> tuple:
+    """Current metrics in the Prometheus text exposition format, with its content type."""
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,9 @@
+import os
+import tempfile
+
+# Module-level stores open their SQLite files on import; keep them out of the working tree.
+_STATE_DIR = tempfile.mkdtemp(prefix="social-agent-tests-")
+for _name in ("CHECKPOINT_DB_PATH", "SESSION_DB_PATH", "PUBLISH_QUEUE_DB_PATH", "BLOB_STORE_PATH",
+              "RESULT_CACHE_PATH"):
+    os.environ.setdefault(_name, os.path.join(_STATE_DIR, f"{_name.lower()}.sqlite3"))
+os.environ.setdefault("IMAGE_CACHE_DIR", os.path.join(_STATE_DIR, "images"))
@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+from starlette.requests import Request
+
+from src.api import admission as adm
+
+
+def request(headers=None, host="10.0.0.1"):
+    raw = [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()]
+    return Request({"type": "http", "headers": raw, "client": (host, 1234)})
+
+
+def test_user_header_is_ignored_unless_configured(monkeypatch):
+    monkeypatch.setattr(adm, "ADMISSION_USER_HEADER", "")
+    assert adm.user_key(request({"X-User-Id": "alice"})) == "addr:10.0.0.1"
+
+
+def test_configured_user_header_is_honoured(monkeypatch):
+    monkeypatch.setattr(adm, "ADMISSION_USER_HEADER", "X-User-Id")
+    assert adm.user_key(request({"X-User-Id": "alice"})) == "user:alice"
+    assert adm.user_key(request()) == "addr:10.0.0.1"
+
+
+def test_queued_runs_are_served_round_robin_across_users():
+    async def scenario():
+        controller = adm.AdmissionController(max_running=1, max_queue=100, max_wait=1e6, user_rate=0)
+        first = controller.enqueue("a")
+        tickets = [controller.enqueue("a") for _ in range(3)] + [controller.enqueue("b"), controller.enqueue("c")]
+        assert first.granted.is_set() and controller.queued == 5
+        # Positions follow the rotation: a, b, c, a, a.
+        assert [controller.position(t) for t in tickets] == [1, 4, 5, 2, 3]
+        order = []
+        ticket = first
+        for _ in tickets:
+            controller.release(ticket)
+            ticket = next(t for t in tickets if t.granted.is_set() and not t.released)
+            order.append(ticket.user)
+        return order
+
+    assert asyncio.run(scenario()) == ["a", "b", "c", "a", "a"]
+
+
+def test_user_out_of_tokens_is_shed_with_retry_after():
+    controller = adm.AdmissionController(user_rate=0.5, user_burst=2)
+    controller.check("a")
+    controller.check("a")
+    with pytest.raises(adm.AdmissionRejected) as rejected:
+        controller.check("a")
+    assert rejected.value.retry_after == 2
+    controller.check("b")  # other users keep their own budget
+
+
+def test_overload_is_shed_and_refunded():
+    async def scenario():
+        controller = adm.AdmissionController(max_running=1, max_queue=2, max_wait=1e6, user_rate=1, user_burst=1)
+        controller.enqueue("a")
+        controller.enqueue("a")
+        controller.enqueue("a")
+        with pytest.raises(adm.AdmissionRejected):
+            controller.check("b")
+        # The shed request did not cost "b" its token.
+        assert controller._buckets["b"].tokens == 1
+
+    asyncio.run(scenario())
+
+
+def test_batch_items_wait_for_room_instead_of_overfilling_the_queue(monkeypatch):
+    monkeypatch.setattr(adm, "ADMISSION_UPDATE_INTERVAL", 0.01)
+
+    async def scenario():
+        controller = adm.AdmissionController(max_running=1, max_queue=1, max_wait=1e6, user_rate=0)
+        running = controller.enqueue("a")
+        controller.enqueue("a")
+        deferred = asyncio.create_task(controller.enqueue_when_room("batch"))
+        await asyncio.sleep(0.05)
+        assert not deferred.done() and controller.queued == 1
+        controller.release(running)
+        ticket = await asyncio.wait_for(deferred, 1)
+        assert controller.queued == 1 and not ticket.granted.is_set()
+
+    asyncio.run(scenario())
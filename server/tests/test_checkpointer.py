@@ -0,0 +1,71 @@
+import pytest
+from langgraph.checkpoint.base import empty_checkpoint
+
+from src.agents.graph.checkpointer import SqliteCheckpointer
+
+THREAD = {"configurable": {"thread_id": "t1", "checkpoint_ns": ""}}
+
+
+@pytest.fixture
+def saver(tmp_path):
+    return SqliteCheckpointer(str(tmp_path / "checkpoints.sqlite3"), keep_per_thread=2, flush_batch=1000)
+
+
+def put_step(saver, parent, values, versions, changed):
+    """Store one step where only the `changed` channels got new versions, as LangGraph does."""
+    checkpoint = empty_checkpoint()
+    checkpoint["channel_values"] = dict(values)
+    checkpoint["channel_versions"] = dict(versions)
+    config = parent or THREAD
+    return saver.put(config, checkpoint, {"step": len(versions)}, {c: versions[c] for c in changed})
+
+
+def count(saver, table):
+    return saver._conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def test_round_trip_restores_values_metadata_and_writes(saver):
+    config = put_step(saver, None, {"topic": "rust", "draft": "x" * 2000}, {"topic": "1", "draft": "1"},
+                      ["topic", "draft"])
+    saver.put_writes(config, [("draft", "pending")], task_id="task-1")
+
+    loaded = saver.get_tuple(THREAD)
+    assert loaded.config["configurable"]["checkpoint_id"] == config["configurable"]["checkpoint_id"]
+    assert loaded.checkpoint["channel_values"] == {"topic": "rust", "draft": "x" * 2000}
+    assert loaded.metadata == {"step": 2}
+    assert loaded.pending_writes == [("task-1", "draft", "pending")]
+
+
+def test_unchanged_channels_are_read_from_earlier_steps(saver):
+    first = put_step(saver, None, {"topic": "rust", "draft": "v1"}, {"topic": "1", "draft": "1"}, ["topic", "draft"])
+    put_step(saver, first, {"topic": "rust", "draft": "v2"}, {"topic": "1", "draft": "2"}, ["draft"])
+
+    assert saver.get_tuple(THREAD).checkpoint["channel_values"] == {"topic": "rust", "draft": "v2"}
+    assert count(saver, "channel_blobs") == 3  # topic once, draft twice
+
+
+def test_prune_keeps_newest_checkpoints_and_the_values_they_need(saver):
+    config = put_step(saver, None, {"topic": "rust", "draft": "v1"}, {"topic": "1", "draft": "1"}, ["topic", "draft"])
+    for version in range(2, 6):
+        config = put_step(saver, config, {"topic": "rust", "draft": f"v{version}"},
+                          {"topic": "1", "draft": str(version)}, ["draft"])
+    saver.put_writes(config, [("draft", "pending")], task_id="task-1")
+    saver.flush()
+
+    kept = list(saver.list(THREAD))
+    assert len(kept) == 2
+    assert [c.checkpoint["channel_values"]["draft"] for c in kept] == ["v5", "v4"]
+    # "topic" was only written by the first, pruned checkpoint, and is still needed.
+    assert all(c.checkpoint["channel_values"]["topic"] == "rust" for c in kept)
+    # draft v1..v3 were superseded before the oldest kept checkpoint.
+    assert count(saver, "channel_blobs") == 3
+    assert count(saver, "writes") == 1
+
+
+def test_delete_thread_removes_every_row(saver):
+    config = put_step(saver, None, {"topic": "rust"}, {"topic": "1"}, ["topic"])
+    saver.put_writes(config, [("topic", "pending")], task_id="task-1")
+    saver.flush()
+    saver.delete_thread("t1")
+    assert saver.get_tuple(THREAD) is None
+    assert (count(saver, "checkpoints"), count(saver, "writes"), count(saver, "channel_blobs")) == (0, 0, 0)
@@ -0,0 +1,37 @@
+import time
+
+import tiktoken
+
+from src.services.content import context_builder as cb
+
+
+class WordEncoding:
+    """Stands in for the cl100k vocabulary, which tiktoken downloads on first use."""
+
+    def encode(self, text, disallowed_special=()):
+        return text.split()
+
+    def decode(self, tokens):
+        return " ".join(tokens)
+
+
+def test_failed_tokenizer_load_is_retried(monkeypatch):
+    monkeypatch.setattr(cb, "_tokenizer", None)
+    monkeypatch.setattr(cb, "_tokenizer_retry_at", 0.0)
+    monkeypatch.setattr(cb, "TOKENIZER_RETRY_SECONDS", 0.0)
+
+    def offline(name):
+        raise OSError("vocabulary download failed")
+
+    monkeypatch.setattr(tiktoken, "get_encoding", offline)
+    assert not cb.load_tokenizer()
+    monkeypatch.setattr(tiktoken, "get_encoding", lambda name: WordEncoding())
+    assert cb.load_tokenizer()
+    assert cb.count_tokens("three short words") == 3
+
+
+def test_failed_tokenizer_load_backs_off_and_estimates(monkeypatch):
+    monkeypatch.setattr(cb, "_tokenizer", None)
+    monkeypatch.setattr(cb, "_tokenizer_retry_at", time.monotonic() + 60)
+    assert not cb.load_tokenizer()
+    assert cb.count_tokens("x" * 40) == 10
@@ -0,0 +1,44 @@
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from src.agents.nodes import GeneratePost
+from src.config.schema import AgentState
+from src.services import blob_store
+
+LOST = blob_store.REF_PREFIX + "0" * 64
+
+
+def state_with_research(content, query="rust"):
+    call = {"name": "tavily_search", "args": {"query": query}, "id": "call-1"}
+    return AgentState(topic="rust", platform="linkedin", messages=[
+        HumanMessage(content="Input: rust"),
+        AIMessage(content="", tool_calls=[call]),
+        ToolMessage(content=content, tool_call_id="call-1", name="tavily_search"),
+    ])
+
+
+def test_offloaded_research_is_resolved():
+    article = "Rust guarantees memory safety without a garbage collector. " * 40
+    ref = blob_store.offload(article)
+    assert blob_store.is_ref(ref)
+    assert GeneratePost.research_sources(state_with_research(ref)) == [article]
+
+
+def test_missing_research_blob_is_researched_again(monkeypatch):
+    searches = []
+
+    class Search:
+        def invoke(self, query):
+            searches.append(query)
+            return "Fresh research about rust."
+
+    monkeypatch.setattr(GeneratePost, "tavily_search", Search())
+    assert GeneratePost.research_sources(state_with_research(LOST)) == ["Fresh research about rust."]
+    assert searches == ["rust"]
+
+
+def test_missing_blob_without_a_query_is_an_error():
+    state = state_with_research(LOST)
+    state.messages[1].tool_calls[0]["args"] = {}
+    with pytest.raises(blob_store.BlobNotFound):
+        GeneratePost.research_context(state)
@@ -0,0 +1,31 @@
+import asyncio
+
+import pytest
+
+from src.services.cache import TTLCache, ResultCache
+from src.services.content import generation_cache as gc
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = ResultCache("generation-test", TTLCache(max_entries=100, default_ttl=60))
+    monkeypatch.setattr(gc, "generation_cache", cache)
+    monkeypatch.setattr(gc, "GENERATION_CACHE", "exact")
+    return cache
+
+
+def test_stored_drafts_are_found_for_the_same_prompt(cache):
+    async def scenario():
+        drafts, pending = await gc.find_drafts("linkedin", "research", "Rust", 2, "model")
+        assert drafts is None
+        await gc.store_drafts(pending, ["one", "two"])
+        hit, _ = await gc.find_drafts("linkedin", "research", "rust ", 2, "model")
+        other, _ = await gc.find_drafts("twitter", "research", "Rust", 2, "model")
+        return hit, other
+
+    assert asyncio.run(scenario()) == (["one", "two"], None)
+
+
+def test_cache_off_returns_no_handle(cache, monkeypatch):
+    monkeypatch.setattr(gc, "GENERATION_CACHE", "off")
+    assert asyncio.run(gc.find_drafts("linkedin", "research", "Rust", 1, "model")) == (None, None)
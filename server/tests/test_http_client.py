@@ -0,0 +1,27 @@
+import asyncio
+
+from src.services import http_client
+
+
+def test_host_limits_are_dropped_when_idle(monkeypatch):
+    monkeypatch.setattr(http_client, "HTTP_PER_HOST_LIMIT", 1)
+
+    async def scenario():
+        held = await http_client.acquire_host("https://img.example/a.png")
+        waiter = asyncio.create_task(http_client.acquire_host("https://IMG.example/b.png"))
+        await asyncio.sleep(0)
+        assert not waiter.done()  # same host, one slot
+        http_client.release_host(held)
+        http_client.release_host(await waiter)
+        assert "img.example" not in http_client._host_limits
+
+        # A cancelled waiter does not keep the host around either.
+        held = await http_client.acquire_host("https://other.example/")
+        waiter = asyncio.create_task(http_client.acquire_host("https://other.example/"))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        http_client.release_host(held)
+        assert http_client._host_limits == {}
+
+    asyncio.run(scenario())
@@ -0,0 +1,123 @@
+import asyncio
+import os
+import struct
+
+import httpx
+import pytest
+
+from src.services import http_client
+from src.services.social import media
+from src.services.social.media import ImageCache, ImageInfo, _rank_key, parse_image_header
+
+PNG = b"\x89PNG\r\n\x1a\n" + struct.pack(">I", 13) + b"IHDR" + struct.pack(">II", 1200, 627) + b"\x08\x02\x00\x00\x00"
+GIF = b"GIF89a" + struct.pack("<HH", 640, 480) + b"\x00" * 8
+# SOI, an APP0 segment to skip, then a baseline start-of-frame with height 300 and width 400.
+JPEG = (b"\xff\xd8" + b"\xff\xe0" + struct.pack(">H", 16) + b"JFIF\x00" + b"\x00" * 9
+        + b"\xff\xc0" + struct.pack(">HBHH", 17, 8, 300, 400) + b"\x03")
+WEBP_VP8X = b"RIFF" + b"\x00" * 4 + b"WEBPVP8X" + b"\x00" * 8 + (1919).to_bytes(3, "little") + (1079).to_bytes(3, "little")
+
+
+@pytest.mark.parametrize("data, expected", [
+    (PNG, ("image/png", 1200, 627)),
+    (GIF, ("image/gif", 640, 480)),
+    (JPEG, ("image/jpeg", 400, 300)),
+    (WEBP_VP8X, ("image/webp", 1920, 1080)),
+    (PNG[:12], ("image/png", None, None)),
+    (JPEG[:20], ("image/jpeg", None, None)),
+    (b"<html><body>not an image</body></html>", None),
+    (b"", None),
+])
+def test_parse_image_header(data, expected):
+    assert parse_image_header(data) == expected
+
+
+def test_rank_prefers_wide_images_close_to_the_target_shape():
+    candidates = [
+        ImageInfo("tiny", "image/png", 1000, 100, 50),
+        ImageInfo("square", "image/png", 1000, 600, 600),
+        ImageInfo("unmeasured", "image/jpeg", 1000, None, None),
+        ImageInfo("landscape", "image/png", 1000, 1200, 627),
+        ImageInfo("landscape-large", "image/png", 1000, 2400, 1254),
+    ]
+    ranked = sorted(enumerate(candidates), key=lambda item: _rank_key(item[1], item[0]))
+    assert [info.url for _, info in ranked] == ["landscape-large", "landscape", "square", "tiny", "unmeasured"]
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = ImageCache(str(tmp_path), ttl=60, max_bytes=10 * 1024 * 1024)
+    monkeypatch.setattr(media, "get_image_cache", lambda: cache)
+    monkeypatch.setattr(media, "IMAGE_CHUNK_BYTES", 1024)
+    return cache
+
+
+def test_cache_directory_is_created_on_first_write(tmp_path):
+    cache = ImageCache(str(tmp_path / "images"))
+    assert not os.path.exists(cache.directory)
+    assert cache.open("https://img/a.png") is None
+    cache.put("https://img/a.png", "image/png", PNG)
+    _, size, f = cache.open("https://img/a.png")
+    f.close()
+    assert size == len(PNG)
+
+
+def test_cache_entry_is_invisible_until_committed(cache):
+    pending = cache.create("https://img/a.png", "image/png")
+    pending.write(PNG)
+    assert cache.open("https://img/a.png") is None
+    pending.commit()
+    content_type, size, f = cache.open("https://img/a.png")
+    with f:
+        assert (content_type, size, f.read()) == ("image/png", len(PNG), PNG)
+
+    discarded = cache.create("https://img/b.png", "image/png")
+    discarded.write(PNG)
+    discarded.discard()
+    assert cache.open("https://img/b.png") is None
+    assert not [name for name in os.listdir(cache.directory) if name.endswith(".tmp")]
+
+
+def test_cache_hit_is_streamed_from_disk_in_chunks(cache):
+    body = PNG + os.urandom(10_000)
+    cache.put("https://img/big.png", "image/png", body)
+
+    async def relay():
+        source = await media.open_image_source("https://img/big.png", len(body))
+        try:
+            assert source.extensions.get("cached")
+            assert media.source_length(source) == len(body)
+            return [chunk async for chunk in media.relay_chunks(source, len(body))]
+        finally:
+            await http_client.close_stream(source)
+
+    chunks = asyncio.run(relay())
+    assert b"".join(chunks) == body
+    assert max(len(chunk) for chunk in chunks) == 1024
+
+
+def test_prefetch_streams_the_download_into_the_cache(cache, monkeypatch):
+    body = PNG + os.urandom(10_000)
+    downloads = []
+
+    async def open_stream(method, url, **kwargs):
+        downloads.append(url)
+        return httpx.Response(200, headers={"content-type": "image/png", "content-length": str(len(body))},
+                              content=body, request=httpx.Request(method, url))
+
+    monkeypatch.setattr(http_client, "open_stream", open_stream)
+    assert asyncio.run(media.prefetch_image("https://img/c.png", len(body)))
+    assert asyncio.run(media.prefetch_image("https://img/c.png", len(body)))
+    assert downloads == ["https://img/c.png"]
+    content_type, size, f = cache.open("https://img/c.png")
+    with f:
+        assert (content_type, f.read()) == ("image/png", body)
+
+
+def test_prefetch_discards_a_body_that_is_not_an_image(cache, monkeypatch):
+    async def open_stream(method, url, **kwargs):
+        return httpx.Response(200, headers={"content-type": "image/png"}, content=b"<html>moved</html>",
+                              request=httpx.Request(method, url))
+
+    monkeypatch.setattr(http_client, "open_stream", open_stream)
+    assert not asyncio.run(media.prefetch_image("https://img/d.png", 1 << 20))
+    assert os.listdir(cache.directory) == []
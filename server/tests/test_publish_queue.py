@@ -0,0 +1,194 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from src.services import http_client
+from src.services import publish_queue as pq
+from src.services.social import linkedin
+from src.services.social.errors import PublishError
+
+
+@pytest.fixture
+def queue(tmp_path):
+    q = pq.PublishQueue(str(tmp_path / "queue.sqlite3"))
+    # Rate limits are covered by their own buckets; here every job may run at once.
+    q.app_limits = pq.RateLimiter(1e6)
+    q.token_limits = pq.RateLimiter(1e6)
+    return q
+
+
+def publisher(*outcomes):
+    """A stand-in for PublishQueue._publish that returns or raises `outcomes` in order."""
+    calls = []
+
+    async def publish(platform, content, image_url, access_token):
+        outcome = outcomes[len(calls)]
+        calls.append(content)
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+
+    publish.calls = calls
+    return publish
+
+
+def run_next(queue):
+    job = queue._claim()
+    assert job is not None
+    asyncio.run(queue.run_job(job))
+    return job[0]
+
+
+def test_same_post_maps_to_one_job(queue):
+    first = queue.enqueue("linkedin", "hello", access_token="token")
+    again = queue.enqueue("linkedin", "hello", access_token="token")
+    other = queue.enqueue("linkedin", "hello, edited", access_token="token")
+    assert again["job_id"] == first["job_id"]
+    assert other["job_id"] != first["job_id"]
+
+
+def test_succeeded_job_is_not_run_again(queue):
+    queue._publish = publisher((True, "urn:li:share:1"))
+    job_id = queue.enqueue("linkedin", "hello", access_token="token")["job_id"]
+    run_next(queue)
+    assert queue.enqueue("linkedin", "hello", access_token="token")["status"] == pq.SUCCEEDED
+    assert queue._claim() is None
+    assert queue.get(job_id)["post_id"] == "urn:li:share:1"
+
+
+def test_failed_job_is_requeued_when_resubmitted(queue):
+    queue._publish = publisher(PublishError("rejected"))
+    job_id = queue.enqueue("linkedin", "hello", access_token="token")["job_id"]
+    run_next(queue)
+    assert queue.get(job_id)["status"] == pq.FAILED
+    again = queue.enqueue("linkedin", "hello", access_token="token")
+    assert (again["job_id"], again["status"], again["attempts"]) == (job_id, pq.QUEUED, 0)
+
+
+@pytest.mark.parametrize("error", [
+    PublishError("linkedin post outcome unknown: read timeout", outcome_unknown=True),
+    RuntimeError("crashed after sending"),
+])
+def test_unknown_outcome_is_never_requeued(queue, error):
+    queue._publish = publisher(error)
+    job_id = queue.enqueue("linkedin", "hello", access_token="token")["job_id"]
+    run_next(queue)
+    assert queue.get(job_id)["status"] == pq.UNKNOWN
+    assert queue.enqueue("linkedin", "hello", access_token="token")["status"] == pq.UNKNOWN
+    assert queue._claim() is None
+
+
+def test_retryable_error_schedules_a_retry(queue):
+    queue._publish = publisher(PublishError("503", retryable=True, retry_after=60))
+    job_id = queue.enqueue("twitter", "hello", access_token="token")["job_id"]
+    run_next(queue)
+    job = queue.get(job_id)
+    assert (job["status"], job["attempts"]) == (pq.RETRYING, 1)
+    assert job["run_at"] >= job["updated_at"] + 59
+    assert queue._claim() is None  # not due yet
+
+
+def test_expired_lease_is_marked_unknown_not_reclaimed(queue, monkeypatch):
+    monkeypatch.setattr(pq, "PUBLISH_LEASE_SECONDS", 0.0)
+    job_id = queue.enqueue("linkedin", "hello", access_token="token")["job_id"]
+    assert queue._claim()[0] == job_id  # the worker holding this lease dies
+    assert queue._claim() is None
+    assert queue.get(job_id)["status"] == pq.UNKNOWN
+
+
+def test_write_under_a_lost_lease_is_ignored(queue):
+    queue.enqueue("linkedin", "hello", access_token="token")
+    job_id, *_, lease_id = queue._claim()
+    assert queue._update(job_id, lease_id, last_error="still mine")
+    assert not queue._update(job_id, "someone-else", status=pq.SUCCEEDED)
+    assert queue.get(job_id)["status"] == pq.RUNNING
+
+
+def test_lease_is_renewed_while_publishing(queue, monkeypatch):
+    monkeypatch.setattr(pq, "PUBLISH_LEASE_SECONDS", 0.15)
+
+    async def slow_publish(platform, content, image_url, access_token):
+        await asyncio.sleep(0.5)
+        return True, "urn:li:share:1"
+
+    async def scenario():
+        queue._publish = slow_publish
+        job_id = queue.enqueue("linkedin", "hello", access_token="token")["job_id"]
+        running = asyncio.create_task(queue.run_job(queue._claim()))
+        await asyncio.sleep(0.3)  # two lease periods in
+        assert queue._claim() is None
+        assert queue.get(job_id)["status"] == pq.RUNNING
+        await running
+        return job_id
+
+    job_id = asyncio.run(scenario())
+    assert queue.get(job_id)["status"] == pq.SUCCEEDED
+
+
+def test_gateway_timeout_on_create_is_not_retried(queue, monkeypatch):
+    async def request(method, url, **kwargs):
+        return httpx.Response(504, request=httpx.Request(method, url))
+
+    monkeypatch.setattr(http_client, "request", request)
+
+    async def publish(platform, content, image_url, access_token):
+        return await linkedin.create_linkedin_post(access_token, "urn:li:person:1", content)
+
+    queue._publish = publish
+    job_id = queue.enqueue("linkedin", "hello", access_token="token")["job_id"]
+    run_next(queue)
+    assert queue.get(job_id)["status"] == pq.UNKNOWN
+    assert queue._claim() is None
+
+
+def slow_publisher(seconds):
+    async def publish(platform, content, image_url, access_token):
+        await asyncio.sleep(seconds)
+        return True, "urn:li:share:1"
+
+    return publish
+
+
+def run_then_stop(queue, grace, started=0.1):
+    async def scenario():
+        workers = asyncio.create_task(queue.run_workers(count=2))
+        await asyncio.sleep(started)
+        await queue.stop(grace)
+        await workers
+
+    asyncio.run(scenario())
+
+
+def test_stop_lets_a_running_job_finish_within_the_grace_period(queue):
+    queue._publish = slow_publisher(0.3)
+    job_id = queue.enqueue("linkedin", "hello", access_token="token")["job_id"]
+    later = queue.enqueue("linkedin", "queued after stop", access_token="token", publish_at=0)["job_id"]
+    queue._conn.execute("UPDATE publish_jobs SET run_at = ? WHERE job_id = ?", (time.time() + 0.2, later))
+    run_then_stop(queue, grace=5)
+    assert queue.get(job_id)["status"] == pq.SUCCEEDED
+    assert queue.get(later)["status"] == pq.QUEUED  # not claimed once stopping
+
+
+def test_stop_marks_a_publish_past_the_grace_period_unknown(queue):
+    queue._publish = slow_publisher(10)
+    job_id = queue.enqueue("linkedin", "hello", access_token="token")["job_id"]
+    run_then_stop(queue, grace=0.1)
+    job = queue.get(job_id)
+    assert (job["status"], job["last_error"]) == (pq.UNKNOWN, "publish interrupted by shutdown")
+    assert queue._conn.execute("SELECT lease_id FROM publish_jobs WHERE job_id = ?", (job_id,)).fetchone() == (None,)
+
+
+def test_cancelled_claim_puts_its_job_back(queue):
+    job_id = queue.enqueue("linkedin", "hello", access_token="token")["job_id"]
+
+    async def scenario():
+        claim = asyncio.create_task(queue._claim_next())
+        await asyncio.sleep(0)
+        claim.cancel()
+        await asyncio.gather(claim, return_exceptions=True)
+
+    asyncio.run(scenario())
+    assert queue.get(job_id)["status"] == pq.QUEUED
+    assert queue._claim()[0] == job_id
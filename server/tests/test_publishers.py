@@ -0,0 +1,47 @@
+import asyncio
+
+import httpx
+import pytest
+
+from src.services import http_client
+from src.services.social import linkedin, twitter
+from src.services.social.errors import PublishError
+
+
+@pytest.fixture
+def respond(monkeypatch):
+    calls = []
+
+    def set_status(status):
+        async def request(method, url, **kwargs):
+            calls.append(url)
+            return httpx.Response(status, json={}, request=httpx.Request(method, url))
+
+        monkeypatch.setattr(http_client, "request", request)
+        return calls
+
+    return set_status
+
+
+def create(platform):
+    if platform == "linkedin":
+        return linkedin.create_linkedin_post("token", "urn:li:person:1", "hello")
+    return twitter.create_tweet("token", "hello")
+
+
+@pytest.mark.parametrize("platform", ["linkedin", "twitter"])
+@pytest.mark.parametrize("status", [500, 502, 503, 504])
+def test_server_error_on_create_is_an_unknown_outcome(respond, platform, status):
+    calls = respond(status)
+    with pytest.raises(PublishError) as error:
+        asyncio.run(create(platform))
+    assert error.value.outcome_unknown and not error.value.retryable
+    assert len(calls) == 1
+
+
+@pytest.mark.parametrize("platform", ["linkedin", "twitter"])
+def test_rate_limit_on_create_is_retried(respond, platform):
+    respond(429)
+    with pytest.raises(PublishError) as error:
+        asyncio.run(create(platform))
+    assert error.value.retryable and not error.value.outcome_unknown
@@ -0,0 +1,31 @@
+import pytest
+from langgraph.checkpoint.base import empty_checkpoint
+from pydantic import HttpUrl, ValidationError
+
+from src.agents.graph.checkpointer import SqliteCheckpointer
+from src.config.schema import AgentState
+
+THREAD = {"configurable": {"thread_id": "t1", "checkpoint_ns": ""}}
+
+
+@pytest.mark.parametrize("value", ["https://example.com/post", HttpUrl("https://example.com/post")])
+def test_url_is_validated_and_stored_as_a_string(value):
+    state = AgentState(url=value, platform="linkedin")
+    assert state.url == "https://example.com/post"
+    assert type(state.url) is str
+
+
+def test_invalid_url_is_rejected():
+    with pytest.raises(ValidationError):
+        AgentState(url="not a url", platform="linkedin")
+
+
+def test_url_session_survives_a_checkpoint(tmp_path):
+    # Url objects in the channel values used to fail the first checkpoint write.
+    saver = SqliteCheckpointer(str(tmp_path / "checkpoints.sqlite3"))
+    state = AgentState(url="https://example.com/post", platform="linkedin")
+    checkpoint = empty_checkpoint()
+    checkpoint["channel_values"] = {"url": state.url}
+    checkpoint["channel_versions"] = {"url": "1"}
+    saver.put(THREAD, checkpoint, {}, {"url": "1"})
+    assert saver.get_tuple(THREAD).checkpoint["channel_values"]["url"] == "https://example.com/post"
@@ -0,0 +1,51 @@
+import asyncio
+
+import pytest
+
+from src.agents.graph.checkpointer import SqliteCheckpointer
+from src.api.sessions import MemorySessionStore, SessionRegistry, SqliteSessionStore
+from src.config.schema import AgentState
+
+
+@pytest.fixture(params=["sqlite", "memory"])
+def registry(request, tmp_path):
+    store = SqliteSessionStore(str(tmp_path / "sessions.sqlite3")) if request.param == "sqlite" else MemorySessionStore()
+    return SessionRegistry(store, SqliteCheckpointer(str(tmp_path / "checkpoints.sqlite3")), idle_ttl=60, max_sessions=2)
+
+
+def state(topic):
+    return AgentState(topic=topic, platform="linkedin")
+
+
+def test_creating_past_the_limit_evicts_the_least_recent(registry):
+    async def scenario():
+        await registry.create("a", state("a"))
+        await registry.create("b", state("b"))
+        assert await registry.touch("a")
+        await registry.create("c", state("c"))
+        return [await registry.get(sid) for sid in ("a", "b", "c")]
+
+    a, b, c = asyncio.run(scenario())
+    assert (a.topic, b, c.topic) == ("a", None, "c")
+    assert registry.evicted_lru == 1
+
+
+def test_sweep_evicts_idle_sessions(registry):
+    async def scenario():
+        await registry.create("a", state("a"))
+        registry.idle_ttl = -1
+        return await registry.sweep(), await registry.touch("a")
+
+    assert asyncio.run(scenario()) == (1, False)
+    assert registry.evicted_idle == 1
+
+
+def test_metrics_cover_session_state_and_checkpoints(registry):
+    async def scenario():
+        await registry.create("a", state("a"))
+        return await registry.metrics()
+
+    metrics = asyncio.run(scenario())
+    assert metrics["sessions"] == 1
+    assert metrics["state_bytes"] > 0
+    assert metrics["largest_sessions"][0]["session_id"] == "a"
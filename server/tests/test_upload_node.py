@@ -0,0 +1,60 @@
+import asyncio
+
+import pytest
+
+from src.agents.nodes import UploadNode
+from src.config.schema import AgentState
+from src.services import publish_queue as pq
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    q = pq.PublishQueue(str(tmp_path / "queue.sqlite3"))
+    monkeypatch.setattr(UploadNode, "publish_queue", q)
+    # No workers run here; jobs stay where the test put them.
+    monkeypatch.setattr(UploadNode, "PUBLISH_WAIT_SECONDS", 0.01)
+    return q
+
+
+def jobs(queue, platform):
+    return queue._conn.execute(
+        "SELECT content, status FROM publish_jobs WHERE platform = ? ORDER BY created_at", (platform,)
+    ).fetchall()
+
+
+def result(job):
+    return {"job_id": job["job_id"], "status": job["status"], "post_url": job["post_id"], "error": job["last_error"]}
+
+
+@pytest.mark.parametrize("pending_status", [pq.QUEUED, pq.RETRYING, pq.UNKNOWN])
+def test_revised_draft_does_not_duplicate_a_pending_platform(queue, pending_status):
+    # LinkedIn was rejected while the tweet is still pending; the user then revises both drafts.
+    linkedin = queue.enqueue("linkedin", "first linkedin draft", access_token="li")
+    queue._conn.execute("UPDATE publish_jobs SET status = ? WHERE job_id = ?", (pq.FAILED, linkedin["job_id"]))
+    twitter = queue.enqueue("twitter", "first tweet", access_token="tw")
+    queue._conn.execute("UPDATE publish_jobs SET status = ? WHERE job_id = ?", (pending_status, twitter["job_id"]))
+    state = AgentState(
+        topic="rust", platform="linkedin", platforms=["linkedin", "twitter"],
+        linkedin_access_token="li", twitter_access_token="tw",
+        post_drafts={"linkedin": "revised linkedin draft", "twitter": "revised tweet"},
+        publish_results={"linkedin": result(queue.get(linkedin["job_id"])),
+                         "twitter": result(queue.get(twitter["job_id"]))},
+    )
+
+    command = asyncio.run(UploadNode.upload_node(state))
+
+    assert jobs(queue, "twitter") == [("first tweet", pending_status)]
+    assert command.update["publish_results"]["twitter"]["job_id"] == twitter["job_id"]
+    assert jobs(queue, "linkedin") == [("first linkedin draft", pq.FAILED), ("revised linkedin draft", pq.QUEUED)]
+
+
+def test_failed_platform_is_enqueued_again(queue):
+    twitter = queue.enqueue("twitter", "first tweet", access_token="tw")
+    queue._conn.execute("UPDATE publish_jobs SET status = ? WHERE job_id = ?", (pq.FAILED, twitter["job_id"]))
+    state = AgentState(topic="rust", platform="twitter", twitter_access_token="tw",
+                       post_drafts={"twitter": "revised tweet"},
+                       publish_results={"twitter": result(queue.get(twitter["job_id"]))})
+
+    asyncio.run(UploadNode.upload_node(state))
+
+    assert jobs(queue, "twitter") == [("first tweet", pq.FAILED), ("revised tweet", pq.QUEUED)]